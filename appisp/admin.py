@@ -17,17 +17,21 @@ from django.contrib.admin import AdminSite
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import HttpResponseRedirect, JsonResponse
 from .forms import PortaForm, RackForm, RackEquipamentoForm, EnderecoIPForm, MaquinaVirtualForm, EquipamentoForm, \
-    EnderecoIPForm, CadastrarEnderecosForm, ModeloForm
+    EnderecoIPForm, CadastrarEnderecosForm, ModeloForm, SubdividirBlocoForm, PlanejarVLSMForm
 from .views import mapa, mapa_racks
+from .ipam import cadastrar_enderecos_em_lote, janela_ips, subdividir_bloco, planejar_vlsm, JANELA_PADRAO
+from .tarefas import cancelar, enfileirar, reenfileirar, status_tarefa
+from .zabbix import ClienteZabbix, ErroZabbix
 from django.contrib.admin import SimpleListFilter, FieldListFilter
 from .models import Empresa, Pop, Fabricante, Modelo, Equipamento, Porta, BlocoIP, EnderecoIP, Rack, RackEquipamento, \
     MaquinaVirtual, Disco, Rede, Vlan, VlanPorta, EmpresaToken, IntegracaoZabbix, IntegracaoNetbox, Interface, \
-    Patrimonio
+    Patrimonio, TarefaSincronizacao, HistoricoStatus
 import ipaddress
 from django.utils.html import format_html
 from django.contrib import admin
 from ipaddress import ip_network
 from django.core.exceptions import ValidationError
+from django.contrib.admin.views.main import ChangeList
 
 class PopEmpresaFilter(SimpleListFilter):
     title = "Pop"
@@ -540,7 +544,7 @@ def subdividir_blocos(modeladmin, request, queryset):
 
     for bloco in queryset:
         # Verifica se o bloco já tem filhos (já foi subdividido)
-        if bloco.sub_blocos.exists():
+        if bloco.tem_sub_blocos:
             modeladmin.message_user(request, f"O bloco {bloco.bloco_cidr} já foi subdividido.", level=messages.WARNING)
             continue  # Pula
 
@@ -553,18 +557,9 @@ def subdividir_blocos(modeladmin, request, queryset):
                 modeladmin.message_user(request, f"O bloco {bloco.bloco_cidr} não pode ser subdividido (prefixo máximo).", level=messages.WARNING)
                 continue
 
-            novo_prefixo = prefixo_atual + 1  # Sempre divide ao meio
-
-            subnets = list(rede.subnets(new_prefix=novo_prefixo))  # Gera duas sub-redes
-
-            for subrede in subnets:
-                BlocoIP.objects.create(
-                    empresa=bloco.empresa,
-                    bloco_cidr=str(subrede),
-                    parent=bloco,
-                    tipo_ip=bloco.tipo_ip
-                )
-                total_subdivisoes += 1
+            # Divide ao meio; para outros prefixos use a tela de subdivisão do bloco
+            arvore = subdividir_bloco(bloco, novo_prefixo=prefixo_atual + 1)
+            total_subdivisoes += len(arvore['sub_blocos'])
 
         except Exception as e:
             modeladmin.message_user(request, f"Erro ao subdividir bloco {bloco.bloco_cidr}: {e}", level=messages.ERROR)
@@ -594,8 +589,8 @@ class BlocoCIDRListFilter(SimpleListFilter):
     parameter_name = 'bloco_cidr'
 
     def lookups(self, request, model_admin):
-        blocos = model_admin.get_queryset(request)
-        return [(b.bloco_cidr, b.bloco_cidr) for b in blocos]
+        blocos = model_admin.get_queryset(request).values_list('bloco_cidr', flat=True)
+        return [(bloco_cidr, bloco_cidr) for bloco_cidr in blocos]
 
     def queryset(self, request, queryset):
         if self.value():
@@ -604,36 +599,46 @@ class BlocoCIDRListFilter(SimpleListFilter):
                 bloco_pai = queryset.filter(bloco_cidr=str(rede_busca)).first()
 
                 if bloco_pai:
-                    blocos_ids = [bloco_pai.id]
-
-                    def coletar_descendentes(bloco):
-                        for sub_bloco in bloco.sub_blocos.all():
-                            blocos_ids.append(sub_bloco.id)
-                            coletar_descendentes(sub_bloco)
-
-                    coletar_descendentes(bloco_pai)
-
-                    return queryset.filter(id__in=blocos_ids)
+                    # Bloco e todos os descendentes pelo prefixo do caminho materializado
+                    return queryset.filter(caminho__startswith=bloco_pai.caminho)
             except ValueError:
                 pass
 
         return queryset
 
 
+class BlocoParentListFilter(admin.RelatedFieldListFilter):
+    """Filtro por parent sem uma consulta de empresa/equipamento para cada bloco listado"""
+
+    def field_choices(self, field, request, model_admin):
+        blocos = BlocoIP.objects.select_related('empresa', 'equipamento')
+        return [(bloco.pk, str(bloco)) for bloco in blocos]
+
+
 def carregar_portas(request):
     equipamento_id = request.GET.get('equipamento')
     portas = Porta.objects.filter(equipamento_id=equipamento_id).values('id', 'nome')
     return JsonResponse(list(portas), safe=False)
 
 
+class BlocoIPChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Descendentes contados depois da paginação, só para os blocos da página
+        totais = BlocoIP.objects.contar_descendentes(self.result_list)
+        for bloco in self.result_list:
+            bloco.total_descendentes = totais.get(bloco.pk, 0)
+
+
 class BlocoIPAdmin(admin.ModelAdmin):
     list_display = (
         'bloco_indented', 'empresa', 'bloco_cidr', 'sub_blocos_count',
         'utilizacao_barra', 'tipo_ip', 'parent', 'gateway', 'acoes_dropdown'
     )
+    list_select_related = ('empresa', 'equipamento', 'parent__empresa', 'parent__equipamento')
     readonly_fields = ('utilizacao_barra',)
     search_fields = ('bloco_cidr', 'empresa__nome', 'equipamento__nome')
-    list_filter = (BlocoCIDRListFilter, 'tipo_ip', 'empresa', 'equipamento', 'parent')
+    list_filter = (BlocoCIDRListFilter, 'tipo_ip', 'empresa', 'equipamento', ('parent', BlocoParentListFilter))
     form = BlocoIPForm
     actions = [subdividir_blocos, cadastrar_enderecos]
 
@@ -647,7 +652,7 @@ class BlocoIPAdmin(admin.ModelAdmin):
         acoes = []
 
         # Subdividir, se aplicável
-        if not obj.sub_blocos.exists():
+        if not obj.tem_sub_blocos:
             try:
                 rede = ip_network(obj.bloco_cidr, strict=False)
                 prefixo_atual = rede.prefixlen
@@ -658,8 +663,14 @@ class BlocoIPAdmin(admin.ModelAdmin):
             except Exception:
                 pass
 
+        # Planejar VLSM no espaço livre (também em blocos já subdivididos)
+        if obj.ips_usados == 0:
+            vlsm_url = reverse('admin:appisp_blocoip_planejar_vlsm', args=[obj.id])
+            acoes.append(
+                f'<a href="{vlsm_url}" style="display:block; padding:8px 12px; text-decoration:none; color:#333;">VLSM</a>')
+
         # Visualizar IPs, se aplicável
-        if not obj.sub_blocos.exists():
+        if not obj.tem_sub_blocos:
             visualizar_url = reverse('admin:appisp_blocoip_visualizar_ips', args=[obj.id])
             acoes.append(
                 f'<a href="{visualizar_url}" style="display:block; padding:8px 12px; text-decoration:none; background-color: #fff; color:#333;">IPs</a>')
@@ -696,15 +707,14 @@ class BlocoIPAdmin(admin.ModelAdmin):
         indent = '*' * obj.nivel()  # Um asterisco por nível
         return format_html(f'{indent} {obj.bloco_cidr}')
 
+    def get_changelist(self, request, **kwargs):
+        return BlocoIPChangeList
+
     @admin.display(description='Qtd S-bloco')
     def sub_blocos_count(self, obj):
-        def contar_descendentes(bloco):
-            count = bloco.sub_blocos.count()
-            for sub_bloco in bloco.sub_blocos.all():
-                count += contar_descendentes(sub_bloco)
-            return count
-
-        return contar_descendentes(obj)
+        if hasattr(obj, 'total_descendentes'):
+            return obj.total_descendentes or 0
+        return obj.descendentes().count()
 
     def get_urls(self):
         urls = super().get_urls()
@@ -713,6 +723,8 @@ class BlocoIPAdmin(admin.ModelAdmin):
                  name='appisp_blocoip_subdividir'),
             path('<int:bloco_id>/visualizar_ips/', self.admin_site.admin_view(self.visualizar_ips),
                  name='appisp_blocoip_visualizar_ips'),
+            path('<int:bloco_id>/planejar_vlsm/', self.admin_site.admin_view(self.planejar_vlsm_view),
+                 name='appisp_blocoip_planejar_vlsm'),
             path(
 
                 '<int:bloco_id>/cadastrar_enderecos/',
@@ -749,35 +761,23 @@ class BlocoIPAdmin(admin.ModelAdmin):
                 next_hop = form.cleaned_data.get('next_hop')
                 is_gateway = form.cleaned_data.get('is_gateway', False)
 
-                rede = ip_network(bloco.bloco_cidr, strict=False)
-                enderecos_existentes = EnderecoIP.objects.filter(bloco=bloco).values_list('ip', flat=True)
-
-                created = 0
-                for ip in rede:
-                    if str(ip) in enderecos_existentes:
-                        continue
-                    if ip == rede.network_address or ip == rede.broadcast_address:
-                        continue  # pula endereço de rede e broadcast
-
-                    endereco = EnderecoIP(
-                        bloco=bloco,
-                        ip=str(ip),
-                        equipamento=equipamento,
-                        porta=porta,
+                try:
+                    relatorio = cadastrar_enderecos_em_lote(
+                        bloco, equipamento, porta,
                         finalidade=finalidade,
                         next_hop=next_hop,
-                        is_gateway=is_gateway
+                        is_gateway=is_gateway,
                     )
-                    try:
-                        endereco.full_clean()  # Valida antes de salvar
-                        endereco.save()
-                        created += 1
-                    except ValidationError as e:
-                        # Pula IP inválido (não quebra o processo)
-                        continue
-
-                self.message_user(request, f'{created} endereços IP foram cadastrados com sucesso.',
-                                  level=messages.SUCCESS)
+                except ValidationError as e:
+                    self.message_user(request, '; '.join(e.messages), level=messages.ERROR)
+                    return redirect('admin:appisp_blocoip_changelist')
+
+                self.message_user(
+                    request,
+                    f"{relatorio['criados']} endereços IP foram cadastrados com sucesso "
+                    f"({relatorio['ignorados']} ignorados) em {relatorio['tempo']:.2f}s.",
+                    level=messages.SUCCESS
+                )
                 return redirect('admin:appisp_blocoip_changelist')
 
         else:
@@ -802,32 +802,62 @@ class BlocoIPAdmin(admin.ModelAdmin):
                                   level=messages.WARNING)
                 return redirect('admin:appisp_blocoip_changelist')
 
-            if bloco.sub_blocos.exists():
-                self.message_user(request, f"O bloco {bloco.bloco_cidr} já foi subdividido.", level=messages.WARNING)
-                return redirect('admin:appisp_blocoip_changelist')
-
-            novo_prefixo = prefixo_atual + 1
-            subnets = list(rede.subnets(new_prefix=novo_prefixo))
-
-            for subrede in subnets:
-                BlocoIP.objects.create(
-                    empresa=bloco.empresa,
-                    bloco_cidr=str(subrede),
-                    parent=bloco,
-                    tipo_ip=bloco.tipo_ip
-                )
+            if request.method != 'POST':
+                form = SubdividirBlocoForm(initial={'novo_prefixo': prefixo_atual + 1})
+                return render(request, 'admin/subdividir_bloco.html',
+                              {'form': form, 'bloco': bloco, 'opts': self.model._meta})
+
+            form = SubdividirBlocoForm(request.POST)
+            if not form.is_valid():
+                return render(request, 'admin/subdividir_bloco.html',
+                              {'form': form, 'bloco': bloco, 'opts': self.model._meta})
+
+            # O espaço já ocupado por sub-blocos é preservado; só o espaço livre é subdividido
+            prefixos = form.cleaned_data['prefixos']
+            arvore = subdividir_bloco(
+                bloco,
+                novo_prefixo=None if prefixos else form.cleaned_data['novo_prefixo'],
+                prefixos=prefixos or None,
+            )
 
             self.message_user(request,
-                              f"O bloco {bloco.bloco_cidr} foi subdividido com sucesso em {len(subnets)} sub-blocos.",
+                              f"O bloco {bloco.bloco_cidr} foi subdividido com sucesso em {len(arvore['sub_blocos'])} sub-blocos.",
                               level=messages.SUCCESS)
 
+        except ValidationError as e:
+            self.message_user(request, f"Erro ao subdividir: {'; '.join(e.messages)}", level=messages.ERROR)
         except Exception as e:
             self.message_user(request, f"Erro ao subdividir: {e}", level=messages.ERROR)
 
         return redirect('admin:appisp_blocoip_changelist')
 
+    def planejar_vlsm_view(self, request, bloco_id):
+        """Prévia do VLSM (botão Visualizar) e gravação do mesmo plano em lote (botão Confirmar)"""
+        bloco = get_object_or_404(BlocoIP, id=bloco_id)
+        form = PlanejarVLSMForm(request.POST or None)
+        plano = None
+
+        if request.method == 'POST' and form.is_valid():
+            try:
+                plano = planejar_vlsm(bloco, form.cleaned_data['hosts'])
+                if 'confirmar' in request.POST:
+                    arvore = subdividir_bloco(bloco, prefixos=plano['prefixos'])
+                    self.message_user(
+                        request,
+                        f"{len(plano['redes'])} sub-blocos criados em {bloco.bloco_cidr} "
+                        f"({len(arvore['sub_blocos'])} sub-blocos no total).",
+                        level=messages.SUCCESS
+                    )
+                    return redirect('admin:appisp_blocoip_changelist')
+            except ValidationError as e:
+                form.add_error(None, e)
+                plano = None
+
+        context = {'form': form, 'bloco': bloco, 'plano': plano, 'opts': self.model._meta}
+        return render(request, 'admin/planejar_vlsm.html', context)
+
     def subdividir_link(self, obj):
-        if obj.sub_blocos.exists():
+        if obj.tem_sub_blocos:
             return format_html('<span style="color: gray;">Já subdividido</span>')
 
         try:
@@ -850,14 +880,13 @@ class BlocoIPAdmin(admin.ModelAdmin):
     subdividir_link.allow_tags = True
 
     def gateway(self, obj):
-        gw = obj.enderecos.filter(is_gateway=True).first()
-        return gw.ip if gw else "-"
+        return obj.gateway_ip or "-"
 
     gateway.short_description = "Gateway"
 
     def get_list_filter(self, request):
         if request.user.is_superuser:
-            return ('empresa', 'equipamento', BlocoCIDRListFilter, 'parent', 'tipo_ip')
+            return ('empresa', 'equipamento', BlocoCIDRListFilter, ('parent', BlocoParentListFilter), 'tipo_ip')
         return (EmpresaUsuarioFilter, EquipamentoEmpresaFilter, BlocoCIDRListFilter, 'tipo_ip')
 
     def get_queryset(self, request):
@@ -881,36 +910,25 @@ class BlocoIPAdmin(admin.ModelAdmin):
 
     def visualizar_ips(self, request, bloco_id):
         bloco = get_object_or_404(BlocoIP, id=bloco_id)
-        rede = ip_network(bloco.bloco_cidr, strict=False)
-        enderecos_existentes = EnderecoIP.objects.filter(bloco=bloco).values_list('ip', flat=True)
-        ip_info = []
-
-        for ip in rede:
-            info = {'ip': str(ip)}
-            if ip == rede.network_address:
-                info['tipo'] = 'IP de rede'
-            elif ip == rede.broadcast_address:
-                info['tipo'] = 'IP de broadcast'
-            elif str(ip) in enderecos_existentes:
-                endereco = EnderecoIP.objects.get(bloco=bloco, ip=str(ip))
-                info['tipo'] = 'Cadastrado'
-                info['equipamento'] = endereco.equipamento.nome
-                info['porta'] = endereco.porta
-                info['finalidade'] = endereco.finalidade
-                info['next_hop'] = endereco.next_hop
-                info['is_gateway'] = endereco.is_gateway
-            else:
-                info['tipo'] = 'Livre'
-            ip_info.append(info)
+
+        try:
+            offset = int(request.GET.get('offset', 0))
+            limit = int(request.GET.get('limit', JANELA_PADRAO))
+        except ValueError:
+            offset, limit = 0, JANELA_PADRAO
+
+        # Só a janela pedida é montada; o restante do bloco aparece resumido em faixas livres
+        janela = janela_ips(bloco, offset=offset, limit=limit)
 
         context = {
             'bloco': bloco,
-            'lista_ips': ip_info,
+            'lista_ips': janela['linhas'],
+            'janela': janela,
         }
         return render(request, 'admin/visualizar_ips_do_bloco.html', context)
 
     def visualizar_ips_link(self, obj):
-        if obj.sub_blocos.exists():
+        if obj.tem_sub_blocos:
             return None  # Não mostra nada
 
         url = reverse('admin:appisp_blocoip_visualizar_ips', args=[obj.id])
@@ -1179,7 +1197,7 @@ class PortaInline(admin.TabularInline):
 
 class EquipamentoAdmin(admin.ModelAdmin):
     form = EquipamentoForm
-    list_display = ('nome', 'ip', 'status', 'pop', 'empresa', 'fabricante', 'tipo')
+    list_display = ('nome', 'ip', 'status', 'status_alterado_em', 'ultimo_contato', 'pop', 'empresa', 'fabricante', 'tipo')
     search_fields = ('nome', 'ip', 'pop__nome', 'empresa__nome', 'fabricante__nome', 'modelo__modelo', 'tipo')
     inlines = [PortaInline]
 
@@ -1297,13 +1315,19 @@ class EmpresaTokenAdmin(admin.ModelAdmin):
     readonly_fields = ("token",)  # Deixa o token apenas para leitura
 
 
+def redirecionar_para_tarefa(model_admin, request, tarefa):
+    # As sincronizações rodam no worker (manage.py processar_tarefas); a página da tarefa acompanha o progresso
+    model_admin.message_user(request, f"⏳ Tarefa #{tarefa.pk} ({tarefa.get_tipo_display()}) na fila.")
+    return redirect(reverse('admin:appisp_tarefasincronizacao_change', args=[tarefa.pk]))
+
+
 class IntegracaoZabbixAdmin(admin.ModelAdmin):
-    list_display = ('empresa', 'url', 'ativo', 'ultima_sincronizacao', 'testar_conexao_button', 'sincronizar_equipamentos_button', 'sincronizar_portas_link')
-    readonly_fields = ('ultima_sincronizacao', 'testar_conexao_button', 'sincronizar_equipamentos_button', 'sincronizar_portas_link')
+    list_display = ('empresa', 'url', 'ativo', 'ultima_sincronizacao', 'testar_conexao_button', 'sincronizar_equipamentos_button', 'sincronizar_portas_link', 'ingerir_status_link')
+    readonly_fields = ('ultima_sincronizacao', 'testar_conexao_button', 'sincronizar_equipamentos_button', 'sincronizar_portas_link', 'ingerir_status_link')
     fields = (
         'empresa', 'url', 'usuario', 'senha', 'token',
         'observacoes', 'ativo', 'ultima_sincronizacao',
-        'testar_conexao_button', 'sincronizar_equipamentos_button', 'sincronizar_portas_link'
+        'testar_conexao_button', 'sincronizar_equipamentos_button', 'sincronizar_portas_link', 'ingerir_status_link'
     )
 
     def get_form(self, request, obj=None, **kwargs):
@@ -1333,6 +1357,7 @@ class IntegracaoZabbixAdmin(admin.ModelAdmin):
             path('testar-conexao/<int:pk>/', self.admin_site.admin_view(self.testar_conexao), name='testar_conexao'),
             path('sincronizar-equipamentos/<int:pk>/', self.admin_site.admin_view(self.sincronizar_equipamentos), name='sincronizar_equipamentos'),
             path('<int:pk>/sincronizar_portas/', self.admin_site.admin_view(self.sincronizar_portas), name='sincronizar_portas'),
+            path('<int:pk>/ingerir_status/', self.admin_site.admin_view(self.ingerir_status), name='ingerir_status_zabbix'),
         ]
         return custom_urls + urls
 
@@ -1347,9 +1372,11 @@ class IntegracaoZabbixAdmin(admin.ModelAdmin):
 
     def sincronizar_equipamentos_button(self, obj):
         if obj.pk:
+            url = reverse('admin:sincronizar_equipamentos', args=[obj.pk])
             return format_html(
-                '<a class="button" href="{}">🔄 Buscar Equipamentos</a>',
-                reverse('admin:sincronizar_equipamentos', args=[obj.pk])
+                '<a class="button" href="{}">🔄 Buscar Equipamentos</a>&nbsp;'
+                '<a class="button" href="{}?simular=1">🔍 Simular</a>',
+                url, url
             )
         return "Salve antes de sincronizar"
     sincronizar_equipamentos_button.short_description = "Buscar Equipamentos do Zabbix"
@@ -1361,22 +1388,12 @@ class IntegracaoZabbixAdmin(admin.ModelAdmin):
         return "Salve antes de sincronizar"
     sincronizar_portas_link.short_description = 'Sincronizar Portas'
 
-    def autenticar(self, integracao):
-        if integracao.token:
-            return integracao.token  # Usar o token se disponível
-        # Caso contrário, autenticar com usuário e senha
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "user.login",
-            "params": {
-                "user": integracao.usuario,
-                "password": integracao.senha
-            },
-            "id": 1
-        }
-        response = requests.post(integracao.url, json=payload, timeout=5)
-        data = response.json()
-        return data.get("result")
+    def ingerir_status_link(self, obj):
+        if obj.pk:
+            url = reverse('admin:ingerir_status_zabbix', args=[obj.pk])
+            return format_html('<a class="button" href="{}">📡 Atualizar Status</a>', url)
+        return "Salve antes de sincronizar"
+    ingerir_status_link.short_description = 'Status dos Equipamentos'
 
     def atualizar_ultima_sincronizacao(self, integracao):
         integracao.ultima_sincronizacao = timezone.now()
@@ -1385,11 +1402,11 @@ class IntegracaoZabbixAdmin(admin.ModelAdmin):
     def testar_conexao(self, request, pk):
         integracao = get_object_or_404(IntegracaoZabbix, pk=pk)
         try:
-            token = self.autenticar(integracao)
-            if token:
-                self.message_user(request, "✅ Conexão com Zabbix bem-sucedida!")
-            else:
-                self.message_user(request, "❌ Falha na autenticação com o Zabbix", level='error')
+            with ClienteZabbix(integracao) as cliente:
+                cliente.testar()
+            self.message_user(request, "✅ Conexão com Zabbix bem-sucedida!")
+        except ErroZabbix as e:
+            self.message_user(request, f"❌ Falha na autenticação com o Zabbix: {e}", level='error')
         except Exception as e:
             self.message_user(request, f"⚠️ Erro ao conectar: {str(e)}", level='error')
 
@@ -1397,233 +1414,20 @@ class IntegracaoZabbixAdmin(admin.ModelAdmin):
 
     def sincronizar_equipamentos(self, request, pk):
         integracao = get_object_or_404(IntegracaoZabbix, pk=pk)
-
-        def filtro_equipamento_por_palavras_chave(nome_equipamento, palavras=["sw_", "PPPoE", "BRAS", "BORDA", "CORE", \
-                                                                              "OLT", "ROTEADOR", "BGP"]):
-            if not palavras:
-                return True
-            return any(palavra.lower() in nome_equipamento.lower() for palavra in palavras)
-
-        try:
-            token = self.autenticar(integracao)
-
-            if not token:
-                self.message_user(request, "❌ Erro ao autenticar: Falha na autenticação", level='error')
-                return redirect(f'/admin/appisp/integracaozabbix/{pk}/change')
-
-            host_payload = {
-                "jsonrpc": "2.0",
-                "method": "host.get",
-                "params": {
-                    "output": ["host", "name"],
-                    "selectInterfaces": ["ip"]
-                },
-                "auth": token,
-                "id": 2
-            }
-
-            host_response = requests.post(integracao.url, json=host_payload, timeout=10)
-            hosts = host_response.json().get("result", [])
-
-            criados = 0
-            for host in hosts:
-                ip = host.get("interfaces", [{}])[0].get("ip", "")
-                nome = host.get("name", "Sem Nome")
-
-                if filtro_equipamento_por_palavras_chave(nome):
-                    if not Equipamento.objects.filter(ip=ip, empresa=integracao.empresa).exists():
-                        # Certifique-se de que Pop, Fabricante e Modelo existam ou defina uma lógica para obtê-los
-                        pop = Pop.objects.filter(empresa=integracao.empresa).first()
-                        fabricante = Fabricante.objects.first()
-                        modelo = Modelo.objects.first()
-
-                        if pop and fabricante and modelo:
-                            Equipamento.objects.create(
-                                nome=nome,
-                                ip=ip,
-                                usuario='admin',
-                                senha='admin',
-                                porta=22,
-                                protocolo='SSH',
-                                empresa=integracao.empresa,
-                                pop=pop,
-                                fabricante=fabricante,
-                                modelo=modelo,
-                                tipo='Switch',
-                                status='Ativo',
-                                observacao='Importado do Zabbix'
-                            )
-                            criados += 1
-                        else:
-                            print(f"⚠️ Não foi possível criar o equipamento '{nome}' pois Pop, Fabricante ou Modelo não foram encontrados.")
-                else:
-                    print(f"⏭️ Equipamento ignorado por filtro: {nome}")
-
-            self.message_user(request, f"✅ {criados} equipamento(s) importado(s) com sucesso!")
-
-            # Atualiza a data da última sincronização
-            self.atualizar_ultima_sincronizacao(integracao)
-        except Exception as e:
-            self.message_user(request, f"⚠️ Erro ao sincronizar: {str(e)}", level='error')
-
-        return redirect(f'/admin/appisp/integracaozabbix/{pk}/change')
+        # ?simular=1 só calcula a diferença (novos, alterados, ausentes) sem gravar
+        tarefa = enfileirar(integracao.empresa, 'zabbix_equipamentos', integracao=integracao.pk,
+                            simular=request.GET.get('simular') == '1')
+        return redirecionar_para_tarefa(self, request, tarefa)
 
     def sincronizar_portas(self, request, pk):
         integracao = get_object_or_404(IntegracaoZabbix, pk=pk)
+        tarefa = enfileirar(integracao.empresa, 'zabbix_portas', integracao=integracao.pk)
+        return redirecionar_para_tarefa(self, request, tarefa)
 
-        def filtro_por_palavras_chave(descricao, palavras=["ethernet", "sfp", "eoip", "interface"]):
-            if not palavras:
-                return True
-            return any(palavra.lower() in descricao.lower() for palavra in palavras)
-
-        portas_criadas = 0
-        hosts_processados = 0
-
-        try:
-            token = self.autenticar(integracao)
-
-            if not token:
-                raise Exception("Falha na autenticação")
-
-            hosts_response = requests.post(integracao.url, json={
-                "jsonrpc": "2.0",
-                "method": "host.get",
-                "params": {"output": ["host", "name"]},
-                "auth": token,
-                "id": 2
-            }, timeout=10)
-            hosts_response.raise_for_status()
-            hosts = hosts_response.json().get("result", [])
-
-            for host in hosts:
-                try:
-                    hosts_processados += 1
-                    nome_host = host["host"]
-                    equipamento = Equipamento.objects.filter(nome=nome_host, empresa=integracao.empresa).first()
-
-                    if not equipamento:
-                        continue
-
-                    item_payload = {
-                        "jsonrpc": "2.0",
-                        "method": "item.get",
-                        "params": {
-                            "output": ["name", "key_"],
-                            "hostids": host["hostid"]
-                        },
-                        "auth": token,
-                        "id": 3
-                    }
-
-                    item_response = requests.post(integracao.url, json=item_payload, timeout=10)
-                    item_response.raise_for_status()
-                    items = item_response.json().get("result", [])
-
-                    nomes_interface = {}
-                    itens_porta = []
-
-                    nomes_interfaces_list = []
-
-                    for item in items:
-                        chave = item.get("key_", "")
-                        nome = item.get("name", "").strip()
-
-                        if chave.startswith("net.if.type"):
-                            nome_interface = None
-                            nome_interface_match = re.search(r'Interface (.+?)(?:\(|:)', nome)
-                            if nome_interface_match:
-                                nome_interface = nome_interface_match.group(1).strip()
-                                nome_interface = re.sub(r'\([^)]+\)', '', nome_interface).strip()
-                            else:
-                                nome_interface_match_alt = re.search(r'(\S+)\s*Interface', nome)
-                                if nome_interface_match_alt:
-                                    nome_interface = nome_interface_match_alt.group(1).strip()
-                                    nome_interface = re.sub(r'\([^)]+\)', '', nome_interface).strip()
-                                else:
-                                    nome_interface = nome
-                                    nome_interface = re.sub(r'\([^)]+\)', '', nome_interface).strip()
-
-                            if nome_interface:
-                                nomes_interfaces_list.append(nome_interface)
-
-                        elif chave.startswith(("net.if.in", "net.if.out", "net.if.speed")):
-                            itens_porta.append(item)
-
-                    nomes_processados = set()
-                    interface_index = 0
-
-                    for item in itens_porta:
-                        chave = item.get("key_", "")
-                        nome_item = item.get("name", "").strip()
-                        nome_porta = None
-
-                        if interface_index < len(nomes_interfaces_list):
-                            nome_porta = nomes_interfaces_list[interface_index]
-                            interface_index += 1
-                        else:
-                            nome_porta_match = re.search(r'Interface (.+?)(?:\(|:)', nome_item)
-                            if nome_porta_match:
-                                nome_porta = nome_porta_match.group(1).strip()
-                                nome_porta = re.sub(r'\([^)]+\)', '', nome_porta).strip()
-                            else:
-                                nome_porta_match_alt = re.search(r'(\S+)\s*Interface', nome_item)
-                                if nome_porta_match_alt:
-                                    nome_porta = nome_porta_match_alt.group(1).strip()
-                                    nome_porta = re.sub(r'\([^)]+\)', '', nome_porta).strip()
-                                else:
-                                    continue
-
-                        if nome_porta:
-                            nome_porta_completo = nome_porta.strip()
-                            if "(" not in nome_porta_completo:
-                                nome_porta_completo = nome_porta_completo
-
-                            if not filtro_por_palavras_chave(nome_porta_completo):
-                                continue
-
-                            nome_normalizado = nome_porta_completo.lower().replace(" ", "").replace("/", "").replace("-", "")
-                            if nome_normalizado in nomes_processados:
-                                continue
-                            nomes_processados.add(nome_normalizado)
-
-                            try:
-                                porta, criada = Porta.objects.update_or_create(
-                                    equipamento=equipamento,
-                                    nome=nome_porta_completo,
-                                    defaults={
-                                        'empresa': equipamento.empresa,
-                                        'speed': '1G',
-                                        'tipo': 'Fibra',
-                                        'observacao': 'Importado do Zabbix',
-                                    }
-                                )
-                                if criada:
-                                    portas_criadas += 1
-                            except Exception as db_error:
-                                import traceback
-                                print(f"⚠️ Erro ao salvar/atualizar porta: {db_error}")
-                                traceback.print_exc()
-
-                except requests.exceptions.RequestException as req_err_host:
-                    print(f"⚠️ Erro de comunicação com o Zabbix ao processar o host {host['host']}: {req_err_host}")
-                except Exception as e_host:
-                    import traceback
-                    print(f"⚠️ Erro ao processar o host {host['host']}: {e_host}")
-                    traceback.print_exc()
-
-            self.message_user(request,
-                              f"✅ {portas_criadas} porta(s) importada(s) com sucesso de {hosts_processados} hosts!")
-
-            # Atualiza a data da última sincronização
-            self.atualizar_ultima_sincronizacao(integracao)
-
-        except requests.exceptions.RequestException as req_err_global:
-            self.message_user(request, f"⚠️ Erro de comunicação global com o Zabbix: {req_err_global}",
-                              level=messages.ERROR)
-        except Exception as e_global:
-            self.message_user(request, f"⚠️ Erro global ao buscar portas: {str(e_global)}", level=messages.ERROR)
-
-        return redirect(f'/admin/appisp/integracaozabbix/{pk}/change')
+    def ingerir_status(self, request, pk):
+        integracao = get_object_or_404(IntegracaoZabbix, pk=pk)
+        tarefa = enfileirar(integracao.empresa, 'zabbix_status', integracao=integracao.pk)
+        return redirecionar_para_tarefa(self, request, tarefa)
 
 
 class IntegracaoNetboxAdmin(admin.ModelAdmin):
@@ -1740,296 +1544,117 @@ class IntegracaoNetboxAdmin(admin.ModelAdmin):
         return HttpResponseRedirect(f"/admin/appisp/integracaonetbox/{pk}/change/")
 
     def sincronizar_equipamentos_netbox(self, request, pk):
-        from django.shortcuts import get_object_or_404, redirect
-        import requests
-        from .models import Equipamento, Fabricante, Modelo, Pop, IntegracaoNetbox  # ajuste o caminho se necessário
-
-        integracao = get_object_or_404(IntegracaoNetbox, pk=pk)
-        headers = {"Authorization": f"Token {integracao.token}"}
-        criados = 0
+        return self.sincronizar_endpoint_netbox(request, pk, 'dcim/devices')
 
-        try:
-            url = f"{integracao.url.rstrip('/')}/dcim/devices/"  # com /api/ incluso
-            while url:
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
-                dados = response.json()
-                dispositivos = dados.get('results', [])
-                url = dados.get('next')  # próxima página ou None
-
-                for dispositivo in dispositivos:
-                    nome = dispositivo.get("name", "Sem Nome")
-
-                    # IP
-                    primary_ip = dispositivo.get("primary_ip4")
-                    ip = primary_ip.get("address").split('/')[0] if primary_ip and primary_ip.get(
-                        "address") else "0.0.0.0"
-
-                    # Modelo e Fabricante
-                    device_type = dispositivo.get("device_type") or {}
-                    nome_modelo = device_type.get("model", "Desconhecido")
-                    fabricante_data = device_type.get("manufacturer") or {}
-                    nome_fabricante = fabricante_data.get("name", "Desconhecido")
-
-                    # Verifica se já existe um equipamento com mesmo nome e empresa
-                    if not Equipamento.objects.filter(nome=nome, empresa=integracao.empresa).exists():
-                        # Buscar ou criar fabricante
-                        fabricante, _ = Fabricante.objects.get_or_create(nome=nome_fabricante)
-
-                        # Buscar ou criar modelo
-                        modelo, _ = Modelo.objects.get_or_create(modelo=nome_modelo, fabricante=fabricante)
-
-                        # Buscar ou criar POP (usa o primeiro POP da empresa)
-                        pop = Pop.objects.filter(empresa=integracao.empresa).first()
-                        if not pop:
-                            pop = Pop.objects.create(
-                                nome="POP Importado",
-                                endereco="Desconhecido",
-                                cidade="Desconhecida",
-                                empresa=integracao.empresa
-                            )
-
-                        # Criar o equipamento
-                        Equipamento.objects.create(
-                            nome=nome,
-                            ip=ip,
-                            usuario='admin',
-                            senha='admin',
-                            porta=22,
-                            protocolo='SSH',
-                            empresa=integracao.empresa,
-                            pop=pop,
-                            fabricante=fabricante,
-                            modelo=modelo,
-                            tipo='Switch',
-                            status='Ativo',
-                            observacao='Importado do NetBox'
-                        )
-                        criados += 1
-
-            self.message_user(request, f"✅ {criados} equipamento(s) importado(s) com sucesso do NetBox!")
-            self.atualizar_ultima_sincronizacao(integracao)
+    def sincronizar_portas_netbox(self, request, pk):
+        return self.sincronizar_endpoint_netbox(request, pk, 'dcim/interfaces')
 
-        except Exception as e:
-            self.message_user(request, f"⚠️ Erro ao sincronizar do NetBox: {str(e)}", level='error')
+    def sincronizar_blocos_netbox(self, request, pk):
+        return self.sincronizar_endpoint_netbox(request, pk, 'ipam/prefixes')
 
-        return redirect(f'/admin/appisp/integracaonetbox/{pk}/change')
+    def sincronizar_enderecos_ip_netbox(self, request, pk):
+        return self.sincronizar_endpoint_netbox(request, pk, 'ipam/ip-addresses')
 
-    def sincronizar_portas_netbox(self, request, pk):
-        from .models import Equipamento, Porta
+    def sincronizar_endpoint_netbox(self, request, pk, endpoint):
+        # Incremental por padrão; ?completo=1 ignora a marca d'água e baixa o endpoint inteiro
         integracao = get_object_or_404(IntegracaoNetbox, pk=pk)
-        headers = {"Authorization": f"Token {integracao.token}"}
-        total_criadas = 0
-        total_atualizadas = 0
+        tarefa = enfileirar(integracao.empresa, 'netbox', integracao=integracao.pk, endpoints=[endpoint],
+                            completo=request.GET.get('completo') == '1')
+        return redirecionar_para_tarefa(self, request, tarefa)
 
-        try:
-            url = f"{integracao.url.rstrip('/')}/dcim/interfaces/?limit=100"
-
-            while url:
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                interfaces = data.get('results', [])
-                url = data.get('next')
-
-                for iface in interfaces:
-                    device = iface.get('device')
-                    device_name = device.get('name') if device else None
-                    port_name = iface.get('name')
+    def atualizar_ultima_sincronizacao(self, integracao):
+        integracao.ultima_sincronizacao = now()
+        integracao.save()
 
-                    if not device_name or not port_name:
-                        continue
 
-                    equipamento = Equipamento.objects.filter(nome=device_name, empresa=integracao.empresa).first()
-                    if not equipamento:
-                        continue
+class HistoricoStatusAdmin(admin.ModelAdmin):
+    list_display = ('equipamento', 'status', 'origem', 'registrado_em')
+    list_filter = ('status', 'origem', 'equipamento__empresa')
+    search_fields = ('equipamento__nome', 'equipamento__ip')
+    date_hierarchy = 'registrado_em'
+    list_select_related = ('equipamento',)
 
-                    porta, created = Porta.objects.update_or_create(
-                        equipamento=equipamento,
-                        nome=port_name,
-                        defaults={
-                            "tipo": "Fibra",  # ou outra lógica se quiser mapear o tipo real
-                            "speed": "1G",  # valor default, pode adaptar se quiser usar info do NetBox
-                            "observacao": "",
-                            "empresa": equipamento.empresa,
-                        }
-                    )
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(equipamento__empresa__in=request.user.empresas.all())
 
-                    if created:
-                        total_criadas += 1
-                    else:
-                        total_atualizadas += 1
+    def has_add_permission(self, request):
+        return False
 
-            self.message_user(request,
-                              f"🔌 {total_criadas} portas criadas e {total_atualizadas} atualizadas com sucesso.")
-            self.atualizar_ultima_sincronizacao(integracao)
+    def has_change_permission(self, request, obj=None):
+        return False
 
-        except Exception as e:
-            self.message_user(request, f"⚠️ Erro ao sincronizar portas: {str(e)}", level='error')
 
-        return redirect(f"/admin/appisp/integracaonetbox/{pk}/change")
+class TarefaSincronizacaoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'empresa', 'status', 'etapa', 'progresso', 'tentativas', 'criado_em',
+                    'finalizado_em')
+    list_filter = ('status', 'tipo', 'empresa')
+    readonly_fields = ('empresa', 'tipo', 'parametros', 'status', 'cancelar', 'etapa', 'processados', 'total',
+                       'progresso', 'resultado', 'erro', 'tentativas', 'worker', 'criado_em', 'iniciado_em',
+                       'finalizado_em')
+    fields = readonly_fields
+    actions = ['cancelar_tarefas', 'reenfileirar_tarefas']
+    change_form_template = 'admin/tarefa_sincronizacao_change_form.html'
 
-    def sincronizar_blocos_netbox(self, request, pk):
-        from .models import BlocoIP, Equipamento
-        integracao = get_object_or_404(IntegracaoNetbox, pk=pk)
-        headers = {"Authorization": f"Token {integracao.token}"}
-        total_criados = 0
-        total_atualizados = 0
-        erros = []
+    def get_queryset(self, request):
+        qs = super().get_queryset(request).select_related('empresa')
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(empresa__in=request.user.empresas.all())
 
-        try:
-            url = f"{integracao.url.rstrip('/')}/ipam/prefixes/?limit=100"
-
-            while url:
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                prefixos = data.get('results', [])
-                url = data.get('next')
-
-                for prefixo in prefixos:
-                    try:
-                        cidr = prefixo.get('prefix')
-                        descricao = prefixo.get('description', '')
-                        tipo_ip = 'IPv6' if ':' in cidr else 'IPv4'
-                        equipamento = None
-
-                        device_info = prefixo.get('device')
-                        if device_info and isinstance(device_info, dict):
-                            device_name = device_info.get('name')
-                            if device_name:
-                                equipamento = Equipamento.objects.filter(nome=device_name,
-                                                                         empresa=integracao.empresa).first()
-
-                        bloco, created = BlocoIP.objects.update_or_create(
-                            empresa=integracao.empresa,
-                            bloco_cidr=cidr,
-                            defaults={
-                                'tipo_ip': tipo_ip,
-                                'descricao': descricao,
-                                'equipamento': equipamento
-                            }
-                        )
-
-                        if created:
-                            total_criados += 1
-                        else:
-                            total_atualizados += 1
-
-                    except Exception as e:
-                        erros.append(f"{cidr}: {str(e)}")
-
-            self.atualizar_ultima_sincronizacao(integracao)
-
-            mensagem = f"✅ {total_criados} blocos criados, {total_atualizados} atualizados."
-            if erros:
-                mensagem += f" ⚠️ {len(erros)} erros durante a sincronização. Veja abaixo:\n"
-                for erro in erros[:10]:  # Mostra no máximo 10 erros no admin
-                    mensagem += f"\n• {erro}"
-                if len(erros) > 10:
-                    mensagem += f"\n... e mais {len(erros) - 10} erros."
-
-            self.message_user(request, mensagem, level='warning' if erros else 'info')
+    def has_add_permission(self, request):
+        return False
 
-        except Exception as e:
-            self.message_user(request, f"⚠️ Erro geral ao sincronizar blocos de IP: {str(e)}", level='error')
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:pk>/status/', self.admin_site.admin_view(self.status_view),
+                 name='appisp_tarefasincronizacao_status'),
+            path('<int:pk>/cancelar/', self.admin_site.admin_view(self.cancelar_view),
+                 name='appisp_tarefasincronizacao_cancelar'),
+            path('<int:pk>/reenfileirar/', self.admin_site.admin_view(self.reenfileirar_view),
+                 name='appisp_tarefasincronizacao_reenfileirar'),
+        ]
+        return custom_urls + urls
 
-        return redirect(f"/admin/appisp/integracaonetbox/{pk}/change")
+    def progresso(self, obj):
+        if obj.total:
+            return f"{obj.processados}/{obj.total} ({obj.percentual}%)"
+        return obj.processados or "-"
+    progresso.short_description = "Progresso"
 
-    def sincronizar_enderecos_ip_netbox(self, request, pk):
-        from .models import EnderecoIP, BlocoIP, Equipamento, Porta
-        integracao = get_object_or_404(IntegracaoNetbox, pk=pk)
-        headers = {"Authorization": f"Token {integracao.token}"}
-        total_criados = 0
-        total_atualizados = 0
-        erros = []
+    def status_view(self, request, pk):
+        tarefa = get_object_or_404(self.get_queryset(request), pk=pk)
+        return JsonResponse(status_tarefa(tarefa))
 
-        try:
-            url = f"{integracao.url.rstrip('/')}/ipam/ip-addresses/?limit=100"
-
-            while url:
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                ip_addresses = data.get('results', [])
-                url = data.get('next')
-
-                for ip_info in ip_addresses:
-                    try:
-                        ip = ip_info.get('address')
-                        equipamento_info = ip_info.get('device')
-                        porta_info = ip_info.get('interface')
-                        bloco_info = ip_info.get('prefix')
-
-                        # Adiciona uma checagem para garantir que todos os dados necessários estão presentes
-                        if not ip or not equipamento_info or not porta_info or not bloco_info:
-                            erros.append(f"Faltando dados para o IP: {ip_info}")
-                            continue
-
-                        # Debug: Imprimir ip_info para investigar se os dados estão completos
-                        print(f"Processando IP: {ip_info}")
-
-                        # Encontrar o bloco de IP
-                        bloco_cidr = bloco_info.get('prefix')
-                        bloco = BlocoIP.objects.filter(bloco_cidr=bloco_cidr, empresa=integracao.empresa).first()
-                        if not bloco:
-                            erros.append(f"Bloco de IP não encontrado para o CIDR: {bloco_cidr}")
-                            continue
-
-                        # Encontrar o equipamento e porta
-                        equipamento = Equipamento.objects.filter(nome=equipamento_info.get('name'),
-                                                                 empresa=integracao.empresa).first()
-                        if not equipamento:
-                            erros.append(f"Equipamento não encontrado: {equipamento_info.get('name')}")
-                            continue
-
-                        porta = Porta.objects.filter(nome=porta_info.get('name'), equipamento=equipamento).first()
-                        if not porta:
-                            erros.append(
-                                f"Porta não encontrada: {porta_info.get('name')} no equipamento {equipamento.nome}")
-                            continue
-
-                        # Criar ou atualizar o endereço IP
-                        endereco_ip, created = EnderecoIP.objects.update_or_create(
-                            ip=ip,
-                            equipamento=equipamento,
-                            porta=porta,
-                            bloco=bloco,
-                            defaults={
-                                'finalidade': ip_info.get('description', ''),
-                                'next_hop': ip_info.get('gateway', ''),
-                                'is_gateway': ip_info.get('is_gateway', False),
-                            }
-                        )
-
-                        if created:
-                            total_criados += 1
-                        else:
-                            total_atualizados += 1
-
-                    except Exception as e:
-                        erros.append(f"Erro ao processar o IP {ip}: {str(e)}")
-
-            self.atualizar_ultima_sincronizacao(integracao)
-
-            mensagem = f"✅ {total_criados} IPs criados, {total_atualizados} atualizados."
-            if erros:
-                mensagem += f" ⚠️ {len(erros)} erros durante a sincronização. Veja abaixo:\n"
-                for erro in erros[:10]:  # Mostra no máximo 10 erros no admin
-                    mensagem += f"\n• {erro}"
-                if len(erros) > 10:
-                    mensagem += f"\n... e mais {len(erros) - 10} erros."
-
-            self.message_user(request, mensagem, level='warning' if erros else 'info')
+    def cancelar_view(self, request, pk):
+        tarefa = get_object_or_404(self.get_queryset(request), pk=pk)
+        if cancelar(tarefa):
+            self.message_user(request, f"Cancelamento da tarefa #{tarefa.pk} solicitado.")
+        else:
+            self.message_user(request, f"A tarefa #{tarefa.pk} já terminou.", level=messages.WARNING)
+        return redirect(reverse('admin:appisp_tarefasincronizacao_change', args=[tarefa.pk]))
 
-        except Exception as e:
-            self.message_user(request, f"⚠️ Erro geral ao sincronizar endereços de IP: {str(e)}", level='error')
+    def reenfileirar_view(self, request, pk):
+        tarefa = get_object_or_404(self.get_queryset(request), pk=pk)
+        if reenfileirar(tarefa):
+            self.message_user(request, f"Tarefa #{tarefa.pk} colocada de volta na fila.")
+        else:
+            self.message_user(request, "Só tarefas que falharam ou foram canceladas podem ser reexecutadas.",
+                              level=messages.WARNING)
+        return redirect(reverse('admin:appisp_tarefasincronizacao_change', args=[tarefa.pk]))
 
-        return redirect(f"/admin/appisp/integracaonetbox/{pk}/change")
+    @admin.action(description="Cancelar tarefas selecionadas")
+    def cancelar_tarefas(self, request, queryset):
+        total = sum(cancelar(tarefa) for tarefa in queryset)
+        self.message_user(request, f"Cancelamento solicitado para {total} tarefa(s).")
 
-    def atualizar_ultima_sincronizacao(self, integracao):
-        integracao.ultima_sincronizacao = now()
-        integracao.save()
+    @admin.action(description="Executar novamente as tarefas selecionadas")
+    def reenfileirar_tarefas(self, request, queryset):
+        total = sum(reenfileirar(tarefa) for tarefa in queryset)
+        self.message_user(request, f"{total} tarefa(s) colocada(s) de volta na fila.")
 
 
 # Classe personalizada de Admin
@@ -2089,6 +1714,8 @@ admin_site.register(VlanPorta, VlanPortaAdmin)
 admin_site.register(EmpresaToken, EmpresaTokenAdmin)
 admin_site.register(IntegracaoZabbix, IntegracaoZabbixAdmin)
 admin_site.register(IntegracaoNetbox, IntegracaoNetboxAdmin)
+admin_site.register(TarefaSincronizacao, TarefaSincronizacaoAdmin)
+admin_site.register(HistoricoStatus, HistoricoStatusAdmin)
 
 
 class PatrimonioAdmin(admin.ModelAdmin):
@@ -0,0 +1,269 @@
+import heapq
+from bisect import bisect_right
+from ipaddress import ip_address, ip_network
+
+
+def chave_numerica(valor):
+    """
+    Inteiro do endereço em 32 dígitos hexadecimais. A largura fixa faz a ordem do texto ser a ordem
+    numérica, então a coluna indexada responde faixas de IPv4 e IPv6 sem inteiros de 128 bits no banco.
+    """
+    return f"{int(valor):032x}"
+
+
+def faixa_numerica(cidr):
+    """Retorna (inicio, fim) em chave numérica da rede inteira, incluindo rede e broadcast."""
+    rede = ip_network(cidr, strict=False)
+    return chave_numerica(rede.network_address), chave_numerica(rede.broadcast_address)
+
+
+def faixa_utilizavel(rede):
+    """
+    Retorna (primeiro, ultimo) como inteiros dos endereços que podem ser cadastrados na rede.
+    Segue as mesmas regras de EnderecoIP.clean: rede e broadcast ficam de fora em IPv4 até /30
+    e em IPv6 até /126.
+    """
+    primeiro = int(rede.network_address)
+    ultimo = int(rede.broadcast_address)
+
+    if (rede.version == 4 and rede.prefixlen <= 30) or (rede.version == 6 and rede.prefixlen <= 126):
+        primeiro += 1
+        ultimo -= 1
+
+    return primeiro, ultimo
+
+
+def prefixo_para_hosts(hosts, versao=4):
+    """Menor rede (maior prefixo) com pelo menos `hosts` endereços utilizáveis, ou None se não existir."""
+    bits = 32 if versao == 4 else 128
+    rede_base = ip_network('0.0.0.0/0' if versao == 4 else '::/0')
+    for prefixo in range(bits, -1, -1):
+        primeiro, ultimo = faixa_utilizavel(rede_base.__class__((0, prefixo)))
+        if ultimo - primeiro + 1 >= hosts:
+            return prefixo
+    return None
+
+
+class AlocadorBuddy:
+    """
+    Alocador buddy sobre faixas livres inteiras: o espaço livre é quebrado em blocos alinhados de
+    tamanho potência de 2, guardados em uma fila por ordem (log2 do tamanho).
+
+    alocar() usa o menor bloco livre que comporta o pedido (best-fit) e devolve as metades que sobram
+    ao dividir, o que preserva blocos grandes contíguos para pedidos futuros. Em empate vence o menor
+    endereço, então o resultado é determinístico.
+    """
+
+    def __init__(self, livres):
+        self._filas = {}
+        for inicio, fim in livres:
+            while inicio <= fim:
+                restante = fim - inicio + 1
+                tamanho = inicio & -inicio or 1 << (restante.bit_length() - 1)
+                while tamanho > restante:
+                    tamanho //= 2
+                heapq.heappush(self._filas.setdefault(tamanho.bit_length() - 1, []), inicio)
+                inicio += tamanho
+
+    def alocar(self, tamanho):
+        """Retorna o início (inteiro) de um bloco alinhado com `tamanho` endereços, ou None."""
+        ordem = tamanho.bit_length() - 1
+        candidatas = [o for o, fila in self._filas.items() if o >= ordem and fila]
+        if not candidatas:
+            return None
+
+        atual = min(candidatas)
+        inicio = heapq.heappop(self._filas[atual])
+        while atual > ordem:
+            atual -= 1
+            heapq.heappush(self._filas.setdefault(atual, []), inicio + (1 << atual))
+        return inicio
+
+
+class AlocadorIP:
+    """
+    Mapa de ocupação de um bloco guardado como intervalos inteiros ordenados e disjuntos.
+
+    Os endereços ocupados ficam em duas listas paralelas (_inicios/_fins), sempre mescladas,
+    então "próximo livre" é uma busca binária e não uma varredura de todos os hosts do bloco.
+    Para "primeira faixa livre de tamanho K" é mantida uma árvore de segmentos com o maior
+    buraco de cada intervalo, reconstruída apenas quando a ocupação muda.
+    """
+
+    def __init__(self, rede, ocupados=()):
+        self.rede = ip_network(rede, strict=False)
+        self.primeiro, self.ultimo = faixa_utilizavel(self.rede)
+        self._inicios = []
+        self._fins = []
+        self._buracos = None
+        self._arvore = None
+
+        for valor in sorted(self._para_int(ip) for ip in ocupados if ip):
+            if not self.primeiro <= valor <= self.ultimo:
+                continue
+            if self._fins and valor <= self._fins[-1] + 1:
+                self._fins[-1] = max(self._fins[-1], valor)
+            else:
+                self._inicios.append(valor)
+                self._fins.append(valor)
+
+    @classmethod
+    def do_bloco(cls, bloco):
+        """Monta o alocador a partir dos endereços já cadastrados no bloco."""
+        chaves = bloco.enderecos.values_list('ip_numerico', flat=True)
+        return cls(bloco.bloco_cidr, (int(chave, 16) for chave in chaves))
+
+    def _para_int(self, ip):
+        return ip if isinstance(ip, int) else int(ip_address(ip))
+
+    def endereco(self, valor):
+        """Converte o inteiro de volta para o texto do endereço."""
+        return str(self.rede.network_address.__class__(valor))
+
+    # --- Consultas ---
+
+    def ocupado(self, ip):
+        valor = self._para_int(ip)
+        i = bisect_right(self._inicios, valor) - 1
+        return i >= 0 and self._fins[i] >= valor
+
+    def total_utilizavel(self):
+        return max(self.ultimo - self.primeiro + 1, 0)
+
+    def total_ocupado(self):
+        return sum(fim - inicio + 1 for inicio, fim in zip(self._inicios, self._fins))
+
+    def faixas_ocupadas(self, inicio=None, fim=None):
+        """Lista (inicio, fim) inteiros das faixas ocupadas, recortadas ao intervalo informado."""
+        if inicio is None and fim is None:
+            return list(zip(self._inicios, self._fins))
+
+        inicio = self.primeiro if inicio is None else inicio
+        fim = self.ultimo if fim is None else fim
+        i = max(bisect_right(self._inicios, inicio) - 1, 0)
+        faixas = []
+        while i < len(self._inicios) and self._inicios[i] <= fim:
+            if self._fins[i] >= inicio:
+                faixas.append((max(self._inicios[i], inicio), min(self._fins[i], fim)))
+            i += 1
+        return faixas
+
+    def faixas_livres(self, a_partir=None):
+        """Gera (inicio, fim) inteiros de cada faixa livre, em ordem, a partir do endereço informado."""
+        atual = self.primeiro if a_partir is None else max(self.primeiro, self._para_int(a_partir))
+        i = bisect_right(self._inicios, atual) - 1
+        if i >= 0 and self._fins[i] >= atual:
+            atual = self._fins[i] + 1
+        i += 1
+
+        while atual <= self.ultimo:
+            if i < len(self._inicios):
+                fim = self._inicios[i] - 1
+                yield atual, fim
+                atual = self._fins[i] + 1
+                i += 1
+            else:
+                yield atual, self.ultimo
+                return
+
+    def proximo_livre(self, a_partir=None):
+        """Primeiro endereço livre (texto) ou None se o bloco estiver cheio."""
+        for inicio, _ in self.faixas_livres(a_partir):
+            return self.endereco(inicio)
+        return None
+
+    def proximos_livres(self, quantidade, a_partir=None):
+        """Lista com até `quantidade` endereços livres, em ordem."""
+        resultado = []
+        for inicio, fim in self.faixas_livres(a_partir):
+            for valor in range(inicio, min(fim, inicio + quantidade - len(resultado) - 1) + 1):
+                resultado.append(self.endereco(valor))
+            if len(resultado) >= quantidade:
+                break
+        return resultado
+
+    def primeira_faixa_livre(self, tamanho):
+        """Retorna (primeiro, ultimo) em texto da primeira faixa contígua com `tamanho` endereços livres."""
+        if tamanho < 1:
+            return None
+
+        buracos, arvore = self._arvore_buracos()
+        if not buracos or arvore[1] < tamanho:
+            return None
+
+        # Desce sempre pelo filho mais à esquerda que ainda comporta o tamanho pedido
+        no, folhas = 1, len(arvore) // 2
+        while no < folhas:
+            no = 2 * no if arvore[2 * no] >= tamanho else 2 * no + 1
+        inicio, _ = buracos[no - folhas]
+        return self.endereco(inicio), self.endereco(inicio + tamanho - 1)
+
+    # --- Atualizações ---
+
+    def ocupar(self, ip):
+        """Marca o endereço como ocupado. Retorna False se já estava ocupado ou fora do bloco."""
+        valor = self._para_int(ip)
+        if not self.primeiro <= valor <= self.ultimo or self.ocupado(valor):
+            return False
+
+        i = bisect_right(self._inicios, valor)
+        junta_esquerda = i > 0 and self._fins[i - 1] == valor - 1
+        junta_direita = i < len(self._inicios) and self._inicios[i] == valor + 1
+
+        if junta_esquerda and junta_direita:
+            self._fins[i - 1] = self._fins[i]
+            del self._inicios[i]
+            del self._fins[i]
+        elif junta_esquerda:
+            self._fins[i - 1] = valor
+        elif junta_direita:
+            self._inicios[i] = valor
+        else:
+            self._inicios.insert(i, valor)
+            self._fins.insert(i, valor)
+
+        self._buracos = self._arvore = None
+        return True
+
+    def liberar(self, ip):
+        """Remove o endereço da ocupação. Retorna False se ele já estava livre."""
+        valor = self._para_int(ip)
+        i = bisect_right(self._inicios, valor) - 1
+        if i < 0 or self._fins[i] < valor:
+            return False
+
+        inicio, fim = self._inicios[i], self._fins[i]
+        if inicio == fim:
+            del self._inicios[i]
+            del self._fins[i]
+        elif valor == inicio:
+            self._inicios[i] = valor + 1
+        elif valor == fim:
+            self._fins[i] = valor - 1
+        else:
+            self._fins[i] = valor - 1
+            self._inicios.insert(i + 1, valor + 1)
+            self._fins.insert(i + 1, fim)
+
+        self._buracos = self._arvore = None
+        return True
+
+    # --- Árvore de segmentos dos buracos ---
+
+    def _arvore_buracos(self):
+        if self._arvore is not None:
+            return self._buracos, self._arvore
+
+        buracos = list(self.faixas_livres())
+        folhas = 1
+        while folhas < max(len(buracos), 1):
+            folhas *= 2
+
+        arvore = [0] * (2 * folhas)
+        for i, (inicio, fim) in enumerate(buracos):
+            arvore[folhas + i] = fim - inicio + 1
+        for no in range(folhas - 1, 0, -1):
+            arvore[no] = max(arvore[2 * no], arvore[2 * no + 1])
+
+        self._buracos, self._arvore = buracos, arvore
+        return buracos, arvore
@@ -5,3 +5,6 @@ class AppispConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appisp'
     verbose_name = 'ISP-DOC'
+
+    def ready(self):
+        from . import prefixos  # noqa: F401  (registra os sinais da árvore de prefixos)
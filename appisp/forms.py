@@ -54,6 +54,58 @@ class VlanForm(forms.ModelForm):
         fields = ['empresa', 'equipamento', 'numero', 'nome', 'tipo', 'status']
 
 
+class SubdividirBlocoForm(forms.Form):
+    novo_prefixo = forms.IntegerField(
+        required=False, min_value=1, max_value=128,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        help_text="Divide todo o espaço livre do bloco em redes deste prefixo (ex.: 24)."
+    )
+    prefixos = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': '26, 26, 30'}),
+        help_text="VLSM: lista de prefixos separados por vírgula. Substitui o novo prefixo."
+    )
+
+    def clean_prefixos(self):
+        valor = self.cleaned_data.get('prefixos') or ''
+        try:
+            return [int(item) for item in valor.replace(';', ',').split(',') if item.strip()]
+        except ValueError:
+            raise ValidationError("Informe apenas números separados por vírgula.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('prefixos') and not cleaned_data.get('novo_prefixo'):
+            raise ValidationError("Informe o novo prefixo ou a lista de prefixos.")
+        return cleaned_data
+
+
+class PlanejarVLSMForm(forms.Form):
+    hosts = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 3, 'class': 'form-control', 'placeholder': '3x60, 10x2, 200'}),
+        help_text="Quantidade de hosts por sub-rede, separadas por vírgula. Use NxH para N sub-redes de H hosts."
+    )
+
+    def clean_hosts(self):
+        hosts = []
+        for item in self.cleaned_data['hosts'].replace(';', ',').replace('\n', ',').split(','):
+            item = item.strip().lower()
+            if not item:
+                continue
+            try:
+                repeticoes, quantidade = item.split('x', 1) if 'x' in item else (1, item)
+                repeticoes, quantidade = int(repeticoes), int(quantidade)
+            except ValueError:
+                raise ValidationError(f"Valor inválido: {item}")
+            if repeticoes < 1 or quantidade < 1:
+                raise ValidationError(f"Valor inválido: {item}")
+            hosts.extend([quantidade] * repeticoes)
+
+        if not hosts:
+            raise ValidationError("Informe ao menos uma quantidade de hosts.")
+        return hosts
+
+
 class CadastrarEnderecosForm(forms.Form):
     equipamento = forms.ModelChoiceField(queryset=Equipamento.objects.none(), required=True)
     porta = forms.ModelChoiceField(queryset=Porta.objects.none(), required=True)
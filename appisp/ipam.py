@@ -0,0 +1,586 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+from ipaddress import ip_network
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db import models
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .alocacao import AlocadorBuddy, AlocadorIP, chave_numerica, faixa_utilizavel, prefixo_para_hosts
+from .models import BlocoIP, EnderecoIP, HistoricoUtilizacaoBloco
+from .prefixos import invalidar_arvore
+
+TAMANHO_LOTE = 500
+# Máximo de endereços criados por um cadastro em lote (um /64 IPv6 teria 2^64 linhas)
+MAX_ENDERECOS_LOTE = 65536
+
+
+def cadastrar_enderecos_em_lote(bloco, equipamento, porta, finalidade=None, next_hop=None, is_gateway=False,
+                                tamanho_lote=TAMANHO_LOTE, max_enderecos=MAX_ENDERECOS_LOTE):
+    """
+    Cadastra todos os IPs livres do bloco para o equipamento/porta informados.
+    Blocos com mais de `max_enderecos` endereços livres são recusados com ValidationError.
+
+    O conjunto livre é calculado uma única vez pelo alocador, as regras de EnderecoIP.clean que
+    dependem do bloco (subdivisão, gateway único, rede/broadcast) são verificadas em memória e a
+    gravação é feita com bulk_create em lotes, tudo dentro de uma transação.
+    Retorna um dicionário com 'criados', 'ignorados' e 'tempo' (segundos).
+    """
+    inicio = time.monotonic()
+
+    if porta.equipamento_id != equipamento.id:
+        raise ValidationError("A porta selecionada não pertence ao equipamento escolhido.")
+
+    with transaction.atomic():
+        # Trava o bloco para que dois cadastros simultâneos não calculem o mesmo conjunto livre
+        bloco = BlocoIP.objects.select_for_update().get(pk=bloco.pk)
+
+        if bloco.sub_blocos.exists():
+            raise ValidationError("Este bloco foi subdividido. Cadastre os IPs nos blocos filhos.")
+
+        alocador = bloco.alocador()
+        livres = alocador.total_utilizavel() - alocador.total_ocupado()
+
+        if is_gateway:
+            # Só existe um gateway por bloco: no máximo o primeiro IP livre é cadastrado como gateway
+            if not next_hop or bloco.enderecos.filter(is_gateway=True).exists():
+                return {'criados': 0, 'ignorados': livres, 'tempo': time.monotonic() - inicio}
+            limite = 1
+        else:
+            if livres > max_enderecos:
+                raise ValidationError(
+                    f"O bloco tem {livres} endereços livres; o cadastro em lote é limitado a {max_enderecos}. "
+                    f"Subdivida o bloco ou cadastre os IPs individualmente."
+                )
+            limite = livres
+
+        criados = 0
+        lote = []
+        for faixa_inicio, faixa_fim in alocador.faixas_livres():
+            for valor in range(faixa_inicio, faixa_fim + 1):
+                if criados + len(lote) >= limite:
+                    break
+                lote.append(EnderecoIP(
+                    bloco=bloco,
+                    ip=alocador.endereco(valor),
+                    ip_numerico=chave_numerica(valor),
+                    equipamento=equipamento,
+                    porta=porta,
+                    finalidade=finalidade,
+                    next_hop=next_hop,
+                    is_gateway=is_gateway,
+                ))
+                if len(lote) >= tamanho_lote:
+                    EnderecoIP.objects.bulk_create(lote)
+                    criados += len(lote)
+                    lote = []
+            if criados + len(lote) >= limite:
+                break
+
+        if lote:
+            EnderecoIP.objects.bulk_create(lote)
+            criados += len(lote)
+
+        # bulk_create não passa pelo save(): os contadores do bloco são ajustados aqui, na mesma transação
+        contadores = {'ips_usados': F('ips_usados') + criados}
+        if is_gateway and criados:
+            contadores['gateway_ip'] = alocador.proximo_livre()  # o alocador não foi alterado: é o IP criado
+        BlocoIP.objects.filter(pk=bloco.pk).update(**contadores)
+
+    return {'criados': criados, 'ignorados': livres - criados, 'tempo': time.monotonic() - inicio}
+
+
+JANELA_PADRAO = 256
+JANELA_MAXIMA = 4096
+MAX_FAIXAS_LIVRES = 256
+
+
+def janela_ips(bloco, offset=0, limit=JANELA_PADRAO, agrupar_livres=True):
+    """
+    Retorna apenas a janela [offset, offset + limit) de endereços do bloco (offsets inteiros a partir
+    do endereço de rede), sem montar a lista completa do bloco.
+
+    Só os IPs cadastrados da janela são lidos, em uma única consulta com equipamento/porta; os totais
+    do bloco vêm dos contadores (ips_usados). Com `agrupar_livres`, endereços livres consecutivos viram
+    uma única linha com 'ate' e 'quantidade'. 'faixas_livres' resume em run-length o espaço livre da janela.
+    """
+    rede = bloco.network()
+    total = rede.num_addresses
+    offset = max(0, min(int(offset), total - 1))
+    limit = max(1, min(int(limit), JANELA_MAXIMA))
+
+    base = int(rede.network_address)
+    inicio = base + offset
+    fim = min(inicio + limit, base + total) - 1
+
+    # Varredura do índice (bloco, ip_numerico) só na faixa da janela
+    cadastrados = {}
+    enderecos = EnderecoIP.objects.filter(
+        bloco=bloco, ip_numerico__range=(chave_numerica(inicio), chave_numerica(fim))
+    ).select_related('equipamento', 'porta__equipamento')
+    for endereco in enderecos:
+        cadastrados.setdefault(int(endereco.ip_numerico, 16), endereco)
+
+    # Mapa de ocupação só da janela: converte inteiros em texto e separa as faixas livres
+    alocador = AlocadorIP(rede, cadastrados)
+
+    linhas = []
+    for valor in range(inicio, fim + 1):
+        ip = alocador.endereco(valor)
+
+        if valor == base:
+            linhas.append({'ip': ip, 'tipo': 'IP de rede'})
+        elif valor == int(rede.broadcast_address):
+            linhas.append({'ip': ip, 'tipo': 'IP de broadcast'})
+        elif valor in cadastrados:
+            endereco = cadastrados[valor]
+            linhas.append({
+                'ip': ip,
+                'tipo': 'Cadastrado',
+                'id': endereco.id,
+                'equipamento': endereco.equipamento.nome,
+                'porta': str(endereco.porta),
+                'finalidade': endereco.finalidade,
+                'next_hop': endereco.next_hop,
+                'is_gateway': endereco.is_gateway,
+            })
+        elif agrupar_livres and linhas and linhas[-1]['tipo'] == 'Livre':
+            linhas[-1]['ate'] = ip
+            linhas[-1]['quantidade'] += 1
+        else:
+            linhas.append({'ip': ip, 'tipo': 'Livre', 'ate': ip, 'quantidade': 1})
+
+    faixas_livres = []
+    total_faixas_livres = 0
+    for faixa_inicio, faixa_fim in alocador.faixas_livres(inicio):
+        if faixa_inicio > fim:
+            break
+        faixa_fim = min(faixa_fim, fim)
+        total_faixas_livres += 1
+        if len(faixas_livres) < MAX_FAIXAS_LIVRES:
+            faixas_livres.append({
+                'inicio': alocador.endereco(faixa_inicio),
+                'fim': alocador.endereco(faixa_fim),
+                'quantidade': faixa_fim - faixa_inicio + 1,
+            })
+
+    proximo = offset + limit
+    return {
+        'bloco': {'id': bloco.id, 'bloco_cidr': bloco.bloco_cidr},
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        # Posições (a partir de 1) do primeiro e do último endereço da janela, para exibição
+        'primeiro': offset + 1,
+        'ultimo': fim - base + 1,
+        'offset_anterior': max(offset - limit, 0) if offset else None,
+        'proximo_offset': proximo if proximo < total else None,
+        'utilizaveis': alocador.total_utilizavel(),
+        'cadastrados': bloco.ips_usados,
+        'linhas': linhas,
+        'faixas_livres': faixas_livres,
+        'total_faixas_livres': total_faixas_livres,
+    }
+
+
+CAMPOS_IP_SUBARVORE = ('id', 'ip', 'equipamento__nome', 'porta__nome', 'next_hop', 'is_gateway', 'finalidade')
+
+
+def exportar_subarvore(bloco, profundidade_maxima=None, campos_ip=CAMPOS_IP_SUBARVORE, incluir_ips=True):
+    """
+    Monta em memória a árvore {bloco, sub_blocos, ips} do bloco com duas consultas: uma para todos
+    os blocos da subárvore (pelo caminho materializado) e outra para todos os IPs deles.
+    `profundidade_maxima` limita quantos níveis abaixo do bloco entram; `campos_ip` escolhe as
+    colunas de cada IP (subconjunto de CAMPOS_IP_SUBARVORE).
+    """
+    campos_ip = [campo for campo in campos_ip if campo in CAMPOS_IP_SUBARVORE]
+
+    filtro = {'caminho__startswith': bloco.caminho}
+    if profundidade_maxima is not None:
+        filtro['profundidade__lte'] = bloco.profundidade + profundidade_maxima
+
+    nos = {}
+    raiz = None
+    blocos = BlocoIP.objects.filter(**filtro).order_by('profundidade', 'bloco_cidr').values(
+        'id', 'parent_id', 'bloco_cidr', 'descricao', 'equipamento__nome'
+    )
+    for linha in blocos:
+        no = {
+            'id': linha['id'],
+            'bloco': linha['bloco_cidr'],
+            'descricao': linha['descricao'],
+            'equipamento': linha['equipamento__nome'],
+            'sub_blocos': [],
+            'ips': [],
+        }
+        nos[linha['id']] = no
+        if linha['id'] == bloco.id:
+            raiz = no
+        elif linha['parent_id'] in nos:
+            nos[linha['parent_id']]['sub_blocos'].append(no)
+
+    if raiz is None:
+        return None
+
+    if incluir_ips:
+        filtro_ips = {'bloco__' + campo: valor for campo, valor in filtro.items()}
+        for ip in EnderecoIP.objects.filter(**filtro_ips).values('bloco_id', *campos_ip):
+            # Blocos criados entre as duas consultas não estão na árvore: os IPs deles ficam de fora
+            no = nos.get(ip.pop('bloco_id'))
+            if no is not None:
+                no['ips'].append(ip)
+
+    return raiz
+
+
+def validar_blocos_em_lote(empresa, blocos):
+    """
+    Valida de uma vez um conjunto de novos blocos [(bloco_cidr, parent), ...] entre si e contra o banco,
+    com as mesmas regras de sobreposição de BlocoIP.clean (raízes da empresa e irmãos do mesmo parent).
+
+    Os irmãos existentes vêm de uma única consulta; cada grupo (parent, versão) é ordenado pelo início
+    e varrido uma vez guardando o maior fim visto. Retorna [(indice, mensagem), ...], vazio se tudo ok.
+    """
+    erros = []
+    grupos = defaultdict(list)
+    parents = {}
+
+    for indice, (bloco_cidr, parent) in enumerate(blocos):
+        try:
+            rede = ip_network(bloco_cidr, strict=False)
+        except ValueError:
+            erros.append((indice, f"O bloco {bloco_cidr} não é um CIDR válido."))
+            continue
+
+        if parent is not None:
+            if parent.empresa_id != empresa.id:
+                erros.append((indice, f"O parent {parent.bloco_cidr} pertence a outra empresa."))
+                continue
+            if rede.version != parent.network().version or not rede.subnet_of(parent.network()):
+                erros.append((indice, f"O bloco {bloco_cidr} não está dentro de {parent.bloco_cidr}."))
+                continue
+            parents[parent.pk] = parent
+
+        grupos[(parent.pk if parent is not None else None, rede.version)].append(
+            (int(rede.network_address), int(rede.broadcast_address), str(rede), indice)
+        )
+
+    if not grupos:
+        return sorted(erros)
+
+    filtro = Q(parent_id__in=list(parents))
+    if any(parent_id is None for parent_id, _ in grupos):
+        filtro |= Q(empresa=empresa, parent__isnull=True)
+    existentes = BlocoIP.objects.filter(filtro).exclude(inicio_numerico='').values_list(
+        'parent_id', 'tipo_ip', 'inicio_numerico', 'fim_numerico', 'bloco_cidr'
+    )
+    for parent_id, tipo_ip, inicio, fim, bloco_cidr in existentes.iterator(chunk_size=2000):
+        chave = (parent_id, 6 if tipo_ip == 'IPv6' else 4)
+        if chave in grupos:
+            grupos[chave].append((int(inicio, 16), int(fim, 16), bloco_cidr, None))
+
+    for faixas in grupos.values():
+        faixas.sort(key=lambda faixa: (faixa[0], faixa[1]))
+        maior_fim, dono = -1, None
+        for inicio, fim, bloco_cidr, indice in faixas:
+            if inicio <= maior_fim:
+                # O erro vai para o bloco novo; entre dois blocos já existentes a sobreposição é legado
+                if indice is not None:
+                    erros.append((indice, f"O bloco {bloco_cidr} se sobrepõe com {dono[2]}."))
+                elif dono[3] is not None:
+                    erros.append((dono[3], f"O bloco {dono[2]} se sobrepõe com {bloco_cidr}."))
+            if fim > maior_fim:
+                maior_fim, dono = fim, (inicio, fim, bloco_cidr, indice)
+
+    return sorted(erros)
+
+
+def recalcular_contadores_blocos(empresa=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Recalcula ips_usados, gateway_ip e tem_sub_blocos de todos os blocos (ou só os da empresa) com três
+    consultas agregadas, gravando apenas os blocos cujo valor mudou. Retorna a quantidade corrigida.
+    """
+    blocos = BlocoIP.objects.all()
+    enderecos = EnderecoIP.objects.all()
+    if empresa is not None:
+        blocos = blocos.filter(empresa=empresa)
+        enderecos = enderecos.filter(bloco__empresa=empresa)
+
+    usados = dict(enderecos.values_list('bloco_id').annotate(total=Count('id')).order_by())
+    gateways = dict(enderecos.filter(is_gateway=True).values_list('bloco_id', 'ip'))
+    com_filhos = set(blocos.filter(parent__isnull=False).values_list('parent_id', flat=True))
+
+    alterados = []
+    for bloco in blocos.only('id', 'ips_usados', 'gateway_ip', 'tem_sub_blocos').iterator(chunk_size=2000):
+        novos = (usados.get(bloco.id, 0), gateways.get(bloco.id), bloco.id in com_filhos)
+        if novos != (bloco.ips_usados, bloco.gateway_ip, bloco.tem_sub_blocos):
+            bloco.ips_usados, bloco.gateway_ip, bloco.tem_sub_blocos = novos
+            alterados.append(bloco)
+
+    BlocoIP.objects.bulk_update(alterados, ['ips_usados', 'gateway_ip', 'tem_sub_blocos'], batch_size=tamanho_lote)
+    return len(alterados)
+
+
+def _faixas_livres(primeiro, ultimo, ocupadas):
+    """Faixas (inicio, fim) de [primeiro, ultimo] não cobertas pelas faixas ocupadas."""
+    livres = []
+    atual = primeiro
+    for inicio, fim in sorted(ocupadas):
+        if fim < atual:
+            continue
+        if inicio > ultimo:
+            break
+        if inicio > atual:
+            livres.append((atual, inicio - 1))
+        atual = max(atual, fim + 1)
+    if atual <= ultimo:
+        livres.append((atual, ultimo))
+    return livres
+
+
+def calcular_utilizacao(empresa):
+    """
+    Utilização consolidada de todos os blocos da empresa com duas consultas (blocos e IPs).
+
+    Os blocos são percorridos do mais profundo para a raiz, então 'usados' de um bloco soma os próprios
+    IPs e os dos sub-blocos. O espaço livre considera sub-blocos como alocados; 'fragmentacao' é
+    1 - maior faixa livre / total livre (0 = todo o livre contíguo). Retorna {bloco_id: {...}}.
+    """
+    linhas = BlocoIP.objects.filter(empresa=empresa).values_list(
+        'id', 'parent_id', 'bloco_cidr', 'profundidade', 'ips_usados'
+    )
+    blocos = {}
+    redes = {}
+    diretos = {}
+    for bloco_id, parent_id, bloco_cidr, profundidade, ips_usados in linhas:
+        try:
+            redes[bloco_id] = ip_network(bloco_cidr, strict=False)
+        except ValueError:
+            continue
+        diretos[bloco_id] = ips_usados
+        blocos[bloco_id] = {'id': bloco_id, 'parent_id': parent_id, 'bloco': bloco_cidr, 'profundidade': profundidade}
+
+    ocupados = defaultdict(list)
+    enderecos = EnderecoIP.objects.filter(bloco__empresa=empresa).values_list(
+        'bloco_id', 'ip_numerico'
+    )
+    for bloco_id, chave in enderecos.iterator(chunk_size=5000):
+        valor = int(chave, 16)
+        ocupados[bloco_id].append((valor, valor))
+
+    filhos = defaultdict(list)
+    for bloco in blocos.values():
+        if bloco['parent_id'] in blocos:
+            filhos[bloco['parent_id']].append(bloco)
+
+    for bloco in sorted(blocos.values(), key=lambda item: -item['profundidade']):
+        primeiro, ultimo = faixa_utilizavel(redes[bloco['id']])
+        total = max(ultimo - primeiro + 1, 0)
+
+        usados = diretos[bloco['id']] + sum(filho['usados'] for filho in filhos[bloco['id']])
+        faixas_ocupadas = ocupados.pop(bloco['id'], []) + [
+            (int(redes[filho['id']].network_address), int(redes[filho['id']].broadcast_address))
+            for filho in filhos[bloco['id']]
+        ]
+        livres = _faixas_livres(primeiro, ultimo, faixas_ocupadas)
+        total_livre = sum(fim - inicio + 1 for inicio, fim in livres)
+        maior_livre = max((fim - inicio + 1 for inicio, fim in livres), default=0)
+
+        bloco.update({
+            'total': total,
+            'usados': usados,
+            'percentual': round(usados / total * 100, 2) if total else 0,
+            'livres': total_livre,
+            'faixas_livres': len(livres),
+            'maior_faixa_livre': maior_livre,
+            'fragmentacao': round(1 - maior_livre / total_livre, 4) if total_livre else 0,
+        })
+
+    return blocos
+
+
+def relatorio_utilizacao(empresa, top=10, dias=30):
+    """Relatório da empresa: raízes, blocos mais cheios, mais fragmentados e tendência das raízes."""
+    blocos = calcular_utilizacao(empresa)
+    raizes = [bloco for bloco in blocos.values() if bloco['parent_id'] not in blocos]
+    raizes.sort(key=lambda bloco: bloco['bloco'])
+
+    tendencia = defaultdict(list)
+    historico = HistoricoUtilizacaoBloco.objects.filter(
+        bloco_id__in=[bloco['id'] for bloco in raizes],
+        data__gte=timezone.localdate() - timedelta(days=dias),
+    ).order_by('data').values_list('bloco_id', 'data', 'usados', 'percentual')
+    for bloco_id, data, usados, percentual in historico:
+        tendencia[bloco_id].append({'data': data, 'usados': usados, 'percentual': percentual})
+
+    return {
+        'empresa': {'id': empresa.id, 'nome': empresa.nome},
+        'total_blocos': len(blocos),
+        'raizes': [dict(bloco, tendencia=tendencia.get(bloco['id'], [])) for bloco in raizes],
+        'mais_utilizados': sorted(blocos.values(), key=lambda bloco: -bloco['percentual'])[:top],
+        'mais_fragmentados': sorted(
+            (bloco for bloco in blocos.values() if bloco['faixas_livres'] > 1),
+            key=lambda bloco: -bloco['fragmentacao'],
+        )[:top],
+    }
+
+
+def registrar_historico_utilizacao(empresa, data=None):
+    """Grava (ou atualiza) a fotografia do dia de todos os blocos da empresa em lote."""
+    data = data or timezone.localdate()
+    registros = [
+        HistoricoUtilizacaoBloco(bloco_id=bloco['id'], data=data, usados=bloco['usados'],
+                                 percentual=bloco['percentual'])
+        for bloco in calcular_utilizacao(empresa).values()
+    ]
+    HistoricoUtilizacaoBloco.objects.bulk_create(
+        registros, batch_size=TAMANHO_LOTE, update_conflicts=True,
+        unique_fields=['bloco', 'data'], update_fields=['usados', 'percentual'],
+    )
+    return len(registros)
+
+
+MAX_SUB_BLOCOS = 16384
+
+
+def _espaco_livre(bloco):
+    """Faixas inteiras do bloco (incluindo rede e broadcast) ainda não ocupadas por sub-blocos."""
+    rede = bloco.network()
+    ocupadas = []
+    for bloco_cidr in bloco.sub_blocos.values_list('bloco_cidr', flat=True):
+        filho = ip_network(bloco_cidr, strict=False)
+        ocupadas.append((int(filho.network_address), int(filho.broadcast_address)))
+    return rede, _faixas_livres(int(rede.network_address), int(rede.broadcast_address), ocupadas)
+
+
+def _primeiro_alinhado(inicio, tamanho):
+    return -(-inicio // tamanho) * tamanho
+
+
+def planejar_subdivisao(bloco, novo_prefixo=None, prefixos=None):
+    """
+    Calcula em memória as redes filhas que cabem no espaço livre do bloco, sem gravar nada.
+
+    Com `novo_prefixo`, o espaço livre é coberto inteiro por redes daquele tamanho. Com `prefixos`
+    (VLSM, ex.: [26, 26, 30]), os tamanhos são alocados dos maiores para os menores pelo AlocadorBuddy
+    (best-fit). Retorna as redes ordenadas por endereço ou levanta ValidationError.
+    """
+    rede, livres = _espaco_livre(bloco)
+    bits = rede.max_prefixlen
+    classe = rede.__class__
+
+    if (novo_prefixo is None) == (not prefixos):
+        raise ValidationError("Informe o novo prefixo ou a lista de prefixos (VLSM).")
+
+    pedidos = [novo_prefixo] if novo_prefixo is not None else list(prefixos)
+    for prefixo in pedidos:
+        if not rede.prefixlen < prefixo <= bits:
+            raise ValidationError(f"O prefixo /{prefixo} deve estar entre /{rede.prefixlen + 1} e /{bits}.")
+
+    redes = []
+    if novo_prefixo is not None:
+        tamanho = 2 ** (bits - novo_prefixo)
+        faixas = [(_primeiro_alinhado(inicio, tamanho), fim) for inicio, fim in livres]
+        quantidade = sum(max((fim + 1 - primeiro) // tamanho, 0) for primeiro, fim in faixas)
+        if quantidade > MAX_SUB_BLOCOS:
+            raise ValidationError(f"A subdivisão geraria {quantidade} sub-blocos (máximo {MAX_SUB_BLOCOS}).")
+        for primeiro, fim in faixas:
+            for inicio in range(primeiro, fim - tamanho + 2, tamanho):
+                redes.append(classe((inicio, novo_prefixo)))
+    else:
+        if len(pedidos) > MAX_SUB_BLOCOS:
+            raise ValidationError(f"Máximo de {MAX_SUB_BLOCOS} sub-blocos por subdivisão.")
+        alocador = AlocadorBuddy(livres)
+        for prefixo in sorted(pedidos):
+            inicio = alocador.alocar(2 ** (bits - prefixo))
+            if inicio is None:
+                raise ValidationError(f"Não há espaço livre alinhado para um /{prefixo} em {bloco.bloco_cidr}.")
+            redes.append(classe((inicio, prefixo)))
+        redes.sort(key=lambda item: int(item.network_address))
+
+    return redes
+
+
+def planejar_vlsm(bloco, hosts):
+    """
+    Prévia do VLSM para uma lista de quantidades de hosts: cada pedido vira o menor prefixo que o
+    comporta e o plano é montado por planejar_subdivisao (sem gravar). Retorna um dicionário com
+    'prefixos' (para subdividir_bloco), 'redes' [{'bloco', 'hosts', 'utilizaveis'}] e 'livres_apos'.
+    """
+    rede = bloco.network()
+    prefixos = []
+    for quantidade in hosts:
+        prefixo = prefixo_para_hosts(quantidade, rede.version)
+        if quantidade < 1 or prefixo is None or prefixo <= rede.prefixlen:
+            raise ValidationError(f"Não é possível acomodar {quantidade} hosts em um sub-bloco de {bloco.bloco_cidr}.")
+        prefixos.append(prefixo)
+
+    redes = planejar_subdivisao(bloco, prefixos=prefixos)
+
+    # Associa cada rede ao maior pedido que ela atende (os pedidos do mesmo prefixo são equivalentes)
+    pedidos = defaultdict(list)
+    for quantidade, prefixo in sorted(zip(hosts, prefixos), reverse=True):
+        pedidos[prefixo].append(quantidade)
+
+    linhas = []
+    for subrede in redes:
+        primeiro, ultimo = faixa_utilizavel(subrede)
+        linhas.append({
+            'bloco': str(subrede),
+            'hosts': pedidos[subrede.prefixlen].pop(0),
+            'utilizaveis': ultimo - primeiro + 1,
+        })
+
+    _, livres = _espaco_livre(bloco)
+    ocupado = sum(subrede.num_addresses for subrede in redes)
+    return {
+        'bloco': bloco.bloco_cidr,
+        'prefixos': prefixos,
+        'redes': linhas,
+        'livres_apos': sum(fim - inicio + 1 for inicio, fim in livres) - ocupado,
+    }
+
+
+def subdividir_bloco(bloco, novo_prefixo=None, prefixos=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Cria de uma vez, em uma transação, os sub-blocos planejados por planejar_subdivisao.
+
+    O plano é validado uma única vez (validar_blocos_em_lote) e gravado com bulk_create; caminho,
+    profundidade e faixas numéricas já saem calculados (o caminho depende do id, então é completado
+    por um único UPDATE). Retorna a árvore do bloco com os novos filhos (ver exportar_subarvore).
+    """
+    with transaction.atomic():
+        bloco = BlocoIP.objects.select_for_update().select_related('empresa').get(pk=bloco.pk)
+        redes = planejar_subdivisao(bloco, novo_prefixo=novo_prefixo, prefixos=prefixos)
+
+        erros = validar_blocos_em_lote(bloco.empresa, [(str(rede), bloco) for rede in redes])
+        if erros:
+            raise ValidationError([mensagem for _, mensagem in erros[:10]])
+
+        BlocoIP.objects.bulk_create([
+            BlocoIP(
+                empresa_id=bloco.empresa_id,
+                tipo_ip=bloco.tipo_ip,
+                bloco_cidr=str(rede),
+                parent=bloco,
+                profundidade=bloco.profundidade + 1,
+                inicio_numerico=chave_numerica(rede.network_address),
+                fim_numerico=chave_numerica(rede.broadcast_address),
+            )
+            for rede in redes
+        ], batch_size=tamanho_lote)
+
+        BlocoIP.objects.filter(parent=bloco, caminho='').update(
+            caminho=Concat(Value(bloco.caminho), Cast('id', output_field=models.CharField()), Value('/'))
+        )
+        if redes:
+            BlocoIP.objects.filter(pk=bloco.pk).update(tem_sub_blocos=True)
+
+        # bulk_create não dispara os sinais que mantêm a árvore de prefixos
+        transaction.on_commit(lambda: invalidar_arvore(bloco.empresa_id))
+
+    return exportar_subarvore(bloco, profundidade_maxima=1, incluir_ips=False)
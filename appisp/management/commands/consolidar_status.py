@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from appisp.monitoramento import consolidar_status
+
+
+class Command(BaseCommand):
+    help = ('Consolida as amostras de status em janelas de 5 minutos e 1 hora e remove os dados além da '
+            'retenção (o monitor já faz isso periodicamente; use em cron quando ele não estiver rodando)')
+
+    def handle(self, *args, **options):
+        relatorio = consolidar_status()
+        self.stdout.write(self.style.SUCCESS(
+            f"{relatorio['5m']} agregados de 5 minutos e {relatorio['1h']} de 1 hora gravados; "
+            f"{relatorio['amostras_removidas']} amostras e {relatorio['agregados_removidos']} agregados removidos."
+        ))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from appisp.models import IntegracaoZabbix
+from appisp.zabbix import ingerir_status_zabbix
+
+
+class Command(BaseCommand):
+    help = 'Atualiza o status dos equipamentos com a disponibilidade dos hosts no Zabbix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas as integrações ativas)')
+        parser.add_argument('--intervalo', type=int,
+                            help='Repete a cada N segundos em vez de executar uma única vez')
+
+    def handle(self, *args, **options):
+        integracoes = IntegracaoZabbix.objects.filter(ativo=True).select_related('empresa')
+        if options['empresa']:
+            integracoes = integracoes.filter(empresa_id=options['empresa'])
+        if not integracoes.exists():
+            raise CommandError("Nenhuma integração com Zabbix ativa encontrada.")
+
+        while True:
+            close_old_connections()
+            for integracao in integracoes:
+                try:
+                    relatorio = ingerir_status_zabbix(integracao)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"{integracao.empresa.nome}: {e}"))
+                    continue
+                self.stdout.write(self.style.SUCCESS(
+                    f"{integracao.empresa.nome}: {relatorio['equipamentos']} equipamentos, "
+                    f"{relatorio['online']} online, {relatorio['offline']} offline, "
+                    f"{relatorio['alterados']} alterados."
+                ))
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
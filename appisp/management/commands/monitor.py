@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appisp.models import Equipamento
+from appisp.monitoramento import INTERVALO_CONSOLIDACAO, INTERVALO_GRAVACAO, INTERVALO_RECARGA, Monitor
+from appisp.sondagem import SIMULTANEAS, TIMEOUT
+
+
+class Command(BaseCommand):
+    help = ('Monitoramento contínuo: verifica cada equipamento no seu intervalo (por tipo ou do cadastro) e '
+            'grava as mudanças de status em lote')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+        parser.add_argument('--simultaneas', type=int, default=SIMULTANEAS,
+                            help=f'Máximo de hosts sondados ao mesmo tempo (padrão: {SIMULTANEAS})')
+        parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                            help=f'Segundos de espera por resposta (padrão: {TIMEOUT})')
+        parser.add_argument('--intervalo-gravacao', type=float, default=INTERVALO_GRAVACAO,
+                            help=f'Segundos entre as gravações dos resultados (padrão: {INTERVALO_GRAVACAO})')
+        parser.add_argument('--intervalo-recarga', type=float, default=INTERVALO_RECARGA,
+                            help=f'Segundos entre as releituras da lista de equipamentos (padrão: {INTERVALO_RECARGA})')
+        parser.add_argument('--intervalo-consolidacao', type=float, default=INTERVALO_CONSOLIDACAO,
+                            help=f'Segundos entre as consolidações da série temporal (padrão: {INTERVALO_CONSOLIDACAO})')
+
+    def handle(self, *args, **options):
+        equipamentos = Equipamento.objects.all()
+        if options['empresa']:
+            equipamentos = equipamentos.filter(empresa_id=options['empresa'])
+        if not equipamentos.exists():
+            raise CommandError("Nenhum equipamento encontrado.")
+
+        monitor = Monitor(
+            equipamentos, simultaneas=options['simultaneas'], timeout=options['timeout'],
+            intervalo_gravacao=options['intervalo_gravacao'], intervalo_recarga=options['intervalo_recarga'],
+            intervalo_consolidacao=options['intervalo_consolidacao'],
+        )
+        self.stdout.write("Monitoramento iniciado.")
+        try:
+            monitor.executar()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS(
+                f"Monitoramento encerrado: {monitor.sondados} verificações, {monitor.alterados} mudanças de status."
+            ))
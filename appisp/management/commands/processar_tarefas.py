@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from appisp.tarefas import executar, liberar_abandonadas, reservar_proxima
+
+
+class Command(BaseCommand):
+    help = 'Worker da fila de sincronizações (Zabbix/NetBox): executa as tarefas pendentes em ordem de criação'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Processa as tarefas pendentes e sai (para uso em cron)')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera quando a fila está vazia (padrão: 2)')
+
+    def handle(self, *args, **options):
+        abandonadas = liberar_abandonadas()
+        if abandonadas:
+            self.stdout.write(self.style.WARNING(f"{abandonadas} tarefa(s) abandonada(s) marcada(s) como falha."))
+
+        try:
+            while True:
+                close_old_connections()
+                tarefa = reservar_proxima()
+                if tarefa is None:
+                    if options['uma_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f"Executando {tarefa}...")
+                executar(tarefa)
+                estilo = self.style.SUCCESS if tarefa.status == 'concluida' else self.style.ERROR
+                self.stdout.write(estilo(f"{tarefa}"))
+        except KeyboardInterrupt:
+            self.stdout.write("Worker encerrado.")
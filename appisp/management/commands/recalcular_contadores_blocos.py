@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appisp.ipam import recalcular_contadores_blocos
+from appisp.models import Empresa
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores de utilização (IPs usados, gateway, sub-blocos) dos blocos de IP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+
+    def handle(self, *args, **options):
+        empresa = None
+        if options['empresa']:
+            try:
+                empresa = Empresa.objects.get(pk=options['empresa'])
+            except Empresa.DoesNotExist:
+                raise CommandError(f"Empresa {options['empresa']} não encontrada.")
+
+        corrigidos = recalcular_contadores_blocos(empresa=empresa)
+        self.stdout.write(self.style.SUCCESS(f"{corrigidos} blocos com contadores corrigidos."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from appisp.ipam import registrar_historico_utilizacao
+from appisp.models import Empresa
+
+
+class Command(BaseCommand):
+    help = 'Grava a fotografia diária de utilização dos blocos de IP (usada na tendência do relatório)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+
+    def handle(self, *args, **options):
+        empresas = Empresa.objects.all()
+        if options['empresa']:
+            empresas = empresas.filter(pk=options['empresa'])
+
+        for empresa in empresas:
+            total = registrar_historico_utilizacao(empresa)
+            self.stdout.write(self.style.SUCCESS(f"{empresa.nome}: {total} blocos registrados."))
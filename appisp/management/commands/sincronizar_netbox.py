@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from appisp.models import IntegracaoNetbox
+from appisp.netbox import IMPORTADORES_NETBOX, sincronizar_netbox
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza equipamentos, portas, blocos e endereços IP com o NetBox (incremental por padrão)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas as integrações ativas)')
+        parser.add_argument('--endpoint', action='append', choices=list(IMPORTADORES_NETBOX),
+                            help='Endpoint a sincronizar (pode repetir; padrão: todos)')
+        parser.add_argument('--completo', action='store_true', help='Ignora as marcas d\'água e baixa tudo')
+
+    def handle(self, *args, **options):
+        integracoes = IntegracaoNetbox.objects.filter(ativo=True).select_related('empresa')
+        if options['empresa']:
+            integracoes = integracoes.filter(empresa_id=options['empresa'])
+        if not integracoes.exists():
+            raise CommandError("Nenhuma integração com NetBox ativa encontrada.")
+
+        for integracao in integracoes:
+            relatorios = sincronizar_netbox(integracao, options['endpoint'], completo=options['completo'])
+            integracao.ultima_sincronizacao = now()
+            integracao.save(update_fields=['ultima_sincronizacao'])
+            for endpoint, relatorio in relatorios.items():
+                estilo = self.style.WARNING if relatorio['erros'] else self.style.SUCCESS
+                self.stdout.write(estilo(
+                    f"{integracao.empresa.nome} {endpoint}: {relatorio['linhas']} linhas, "
+                    f"{relatorio['criados']} criados, {relatorio['atualizados']} atualizados, "
+                    f"{relatorio['removidos']} removidos, {relatorio['desvinculados']} desvinculados, "
+                    f"{len(relatorio['erros'])} erros "
+                    f"({relatorio['tempo']:.1f}s)"
+                ))
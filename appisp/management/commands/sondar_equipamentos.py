@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appisp.models import Equipamento
+from appisp.monitoramento import gravar_sondagem
+from appisp.sondagem import CONTAGEM, SIMULTANEAS, TIMEOUT, sondar_equipamentos
+
+
+class Command(BaseCommand):
+    help = 'Sonda a disponibilidade dos equipamentos (ICMP, com fallback TCP na porta de gerência) e mostra RTT e perda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+        parser.add_argument('--simultaneas', type=int, default=SIMULTANEAS,
+                            help=f'Máximo de hosts sondados ao mesmo tempo (padrão: {SIMULTANEAS})')
+        parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                            help=f'Segundos de espera por resposta (padrão: {TIMEOUT})')
+        parser.add_argument('--contagem', type=int, default=CONTAGEM,
+                            help=f'Sondas por host, para medir a perda (padrão: {CONTAGEM})')
+        parser.add_argument('--gravar', action='store_true',
+                            help='Atualiza o status dos equipamentos (só as mudanças) e o histórico')
+
+    def handle(self, *args, **options):
+        equipamentos = Equipamento.objects.only('id', 'nome', 'ip', 'porta', 'status').order_by('nome')
+        if options['empresa']:
+            equipamentos = equipamentos.filter(empresa_id=options['empresa'])
+        equipamentos = list(equipamentos)
+        if not equipamentos:
+            raise CommandError("Nenhum equipamento encontrado.")
+
+        inicio = time.monotonic()
+        resultados = sondar_equipamentos(
+            equipamentos, simultaneas=options['simultaneas'], timeout=options['timeout'],
+            contagem=options['contagem'],
+        )
+        tempo = time.monotonic() - inicio
+
+        for equipamento in equipamentos:
+            resultado = resultados[equipamento.pk]
+            if resultado['status'] == 'online':
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{equipamento.nome} ({equipamento.ip}): online via {resultado['metodo']}, "
+                                      f"{resultado['rtt']} ms, {resultado['perda']}% de perda")
+            else:
+                self.stdout.write(self.style.WARNING(f"{equipamento.nome} ({equipamento.ip}): offline"))
+
+        if options['gravar']:
+            alterados = gravar_sondagem(equipamentos, resultados)
+            self.stdout.write(f"{len(alterados)} equipamento(s) mudaram de status.")
+
+        online = sum(1 for resultado in resultados.values() if resultado['status'] == 'online')
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(equipamentos)} equipamentos sondados em {tempo:.1f}s: {online} online, "
+            f"{len(equipamentos) - online} offline."
+        ))
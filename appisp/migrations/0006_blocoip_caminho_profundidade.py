@@ -0,0 +1,50 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+def preencher_caminhos(apps, schema_editor):
+    BlocoIP = apps.get_model('appisp', 'BlocoIP')
+    pais = dict(BlocoIP.objects.values_list('id', 'parent_id'))
+    caminhos = {}
+
+    def montar(bloco_id):
+        # Sobe até a raiz (ou até um bloco já resolvido) e desce preenchendo os caminhos
+        pilha = []
+        atual = bloco_id
+        while atual is not None and atual not in caminhos and atual not in pilha:
+            pilha.append(atual)
+            atual = pais.get(atual)
+        prefixo, profundidade = caminhos.get(atual, ('/', -1))
+        for item in reversed(pilha):
+            prefixo, profundidade = f"{prefixo}{item}/", profundidade + 1
+            caminhos[item] = (prefixo, profundidade)
+
+    for bloco_id in pais:
+        montar(bloco_id)
+
+    blocos = list(BlocoIP.objects.only('id'))
+    for bloco in blocos:
+        bloco.caminho, bloco.profundidade = caminhos[bloco.id]
+    BlocoIP.objects.bulk_update(blocos, ['caminho', 'profundidade'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0005_patrimonio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blocoip',
+            name='caminho',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=512),
+        ),
+        migrations.AddField(
+            model_name='blocoip',
+            name='profundidade',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_caminhos, migrations.RunPython.noop),
+    ]
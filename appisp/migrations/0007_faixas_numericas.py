@@ -0,0 +1,76 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:53
+
+from ipaddress import ip_address, ip_network
+
+from django.db import migrations, models
+
+
+def preencher_faixas(apps, schema_editor):
+    BlocoIP = apps.get_model('appisp', 'BlocoIP')
+    EnderecoIP = apps.get_model('appisp', 'EnderecoIP')
+
+    blocos = []
+    for bloco in BlocoIP.objects.only('id', 'bloco_cidr').iterator(chunk_size=500):
+        try:
+            rede = ip_network(bloco.bloco_cidr, strict=False)
+        except ValueError:
+            continue
+        bloco.inicio_numerico = f"{int(rede.network_address):032x}"
+        bloco.fim_numerico = f"{int(rede.broadcast_address):032x}"
+        blocos.append(bloco)
+    BlocoIP.objects.bulk_update(blocos, ['inicio_numerico', 'fim_numerico'], batch_size=500)
+
+    enderecos = []
+    for endereco in EnderecoIP.objects.exclude(ip__isnull=True).only('id', 'ip').iterator(chunk_size=500):
+        endereco.ip_numerico = f"{int(ip_address(endereco.ip)):032x}"
+        enderecos.append(endereco)
+        if len(enderecos) >= 500:
+            EnderecoIP.objects.bulk_update(enderecos, ['ip_numerico'])
+            enderecos = []
+    EnderecoIP.objects.bulk_update(enderecos, ['ip_numerico'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0006_blocoip_caminho_profundidade'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='enderecoip',
+            options={'ordering': ['ip_numerico']},
+        ),
+        migrations.AddField(
+            model_name='blocoip',
+            name='fim_numerico',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='blocoip',
+            name='inicio_numerico',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='enderecoip',
+            name='ip_numerico',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='blocoip',
+            index=models.Index(fields=['empresa', 'tipo_ip', 'inicio_numerico', 'fim_numerico'], name='blocoip_empresa_faixa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blocoip',
+            index=models.Index(fields=['tipo_ip', 'inicio_numerico', 'fim_numerico'], name='blocoip_faixa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enderecoip',
+            index=models.Index(fields=['bloco', 'ip_numerico'], name='enderecoip_bloco_ip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enderecoip',
+            index=models.Index(fields=['ip_numerico'], name='enderecoip_ip_idx'),
+        ),
+        migrations.RunPython(preencher_faixas, migrations.RunPython.noop),
+    ]
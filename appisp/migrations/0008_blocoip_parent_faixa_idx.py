@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0007_faixas_numericas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blocoip',
+            index=models.Index(fields=['parent', 'tipo_ip', 'inicio_numerico'], name='blocoip_parent_faixa_idx'),
+        ),
+    ]
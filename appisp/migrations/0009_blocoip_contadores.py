@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:57
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def preencher_contadores(apps, schema_editor):
+    BlocoIP = apps.get_model('appisp', 'BlocoIP')
+    EnderecoIP = apps.get_model('appisp', 'EnderecoIP')
+
+    usados = dict(EnderecoIP.objects.values_list('bloco_id').annotate(total=Count('id')).order_by())
+    gateways = dict(EnderecoIP.objects.filter(is_gateway=True).values_list('bloco_id', 'ip'))
+    com_filhos = set(BlocoIP.objects.filter(parent__isnull=False).values_list('parent_id', flat=True))
+
+    blocos = list(BlocoIP.objects.only('id'))
+    for bloco in blocos:
+        bloco.ips_usados = usados.get(bloco.id, 0)
+        bloco.gateway_ip = gateways.get(bloco.id)
+        bloco.tem_sub_blocos = bloco.id in com_filhos
+    BlocoIP.objects.bulk_update(blocos, ['ips_usados', 'gateway_ip', 'tem_sub_blocos'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0008_blocoip_parent_faixa_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blocoip',
+            name='gateway_ip',
+            field=models.GenericIPAddressField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='blocoip',
+            name='ips_usados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blocoip',
+            name='tem_sub_blocos',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
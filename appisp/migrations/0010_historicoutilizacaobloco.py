@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0009_blocoip_contadores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricoUtilizacaoBloco',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('usados', models.PositiveIntegerField(default=0)),
+                ('percentual', models.FloatField(default=0)),
+                ('bloco', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_utilizacao', to='appisp.blocoip')),
+            ],
+            options={
+                'verbose_name_plural': 'Histórico de utilização dos blocos',
+                'ordering': ['-data'],
+                'unique_together': {('bloco', 'data')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0010_historicoutilizacaobloco'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SincronizacaoNetbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(choices=[('dcim/devices', 'Equipamentos'), ('dcim/interfaces', 'Portas'), ('ipam/prefixes', 'Blocos IP'), ('ipam/ip-addresses', 'Endereços IP')], max_length=30)),
+                ('ultima_alteracao', models.DateTimeField(blank=True, null=True)),
+                ('executado_em', models.DateTimeField(auto_now=True)),
+                ('integracao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sincronizacoes', to='appisp.integracaonetbox')),
+            ],
+            options={
+                'verbose_name_plural': 'Sincronizações com NetBox',
+                'unique_together': {('integracao', 'endpoint')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VinculoNetbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(choices=[('dcim/devices', 'Equipamentos'), ('dcim/interfaces', 'Portas'), ('ipam/prefixes', 'Blocos IP'), ('ipam/ip-addresses', 'Endereços IP')], max_length=30)),
+                ('netbox_id', models.PositiveBigIntegerField()),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('integracao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos', to='appisp.integracaonetbox')),
+            ],
+            options={
+                'verbose_name_plural': 'Vínculos com NetBox',
+                'unique_together': {('integracao', 'endpoint', 'netbox_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0011_netbox_incremental'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaSincronizacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('zabbix_equipamentos', 'Zabbix - Equipamentos'), ('zabbix_portas', 'Zabbix - Portas'), ('netbox', 'NetBox')], max_length=30)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou'), ('cancelada', 'Cancelada')], default='pendente', max_length=20)),
+                ('cancelar', models.BooleanField(default=False, help_text='Pedido de cancelamento, atendido pelo worker')),
+                ('etapa', models.CharField(blank=True, default='', max_length=100)),
+                ('processados', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(blank=True, null=True)),
+                ('resultado', models.JSONField(blank=True, default=dict)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, default='', max_length=100)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tarefas_sincronizacao', to='appisp.empresa')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de sincronização',
+                'verbose_name_plural': 'Tarefas de sincronização',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='tarefa_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0012_tarefasincronizacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipamento',
+            name='ultimo_contato',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Última vez em que o equipamento foi visto online pelo monitoramento', null=True, verbose_name='Último contato'),
+        ),
+        migrations.AlterField(
+            model_name='tarefasincronizacao',
+            name='tipo',
+            field=models.CharField(choices=[('zabbix_equipamentos', 'Zabbix - Equipamentos'), ('zabbix_portas', 'Zabbix - Portas'), ('zabbix_status', 'Zabbix - Status'), ('netbox', 'NetBox')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0013_equipamento_ultimo_contato'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipamento',
+            name='status_alterado_em',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Quando o status mudou pela última vez', null=True, verbose_name='Status alterado em'),
+        ),
+        migrations.AddField(
+            model_name='equipamento',
+            name='ultima_verificacao',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Última vez em que o status do equipamento foi verificado', null=True, verbose_name='Última verificação'),
+        ),
+        migrations.CreateModel(
+            name='HistoricoStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Ativo', 'Ativo'), ('Inativo', 'Inativo')], max_length=20)),
+                ('origem', models.CharField(choices=[('sondagem', 'Sondagem'), ('zabbix', 'Zabbix'), ('api', 'API')], max_length=10)),
+                ('registrado_em', models.DateTimeField(db_index=True)),
+                ('equipamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_status', to='appisp.equipamento')),
+            ],
+            options={
+                'verbose_name': 'Histórico de status',
+                'verbose_name_plural': 'Histórico de status',
+                'ordering': ['-registrado_em'],
+                'indexes': [models.Index(fields=['equipamento', 'registrado_em'], name='historico_status_equip_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0014_status_historico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipamento',
+            name='intervalo_verificacao',
+            field=models.PositiveIntegerField(blank=True, help_text='Segundos entre as verificações do monitoramento (vazio: padrão do tipo; 0: não monitorar)', null=True, verbose_name='Intervalo de verificação'),
+        ),
+    ]
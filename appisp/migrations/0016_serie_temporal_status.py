@@ -0,0 +1,48 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0015_equipamento_intervalo_verificacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregadoStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('5m', '5 minutos'), ('1h', '1 hora')], max_length=2)),
+                ('inicio', models.DateTimeField()),
+                ('amostras', models.PositiveIntegerField(default=0)),
+                ('online', models.PositiveIntegerField(default=0)),
+                ('rtt_medio', models.FloatField(blank=True, null=True)),
+                ('rtt_maximo', models.FloatField(blank=True, null=True)),
+                ('equipamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agregados_status', to='appisp.equipamento')),
+            ],
+            options={
+                'verbose_name': 'Agregado de status',
+                'verbose_name_plural': 'Agregados de status',
+                'indexes': [models.Index(fields=['periodo', 'inicio'], name='agregado_status_periodo_idx')],
+                'unique_together': {('equipamento', 'periodo', 'inicio')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AmostraStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registrado_em', models.DateTimeField()),
+                ('online', models.BooleanField()),
+                ('rtt', models.FloatField(blank=True, help_text='Tempo de resposta em milissegundos', null=True)),
+                ('equipamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amostras_status', to='appisp.equipamento')),
+            ],
+            options={
+                'verbose_name': 'Amostra de status',
+                'verbose_name_plural': 'Amostras de status',
+                'indexes': [models.Index(fields=['registrado_em'], name='amostra_status_data_idx'), models.Index(fields=['equipamento', 'registrado_em'], name='amostra_status_equip_idx')],
+            },
+        ),
+    ]
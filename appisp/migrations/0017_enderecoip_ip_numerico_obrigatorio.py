@@ -0,0 +1,44 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:37
+
+from ipaddress import ip_address
+
+from django.db import migrations, models
+
+
+def preencher_ip_numerico(apps, schema_editor):
+    EnderecoIP = apps.get_model('appisp', 'EnderecoIP')
+
+    sem_ip = EnderecoIP.objects.filter(ip__isnull=True).count()
+    if sem_ip:
+        raise RuntimeError(
+            f"{sem_ip} EnderecoIP sem ip: preencha ou remova esses registros antes de aplicar esta migração."
+        )
+
+    enderecos = []
+    for endereco in EnderecoIP.objects.filter(ip_numerico='').only('id', 'ip').iterator(chunk_size=500):
+        endereco.ip_numerico = f"{int(ip_address(endereco.ip)):032x}"
+        enderecos.append(endereco)
+        if len(enderecos) >= 500:
+            EnderecoIP.objects.bulk_update(enderecos, ['ip_numerico'])
+            enderecos = []
+    EnderecoIP.objects.bulk_update(enderecos, ['ip_numerico'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0016_serie_temporal_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_ip_numerico, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='enderecoip',
+            name='ip_numerico',
+            field=models.CharField(editable=False, max_length=32),
+        ),
+        migrations.AddConstraint(
+            model_name='enderecoip',
+            constraint=models.CheckConstraint(condition=models.Q(('ip_numerico', ''), _negated=True), name='enderecoip_ip_numerico_preenchido'),
+        ),
+    ]
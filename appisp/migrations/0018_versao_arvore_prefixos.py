@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0017_enderecoip_ip_numerico_obrigatorio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoArvorePrefixos',
+            fields=[
+                ('empresa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='versao_arvore_prefixos', serialize=False, to='appisp.empresa')),
+                ('versao', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0018_versao_arvore_prefixos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blocoip',
+            index=models.Index(fields=['empresa', 'tipo_ip', 'parent', 'inicio_numerico'], name='blocoip_empresa_raiz_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0019_blocoip_empresa_raiz_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vinculonetbox',
+            name='criado_pela_importacao',
+            field=models.BooleanField(default=False),
+        ),
+    ]
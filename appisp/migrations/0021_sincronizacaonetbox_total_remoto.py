@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0020_vinculonetbox_criado_pela_importacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sincronizacaonetbox',
+            name='total_remoto',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appisp', '0021_sincronizacaonetbox_total_remoto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sincronizacaonetbox',
+            name='maior_id_remoto',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
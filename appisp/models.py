@@ -1,12 +1,21 @@
-from django.db import models 
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
 from ipaddress import ip_network, ip_address
 from django.core.exceptions import ValidationError 
 from django.core.validators import RegexValidator
 from django.utils.html import format_html
 from django.contrib.auth.models import User 
+from collections import Counter
+from weakref import WeakKeyDictionary
 import ipaddress
+import threading
 import uuid
 
+from .alocacao import AlocadorIP, chave_numerica, faixa_numerica
+
 
 # Modelo de Empresa
 class Empresa(models.Model):
@@ -138,6 +147,22 @@ class Equipamento(models.Model):
         choices=[('Ativo', 'Ativo'), ('Inativo', 'Inativo')],
         default='Ativo'
     )
+    ultimo_contato = models.DateTimeField(
+        blank=True, null=True, editable=False, verbose_name="Último contato",
+        help_text="Última vez em que o equipamento foi visto online pelo monitoramento"
+    )
+    ultima_verificacao = models.DateTimeField(
+        blank=True, null=True, editable=False, verbose_name="Última verificação",
+        help_text="Última vez em que o status do equipamento foi verificado"
+    )
+    status_alterado_em = models.DateTimeField(
+        blank=True, null=True, editable=False, verbose_name="Status alterado em",
+        help_text="Quando o status mudou pela última vez"
+    )
+    intervalo_verificacao = models.PositiveIntegerField(
+        blank=True, null=True, verbose_name="Intervalo de verificação",
+        help_text="Segundos entre as verificações do monitoramento (vazio: padrão do tipo; 0: não monitorar)"
+    )
     observacao = models.TextField()
 
     class Meta:
@@ -147,6 +172,67 @@ class Equipamento(models.Model):
         return f"{self.nome} ({self.ip})"
 
 
+# Transições de status (Ativo <-> Inativo) dos equipamentos, para análise de quedas e oscilações
+class HistoricoStatus(models.Model):
+    ORIGEM_CHOICES = [('sondagem', 'Sondagem'), ('zabbix', 'Zabbix'), ('api', 'API')]
+
+    equipamento = models.ForeignKey(Equipamento, on_delete=models.CASCADE, related_name='historico_status')
+    status = models.CharField(max_length=20, choices=Equipamento._meta.get_field('status').choices)
+    origem = models.CharField(max_length=10, choices=ORIGEM_CHOICES)
+    registrado_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Histórico de status"
+        verbose_name_plural = "Histórico de status"
+        ordering = ['-registrado_em']
+        indexes = [
+            models.Index(fields=['equipamento', 'registrado_em'], name='historico_status_equip_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipamento} {self.status} em {self.registrado_em}"
+
+
+# Série temporal bruta: uma amostra por verificação de cada equipamento, consolidada em AgregadoStatus
+class AmostraStatus(models.Model):
+    equipamento = models.ForeignKey(Equipamento, on_delete=models.CASCADE, related_name='amostras_status')
+    registrado_em = models.DateTimeField()
+    online = models.BooleanField()
+    rtt = models.FloatField(blank=True, null=True, help_text="Tempo de resposta em milissegundos")
+
+    class Meta:
+        verbose_name = "Amostra de status"
+        verbose_name_plural = "Amostras de status"
+        indexes = [
+            models.Index(fields=['registrado_em'], name='amostra_status_data_idx'),
+            models.Index(fields=['equipamento', 'registrado_em'], name='amostra_status_equip_idx'),
+        ]
+
+
+# Amostras consolidadas por equipamento em janelas de 5 minutos e de 1 hora
+class AgregadoStatus(models.Model):
+    PERIODO_CHOICES = [('5m', '5 minutos'), ('1h', '1 hora')]
+
+    equipamento = models.ForeignKey(Equipamento, on_delete=models.CASCADE, related_name='agregados_status')
+    periodo = models.CharField(max_length=2, choices=PERIODO_CHOICES)
+    inicio = models.DateTimeField()
+    amostras = models.PositiveIntegerField(default=0)
+    online = models.PositiveIntegerField(default=0)
+    rtt_medio = models.FloatField(blank=True, null=True)
+    rtt_maximo = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Agregado de status"
+        verbose_name_plural = "Agregados de status"
+        unique_together = ('equipamento', 'periodo', 'inicio')
+        indexes = [
+            models.Index(fields=['periodo', 'inicio'], name='agregado_status_periodo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipamento} {self.periodo} {self.inicio}"
+
+
 # Modelo para importação do NetBox, depois vou usar em porta
 class Interface(models.Model):
     LADO_CHOICES = [('Frente', 'Frente'), ('Trás', 'Trás')]
@@ -349,6 +435,50 @@ class VlanPorta(models.Model):
             self.vlans_permitidas.remove(self.vlan)
 
 
+class BlocoIPQuerySet(models.QuerySet):
+    def contendo(self, ip):
+        """Blocos que contêm o IP, resolvido pelo índice das faixas numéricas"""
+        endereco = ip_address(ip)
+        chave = chave_numerica(endereco)
+        return self.filter(tipo_ip=f"IPv{endereco.version}", inicio_numerico__lte=chave, fim_numerico__gte=chave)
+
+    def sobrepondo(self, cidr):
+        """Blocos cuja faixa se sobrepõe à do CIDR informado"""
+        rede = ip_network(cidr, strict=False)
+        inicio, fim = faixa_numerica(rede)
+        return self.filter(tipo_ip=f"IPv{rede.version}", inicio_numerico__lte=fim, fim_numerico__gte=inicio)
+
+    def sobreposicao(self, cidr):
+        """
+        Primeiro bloco que se sobrepõe ao CIDR, ou None. Raízes e irmãos não se sobrepõem entre si, então
+        o candidato é o de maior início até o fim do CIDR: uma única descida no índice da faixa, e o fim
+        dele é conferido aqui (filtrar o fim no banco faria a consulta varrer todos os inícios menores).
+        """
+        rede = ip_network(cidr, strict=False)
+        inicio, fim = faixa_numerica(rede)
+        candidato = self.filter(tipo_ip=f"IPv{rede.version}", inicio_numerico__lte=fim).order_by(
+            '-inicio_numerico').first()
+        if candidato is not None and candidato.fim_numerico >= inicio:
+            return candidato
+        return None
+
+    def contar_descendentes(self, blocos):
+        """
+        {pk: quantidade de descendentes} dos blocos informados em uma única consulta agregada: as linhas
+        são restritas aos prefixos de caminho dos blocos e cada um conta as suas com um COUNT filtrado.
+        """
+        blocos = [bloco for bloco in blocos if bloco.caminho]
+        if not blocos:
+            return {}
+        prefixos = Q()
+        contagens = {}
+        for bloco in blocos:
+            prefixos |= Q(caminho__startswith=bloco.caminho)
+            contagens[f'b{bloco.pk}'] = Count('pk', filter=Q(caminho__startswith=bloco.caminho) & ~Q(pk=bloco.pk))
+        totais = self.filter(prefixos).aggregate(**contagens)
+        return {bloco.pk: totais[f'b{bloco.pk}'] for bloco in blocos}
+
+
 # Modelo para Blocos de IP e CIDR
 class BlocoIP(models.Model):
     TIPO_CHOICES = [
@@ -367,18 +497,47 @@ class BlocoIP(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     monitorar = models.BooleanField(default=False)
 
+    # Árvore materializada: ids da raiz até o bloco ("/1/5/12/") e quantidade de níveis até a raiz.
+    # Mantidos no save() e no delete (ver reposicionar_sub_blocos), nunca editados à mão.
+    caminho = models.CharField(max_length=512, blank=True, default='', db_index=True, editable=False)
+    profundidade = models.PositiveIntegerField(default=0, editable=False)
+
+    # Primeiro e último endereço do bloco em chave numérica (ver alocacao.chave_numerica), mantidos no save()
+    inicio_numerico = models.CharField(max_length=32, blank=True, default='', editable=False)
+    fim_numerico = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+    # Contadores da listagem, mantidos no save/delete de EnderecoIP e BlocoIP
+    # (recalculáveis com "manage.py recalcular_contadores_blocos")
+    ips_usados = models.PositiveIntegerField(default=0, editable=False)
+    gateway_ip = models.GenericIPAddressField(blank=True, null=True, editable=False)
+    tem_sub_blocos = models.BooleanField(default=False, editable=False)
+
+    objects = BlocoIPQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Blocos de IP"
         ordering = ['bloco_cidr']
+        indexes = [
+            models.Index(fields=['empresa', 'tipo_ip', 'inicio_numerico', 'fim_numerico'], name='blocoip_empresa_faixa_idx'),
+            models.Index(fields=['tipo_ip', 'inicio_numerico', 'fim_numerico'], name='blocoip_faixa_idx'),
+            models.Index(fields=['parent', 'tipo_ip', 'inicio_numerico'], name='blocoip_parent_faixa_idx'),
+            models.Index(fields=['empresa', 'tipo_ip', 'parent', 'inicio_numerico'], name='blocoip_empresa_raiz_idx'),
+        ]
 
     def nivel(self):
         """Quantidade de níveis até a raiz (parent=None)"""
-        nivel = 0
-        parent = self.parent
-        while parent:
-            nivel += 1
-            parent = parent.parent
-        return nivel
+        return self.profundidade
+
+    def descendentes(self, incluir_proprio=False):
+        """Toda a subárvore do bloco em uma única consulta pelo prefixo do caminho"""
+        qs = BlocoIP.objects.filter(caminho__startswith=self.caminho)
+        if not incluir_proprio:
+            qs = qs.exclude(pk=self.pk)
+        return qs
+
+    def ancestrais_ids(self):
+        """Ids dos blocos acima deste, da raiz até o parent"""
+        return [int(parte) for parte in self.caminho.strip('/').split('/')[:-1] if parte]
 
     def clean(self):
         """Validações para garantir que o bloco é correto e não se sobrepõe a outros blocos"""
@@ -399,40 +558,44 @@ class BlocoIP(models.Model):
                 raise ValidationError(f"O bloco {self.bloco_cidr} não está dentro de {self.parent.bloco_cidr}.")
 
         # 3. Evitar sobreposição com blocos sem Parent (blocos raiz da mesma empresa e do mesmo tipo)
-        overlapping = BlocoIP.objects.filter(empresa=self.empresa, parent__isnull=True, tipo_ip=self.tipo_ip).exclude(
-            id=self.id)
-
-        for existing in overlapping:
-            existing_bloco = ipaddress.ip_network(existing.bloco_cidr, strict=False)
-            if not self.parent and bloco.overlaps(existing_bloco):
+        if not self.parent:
+            existing = BlocoIP.objects.filter(empresa=self.empresa, parent__isnull=True).exclude(
+                id=self.id).sobreposicao(bloco)
+            if existing:
                 raise ValidationError(f"O bloco {self.bloco_cidr} se sobrepõe com {existing.bloco_cidr}.")
 
         # 4. Se tem parent, verificar sobreposição entre irmãos
         if self.parent:
-            siblings = BlocoIP.objects.filter(parent=self.parent).exclude(id=self.id)
+            sibling = BlocoIP.objects.filter(parent=self.parent).exclude(id=self.id).sobreposicao(bloco)
+            if sibling:
+                raise ValidationError(
+                    f"O bloco {self.bloco_cidr} se sobrepõe com outro bloco irmão ({sibling.bloco_cidr}).")
 
-            for sibling in siblings:
-                sibling_bloco = ipaddress.ip_network(sibling.bloco_cidr, strict=False)
-                if bloco.overlaps(sibling_bloco):
-                    raise ValidationError(
-                        f"O bloco {self.bloco_cidr} se sobrepõe com outro bloco irmão ({sibling_bloco}).")
+        # 5. Impedir ciclos: o parent não pode estar dentro da subárvore deste bloco
+        if self.parent and self.pk and self.caminho and self.parent.caminho.startswith(self.caminho):
+            raise ValidationError(f"O bloco {self.parent.bloco_cidr} é descendente de {self.bloco_cidr}.")
 
-        # 5. Verificar se o parent pertence à mesma empresa
+        # 6. Verificar se o parent pertence à mesma empresa
         if self.parent and self.parent.empresa != self.empresa:
             raise ValidationError(
                 f"O bloco {self.bloco_cidr} pertence à empresa {self.empresa.nome}, mas o parent {self.parent.bloco_cidr} pertence a {self.parent.empresa.nome}."
             )
 
+    def alocador(self):
+        """ Mapa de ocupação do bloco em faixas inteiras (ver appisp.alocacao) """
+        return AlocadorIP.do_bloco(self)
+
     def sugerir_proximo_ip(self):
         """ Retorna o próximo IP disponível dentro do bloco """
-        bloco_rede = ipaddress.ip_network(self.bloco_cidr, strict=False)
-        ips_ocupados = set(EnderecoIP.objects.filter(bloco=self).values_list('ip', flat=True))
+        return self.alocador().proximo_livre()  # None se não houver IP disponível
 
-        for ip in bloco_rede.hosts():  # Percorre todos os IPs disponíveis no bloco
-            if str(ip) not in ips_ocupados:
-                return str(ip)
+    def sugerir_proximos_ips(self, quantidade):
+        """ Retorna até `quantidade` IPs disponíveis, em ordem """
+        return self.alocador().proximos_livres(quantidade)
 
-        return None  # Se não houver IP disponível
+    def sugerir_faixa_livre(self, tamanho):
+        """ Retorna (primeiro, ultimo) da primeira faixa contígua livre com `tamanho` IPs """
+        return self.alocador().primeira_faixa_livre(tamanho)
 
     def network(self):
         return ip_network(self.bloco_cidr, strict=False)
@@ -450,7 +613,56 @@ class BlocoIP(models.Model):
         if self.equipamento_id is None:
             self.equipamento = None  # Garante que não há valor inválido
         self.clean()
-        super().save(*args, **kwargs)
+        self.inicio_numerico, self.fim_numerico = faixa_numerica(self.bloco_cidr)
+        with transaction.atomic():
+            parent_anterior = None
+            if self.pk:
+                parent_anterior = BlocoIP.objects.filter(pk=self.pk).values_list('parent_id', flat=True).first()
+            super().save(*args, **kwargs)
+            self.atualizar_caminho()
+
+            if self.parent_id:
+                BlocoIP.objects.filter(pk=self.parent_id, tem_sub_blocos=False).update(tem_sub_blocos=True)
+            if parent_anterior and parent_anterior != self.parent_id:
+                BlocoIP.atualizar_tem_sub_blocos(parent_anterior)
+
+    @staticmethod
+    def atualizar_tem_sub_blocos(bloco_id):
+        BlocoIP.objects.filter(pk=bloco_id).update(
+            tem_sub_blocos=BlocoIP.objects.filter(parent_id=bloco_id).exists()
+        )
+
+    def recalcular_contadores(self):
+        """Recalcula ips_usados, gateway_ip e tem_sub_blocos a partir do banco"""
+        self.ips_usados = self.enderecos.count()
+        self.gateway_ip = self.enderecos.filter(is_gateway=True).values_list('ip', flat=True).first()
+        self.tem_sub_blocos = self.sub_blocos.exists()
+        BlocoIP.objects.filter(pk=self.pk).update(
+            ips_usados=self.ips_usados, gateway_ip=self.gateway_ip, tem_sub_blocos=self.tem_sub_blocos
+        )
+
+    def atualizar_caminho(self):
+        """Recalcula caminho/profundidade a partir do parent e leva junto toda a subárvore"""
+        if self.parent_id:
+            caminho_pai, profundidade_pai = BlocoIP.objects.filter(pk=self.parent_id).values_list(
+                'caminho', 'profundidade').get()
+            novo_caminho, nova_profundidade = f"{caminho_pai}{self.pk}/", profundidade_pai + 1
+        else:
+            novo_caminho, nova_profundidade = f"/{self.pk}/", 0
+
+        if novo_caminho == self.caminho and nova_profundidade == self.profundidade:
+            return
+
+        if self.caminho:
+            # Um único UPDATE troca o prefixo do caminho do bloco e de todos os descendentes
+            BlocoIP.objects.filter(caminho__startswith=self.caminho).update(
+                caminho=Concat(Value(novo_caminho), Substr('caminho', len(self.caminho) + 1)),
+                profundidade=F('profundidade') + (nova_profundidade - self.profundidade),
+            )
+        else:
+            BlocoIP.objects.filter(pk=self.pk).update(caminho=novo_caminho, profundidade=nova_profundidade)
+
+        self.caminho, self.profundidade = novo_caminho, nova_profundidade
 
     def __str__(self):
         return f"{self.bloco_cidr} - {self.empresa.nome} ({self.equipamento.nome if self.equipamento else 'Sem equipamento'})"
@@ -464,8 +676,8 @@ class BlocoIP(models.Model):
         if bloco_rede.prefixlen <= 30:
             total -= 2  # Subtrai os 2 IPs (rede e broadcast)
 
-        # Contabiliza os IPs ocupados
-        usados = self.enderecos.count()
+        # Contabiliza os IPs ocupados (contador mantido no save/delete de EnderecoIP)
+        usados = self.ips_usados
 
         if total == 0:
             return 0
@@ -511,6 +723,54 @@ class BlocoIP(models.Model):
     utilizacao_barra.allow_tags = True
 
 
+@receiver(pre_delete, sender=BlocoIP)
+def reposicionar_sub_blocos(sender, instance, **kwargs):
+    """parent é SET_NULL: ao apagar um bloco, os filhos viram raiz e a subárvore sobe junto"""
+    # Relido do banco: num delete em lote (ancestral e descendente juntos) o handler do ancestral já
+    # reescreveu o caminho deste bloco, e a instância carregada antes do delete está desatualizada
+    atual = BlocoIP.objects.filter(pk=instance.pk).values_list('caminho', 'profundidade').first()
+    if not atual or not atual[0]:
+        return
+    caminho, profundidade = atual
+    BlocoIP.objects.filter(caminho__startswith=caminho).exclude(pk=instance.pk).update(
+        caminho=Concat(Value('/'), Substr('caminho', len(caminho) + 1)),
+        profundidade=F('profundidade') - (profundidade + 1),
+    )
+
+
+@receiver(post_delete, sender=BlocoIP)
+def atualizar_parent_removido(sender, instance, **kwargs):
+    if instance.parent_id:
+        BlocoIP.atualizar_tem_sub_blocos(instance.parent_id)
+
+
+# Fotografia diária da utilização consolidada (bloco + sub-blocos), usada na tendência do relatório
+class HistoricoUtilizacaoBloco(models.Model):
+    bloco = models.ForeignKey('BlocoIP', on_delete=models.CASCADE, related_name='historico_utilizacao')
+    data = models.DateField()
+    usados = models.PositiveIntegerField(default=0)
+    percentual = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Histórico de utilização dos blocos"
+        unique_together = ('bloco', 'data')
+        ordering = ['-data']
+
+    def __str__(self):
+        return f"{self.bloco.bloco_cidr} em {self.data}: {self.percentual:.1f}%"
+
+
+# Versão dos blocos da empresa, incrementada a cada alteração: cada processo confere na busca se a
+# árvore de prefixos que tem em memória ainda é a atual (ver appisp.prefixos)
+class VersaoArvorePrefixos(models.Model):
+    empresa = models.OneToOneField('Empresa', on_delete=models.CASCADE, primary_key=True,
+                                   related_name='versao_arvore_prefixos')
+    versao = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.empresa.nome}: versão {self.versao}"
+
+
 # Classe para cadastro de IP individual
 class EnderecoIP(models.Model):
     bloco = models.ForeignKey('BlocoIP', on_delete=models.CASCADE, related_name='enderecos')
@@ -523,9 +783,20 @@ class EnderecoIP(models.Model):
     is_gateway = models.BooleanField(default=False)
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    # IP em chave numérica (ver alocacao.chave_numerica): ordena e filtra faixas pelo índice.
+    # Preenchido no save() e em todo bulk_create (ipam, netbox); o banco recusa linha sem ele.
+    ip_numerico = models.CharField(max_length=32, editable=False)
+
     class Meta:
         unique_together = ('bloco', 'ip', 'equipamento')
-        ordering = ['ip']
+        ordering = ['ip_numerico']
+        indexes = [
+            models.Index(fields=['bloco', 'ip_numerico'], name='enderecoip_bloco_ip_idx'),
+            models.Index(fields=['ip_numerico'], name='enderecoip_ip_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=~models.Q(ip_numerico=''), name='enderecoip_ip_numerico_preenchido'),
+        ]
 
     def clean(self):
         """Validações antes de salvar"""
@@ -551,12 +822,7 @@ class EnderecoIP(models.Model):
         sub_blocos = BlocoIP.objects.filter(parent=self.bloco)  # Assume que seu BlocoIP tem campo 'bloco_pai'
         if sub_blocos.exists():
             # Verifica em qual sub-bloco o IP pertence
-            sub_bloco_correto = None
-            for sub_bloco in sub_blocos:
-                rede_sub = ip_network(sub_bloco.bloco_cidr, strict=False)
-                if ip_obj in rede_sub:
-                    sub_bloco_correto = sub_bloco
-                    break
+            sub_bloco_correto = sub_blocos.contendo(ip_obj).first()
 
             if sub_bloco_correto:
                 raise ValidationError(
@@ -602,14 +868,79 @@ class EnderecoIP(models.Model):
                 raise ValidationError("Não há IPs disponíveis neste bloco.")
             self.ip = proximo_ip
 
+        try:
+            self.ip_numerico = chave_numerica(ip_address(self.ip))
+        except ValueError:
+            pass  # IP inválido: o full_clean abaixo aponta o erro no campo
         self.full_clean()  # Validações completas antes de salvar
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                BlocoIP.objects.filter(pk=self.bloco_id).update(ips_usados=F('ips_usados') + 1)
+                if self.is_gateway:
+                    BlocoIP.objects.filter(pk=self.bloco_id).update(gateway_ip=self.ip)
+            else:
+                # Alteração pode trocar bloco, IP ou gateway: recalcula os blocos envolvidos
+                bloco_anterior = EnderecoIP.objects.filter(pk=self.pk).values_list('bloco_id', flat=True).first()
+                super().save(*args, **kwargs)
+                for bloco in BlocoIP.objects.filter(pk__in={self.bloco_id, bloco_anterior}):
+                    bloco.recalcular_contadores()
 
     def __str__(self):
         gateway_status = " (Gateway)" if self.is_gateway else ""
         return f"{self.ip} - {self.equipamento.nome} (Porta: {self.porta.nome}){gateway_status}"
 
 
+# Endereços a descontar por delete em andamento: {origin: (Counter {bloco_id: removidos}, {bloco_id com gateway})}.
+# O Django envia o pre_delete de todos os objetos antes de apagar qualquer um, então no primeiro
+# post_delete o grupo está completo e vira um único UPDATE.
+_descontos = threading.local()
+
+
+def _descontos_pendentes():
+    if not hasattr(_descontos, 'pendentes'):
+        _descontos.pendentes = WeakKeyDictionary()
+    return _descontos.pendentes
+
+
+def descontar_enderecos(removidos, gateways=(), tamanho_lote=500):
+    """Desconta de ips_usados (e limpa o gateway) dos blocos em um UPDATE por lote de blocos"""
+    blocos = list(removidos)
+    for inicio in range(0, len(blocos), tamanho_lote):
+        lote = blocos[inicio:inicio + tamanho_lote]
+        campos = {'ips_usados': Case(
+            *[When(pk=bloco_id, ips_usados__gte=removidos[bloco_id], then=F('ips_usados') - removidos[bloco_id])
+              for bloco_id in lote],
+            default=Value(0),
+        )}
+        com_gateway = [bloco_id for bloco_id in lote if bloco_id in gateways]
+        if com_gateway:
+            campos['gateway_ip'] = Case(When(pk__in=com_gateway, then=Value(None)), default=F('gateway_ip'),
+                                        output_field=models.GenericIPAddressField())
+        BlocoIP.objects.filter(pk__in=lote).update(**campos)
+
+
+@receiver(pre_delete, sender=EnderecoIP)
+def agrupar_endereco_removido(sender, instance, origin=None, **kwargs):
+    if origin is None:
+        return
+    removidos, gateways = _descontos_pendentes().setdefault(origin, (Counter(), set()))
+    removidos[instance.bloco_id] += 1
+    if instance.is_gateway:
+        gateways.add(instance.bloco_id)
+
+
+@receiver(post_delete, sender=EnderecoIP)
+def descontar_endereco_removido(sender, instance, origin=None, **kwargs):
+    """Roda dentro da transação do delete, inclusive em exclusões por queryset e em cascata"""
+    if origin is None:
+        descontar_enderecos(Counter([instance.bloco_id]), {instance.bloco_id} if instance.is_gateway else ())
+        return
+    pendente = _descontos_pendentes().pop(origin, None)
+    if pendente:
+        descontar_enderecos(*pendente)
+
+
 # Modelo de Rack
 class Rack(models.Model):
     nome = models.CharField(max_length=255)
@@ -811,6 +1142,102 @@ class IntegracaoNetbox(models.Model):
         return f'NetBox - {self.empresa.nome}'
 
 
+ENDPOINTS_NETBOX = [
+    ('dcim/devices', 'Equipamentos'),
+    ('dcim/interfaces', 'Portas'),
+    ('ipam/prefixes', 'Blocos IP'),
+    ('ipam/ip-addresses', 'Endereços IP'),
+]
+
+
+# Marca d'água da sincronização incremental: maior last_updated já importado de cada endpoint
+class SincronizacaoNetbox(models.Model):
+    integracao = models.ForeignKey(IntegracaoNetbox, on_delete=models.CASCADE, related_name='sincronizacoes')
+    endpoint = models.CharField(max_length=30, choices=ENDPOINTS_NETBOX)
+    ultima_alteracao = models.DateTimeField(blank=True, null=True)
+    # Quantidade e maior id dos objetos no NetBox na última reconciliação de exclusões
+    # (ver netbox.reconciliar_exclusoes)
+    total_remoto = models.PositiveIntegerField(blank=True, null=True)
+    maior_id_remoto = models.PositiveBigIntegerField(blank=True, null=True)
+    executado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Sincronizações com NetBox"
+        unique_together = ('integracao', 'endpoint')
+
+    def __str__(self):
+        return f"{self.integracao} - {self.endpoint}"
+
+
+# Objeto do NetBox (id no NetBox) importado para um registro local, usado para reconciliar exclusões
+class VinculoNetbox(models.Model):
+    integracao = models.ForeignKey(IntegracaoNetbox, on_delete=models.CASCADE, related_name='vinculos')
+    endpoint = models.CharField(max_length=30, choices=ENDPOINTS_NETBOX)
+    netbox_id = models.PositiveBigIntegerField()
+    objeto_id = models.PositiveBigIntegerField()
+    # Só registros gravados pela importação são apagados quando o objeto some do NetBox; os que já
+    # existiam e foram associados por nome/CIDR apenas perdem o vínculo
+    criado_pela_importacao = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name_plural = "Vínculos com NetBox"
+        unique_together = ('integracao', 'endpoint', 'netbox_id')
+
+    def __str__(self):
+        return f"{self.endpoint} #{self.netbox_id} -> {self.objeto_id}"
+
+
+# Fila de sincronizações executadas em segundo plano pelo comando processar_tarefas
+class TarefaSincronizacao(models.Model):
+    TIPO_CHOICES = [
+        ('zabbix_equipamentos', 'Zabbix - Equipamentos'),
+        ('zabbix_portas', 'Zabbix - Portas'),
+        ('zabbix_status', 'Zabbix - Status'),
+        ('netbox', 'NetBox'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+        ('cancelada', 'Cancelada'),
+    ]
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='tarefas_sincronizacao')
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    cancelar = models.BooleanField(default=False, help_text='Pedido de cancelamento, atendido pelo worker')
+    etapa = models.CharField(max_length=100, blank=True, default='')
+    processados = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(blank=True, null=True)
+    resultado = models.JSONField(default=dict, blank=True)
+    erro = models.TextField(blank=True, default='')
+    tentativas = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(blank=True, null=True)
+    finalizado_em = models.DateTimeField(blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tarefa de sincronização"
+        verbose_name_plural = "Tarefas de sincronização"
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='tarefa_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_tipo_display()} ({self.get_status_display()})"
+
+    @property
+    def percentual(self):
+        if not self.total:
+            return None
+        return round(min(self.processados, self.total) * 100 / self.total, 1)
+
+
 # Modelo de Patrimônio
 class Patrimonio(models.Model):
     STATUS_CHOICES = [
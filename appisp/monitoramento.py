@@ -0,0 +1,428 @@
+import asyncio
+import heapq
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum
+from django.db.models.functions import ExtractMinute, Floor, TruncHour
+from django.utils import timezone
+
+from .ipam import TAMANHO_LOTE
+from .models import AgregadoStatus, AmostraStatus, Equipamento, HistoricoStatus
+from .sondagem import SIMULTANEAS, TIMEOUT, Sonda
+
+# Segundos entre verificações de cada equipamento, por tipo (Equipamento.intervalo_verificacao sobrepõe)
+INTERVALO_PADRAO = 60
+INTERVALOS_POR_TIPO = {
+    'Roteador': 30,
+    'Olt': 30,
+    'Transporte': 30,
+    'Computador': 300,
+    'Impressora': 300,
+    'Telefone': 300,
+}
+TIPOS_SEM_MONITORAMENTO = {'Passivo', 'Patch Panel'}
+# Desvio aleatório (fração do intervalo) aplicado a cada reagendamento
+JITTER = 0.1
+# Teto do intervalo dos equipamentos fora do ar, que é dobrado a cada falha seguida
+BACKOFF_MAXIMO = 600
+INTERVALO_GRAVACAO = 10
+INTERVALO_RECARGA = 300
+
+# Série temporal: amostras brutas consolidadas em janelas de 5 minutos e estas em janelas de 1 hora
+PERIODOS = {'5m': timedelta(minutes=5), '1h': timedelta(hours=1)}
+RETENCAO_AMOSTRAS = timedelta(days=2)
+RETENCAO_AGREGADOS = {'5m': timedelta(days=30), '1h': timedelta(days=365)}
+# Margem para não consolidar uma janela enquanto ainda podem chegar amostras dela
+ATRASO_CONSOLIDACAO = timedelta(minutes=1)
+INTERVALO_CONSOLIDACAO = 300
+
+
+def gravar_status(equipamentos, novos_status, origem, tamanho_lote=TAMANHO_LOTE, rtts=None):
+    """
+    Persiste o resultado de uma verificação de status.
+
+    `equipamentos` são as instâncias verificadas (com `status` carregado) e `novos_status` é
+    {equipamento.pk: 'Ativo'/'Inativo'}. Só os que mudaram de status são regravados, num bulk_update, e
+    cada mudança entra no HistoricoStatus; `ultima_verificacao` e, para os online, `ultimo_contato` são
+    atualizados com um UPDATE por lote. Toda verificação vira uma AmostraStatus (com o RTT de `rtts`,
+    {pk: ms}, quando houver). Devolve a lista dos equipamentos alterados.
+    """
+    agora = timezone.now()
+    rtts = rtts or {}
+    alterados = []
+    online = []
+    offline = []
+    amostras = []
+    for equipamento in equipamentos:
+        status = novos_status.get(equipamento.pk)
+        if status is None:
+            continue
+        (online if status == 'Ativo' else offline).append(equipamento.pk)
+        amostras.append(AmostraStatus(equipamento_id=equipamento.pk, registrado_em=agora, online=status == 'Ativo',
+                                      rtt=rtts.get(equipamento.pk)))
+        if equipamento.status != status:
+            equipamento.status = status
+            equipamento.status_alterado_em = agora
+            alterados.append(equipamento)
+
+    with transaction.atomic():
+        Equipamento.objects.bulk_update(alterados, ['status', 'status_alterado_em'], batch_size=tamanho_lote)
+        HistoricoStatus.objects.bulk_create([
+            HistoricoStatus(equipamento=equipamento, status=equipamento.status, origem=origem, registrado_em=agora)
+            for equipamento in alterados
+        ], batch_size=tamanho_lote)
+        AmostraStatus.objects.bulk_create(amostras, batch_size=tamanho_lote)
+        for ids, campos in ((online, {'ultima_verificacao': agora, 'ultimo_contato': agora}),
+                            (offline, {'ultima_verificacao': agora})):
+            for inicio in range(0, len(ids), tamanho_lote):
+                Equipamento.objects.filter(pk__in=ids[inicio:inicio + tamanho_lote]).update(**campos)
+    return alterados
+
+
+def gravar_sondagem(equipamentos, resultados, tamanho_lote=TAMANHO_LOTE):
+    """Grava o resultado de sondagem.sondar_equipamentos ({pk: {'status': 'online'/'offline', ...}})."""
+    return gravar_status(equipamentos, {
+        pk: 'Ativo' if resultado['status'] == 'online' else 'Inativo' for pk, resultado in resultados.items()
+    }, 'sondagem', tamanho_lote, rtts={pk: resultado['rtt'] for pk, resultado in resultados.items()})
+
+
+def _inicio_janela(momento, periodo):
+    """Início (UTC) da janela de `periodo` que contém `momento`."""
+    segundos = PERIODOS[periodo].total_seconds()
+    return datetime.fromtimestamp(momento.timestamp() // segundos * segundos, tz=dt_timezone.utc)
+
+
+def _janelas_pendentes(periodo, origem, campo, agora):
+    """
+    Intervalo [inicio, fim) de janelas de `periodo` prontas para consolidar a partir de `origem`: da seguinte
+    à última já consolidada (ou da primeira com dados) até a janela que ainda está em andamento.
+    """
+    ultima = AgregadoStatus.objects.filter(periodo=periodo).aggregate(ultima=Max('inicio'))['ultima']
+    if ultima:
+        inicio = ultima + PERIODOS[periodo]
+    else:
+        primeira = origem.aggregate(primeira=Min(campo))['primeira']
+        if primeira is None:
+            return None, None
+        inicio = _inicio_janela(primeira, periodo)
+    return inicio, _inicio_janela(agora - ATRASO_CONSOLIDACAO, periodo)
+
+
+def _gravar_agregados(periodo, grupos, tamanho_lote):
+    agregados = [AgregadoStatus(periodo=periodo, **grupo) for grupo in grupos]
+    AgregadoStatus.objects.bulk_create(
+        agregados, batch_size=tamanho_lote, update_conflicts=True,
+        unique_fields=['equipamento', 'periodo', 'inicio'],
+        update_fields=['amostras', 'online', 'rtt_medio', 'rtt_maximo'],
+    )
+    return len(agregados)
+
+
+def consolidar_status(agora=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Consolida a série temporal e aplica a retenção: amostras brutas viram janelas de 5 minutos e estas,
+    janelas de 1 hora, sempre agrupando no banco (uma consulta por nível). Só são apagados dados mais
+    antigos que a retenção e que já foram consolidados no nível seguinte.
+    """
+    agora = agora or timezone.now()
+    utc = dt_timezone.utc
+    relatorio = {'5m': 0, '1h': 0, 'amostras_removidas': 0, 'agregados_removidos': 0}
+
+    inicio, fim = _janelas_pendentes('5m', AmostraStatus.objects, 'registrado_em', agora)
+    if inicio is not None and inicio < fim:
+        grupos = (
+            AmostraStatus.objects.filter(registrado_em__gte=inicio, registrado_em__lt=fim)
+            .annotate(hora=TruncHour('registrado_em', tzinfo=utc),
+                      quinto=Floor(ExtractMinute('registrado_em', tzinfo=utc) / 5))
+            .values('equipamento_id', 'hora', 'quinto')
+            .annotate(amostras=Count('id'), total_online=Count('id', filter=Q(online=True)),
+                      rtt_medio=Avg('rtt'), rtt_maximo=Max('rtt'))
+            .order_by()
+        )
+        relatorio['5m'] = _gravar_agregados('5m', (
+            {'equipamento_id': grupo['equipamento_id'],
+             'inicio': grupo['hora'] + timedelta(minutes=5 * int(grupo['quinto'])),
+             'amostras': grupo['amostras'], 'online': grupo['total_online'],
+             'rtt_medio': grupo['rtt_medio'], 'rtt_maximo': grupo['rtt_maximo']}
+            for grupo in grupos.iterator()
+        ), tamanho_lote)
+
+    cinco_minutos = AgregadoStatus.objects.filter(periodo='5m')
+    inicio, fim = _janelas_pendentes('1h', cinco_minutos, 'inicio', agora)
+    if inicio is not None and inicio < fim:
+        grupos = (
+            cinco_minutos.filter(inicio__gte=inicio, inicio__lt=fim)
+            .annotate(hora=TruncHour('inicio', tzinfo=utc))
+            .values('equipamento_id', 'hora')
+            .annotate(soma_amostras=Sum('amostras'), total_online=Sum('online'),
+                      soma_rtt=Sum(F('rtt_medio') * F('online')), rtt_max=Max('rtt_maximo'))
+            .order_by()
+        )
+        relatorio['1h'] = _gravar_agregados('1h', (
+            {'equipamento_id': grupo['equipamento_id'], 'inicio': grupo['hora'],
+             'amostras': grupo['soma_amostras'], 'online': grupo['total_online'],
+             'rtt_medio': grupo['soma_rtt'] / grupo['total_online'] if grupo['soma_rtt'] is not None and grupo['total_online'] else None,
+             'rtt_maximo': grupo['rtt_max']}
+            for grupo in grupos.iterator()
+        ), tamanho_lote)
+
+    consolidado = {periodo: AgregadoStatus.objects.filter(periodo=periodo).aggregate(ultima=Max('inicio'))['ultima']
+                   for periodo in PERIODOS}
+    if consolidado['5m']:
+        limite = min(agora - RETENCAO_AMOSTRAS, consolidado['5m'] + PERIODOS['5m'])
+        relatorio['amostras_removidas'] = AmostraStatus.objects.filter(registrado_em__lt=limite).delete()[0]
+    if consolidado['1h']:
+        limite = min(agora - RETENCAO_AGREGADOS['5m'], consolidado['1h'] + PERIODOS['1h'])
+        relatorio['agregados_removidos'] += cinco_minutos.filter(inicio__lt=limite).delete()[0]
+    relatorio['agregados_removidos'] += AgregadoStatus.objects.filter(
+        periodo='1h', inicio__lt=agora - RETENCAO_AGREGADOS['1h']
+    ).delete()[0]
+    return relatorio
+
+
+def _proxima_janela(momento, periodo):
+    """Início da primeira janela de `periodo` que começa em `momento` ou depois."""
+    inicio = _inicio_janela(momento, periodo)
+    return inicio if inicio == momento else inicio + PERIODOS[periodo]
+
+
+def _fontes_disponibilidade(inicio, fim, agora):
+    """
+    Divide [inicio, fim) entre as fontes da série: agregados de 1 hora, de 5 minutos e amostras brutas, da
+    mais antiga para a mais recente. Cada corte fica numa borda de janela a partir da qual a fonte mais
+    detalhada está completa: a retenção só apaga o que já foi consolidado no nível seguinte, então ela
+    cobre desde o menor entre o limite da retenção e o fim do último agregado do nível seguinte. Assim a
+    cauda ainda não consolidada vem das amostras brutas, sem lacuna nem contagem em dobro.
+    """
+    consolidado = {periodo: AgregadoStatus.objects.filter(periodo=periodo).aggregate(ultima=Max('inicio'))['ultima']
+                   for periodo in PERIODOS}
+    corte_bruta = corte_5m = inicio
+    if consolidado['5m']:
+        corte_bruta = _proxima_janela(min(agora - RETENCAO_AMOSTRAS, consolidado['5m'] + PERIODOS['5m']), '5m')
+    if consolidado['1h']:
+        corte_5m = _proxima_janela(min(agora - RETENCAO_AGREGADOS['5m'], consolidado['1h'] + PERIODOS['1h']), '1h')
+    corte_5m = min(corte_5m, corte_bruta)
+
+    fontes = []
+    for resolucao, de, ate in (('1h', inicio, corte_5m), ('5m', corte_5m, corte_bruta), ('bruta', corte_bruta, fim)):
+        de, ate = max(de, inicio), min(ate, fim)
+        if de < ate:
+            fontes.append({'resolucao': resolucao, 'inicio': de, 'fim': ate})
+    return fontes
+
+
+def disponibilidade(empresa, inicio, fim, agrupar='equipamento'):
+    """
+    Disponibilidade (% de verificações online) e RTT médio por equipamento ou por POP em [inicio, fim).
+
+    A janela é dividida entre agregados de 1 hora, de 5 minutos e amostras brutas (ver
+    _fontes_disponibilidade), com uma consulta agregada por fonte usada; os totais são somados por grupo.
+    'fontes' informa a resolução e o intervalo coberto por cada uma.
+    """
+    agora = timezone.now()
+    chave = {'equipamento': ('equipamento_id', 'equipamento__nome'),
+             'pop': ('equipamento__pop_id', 'equipamento__pop__nome')}[agrupar]
+
+    fontes = _fontes_disponibilidade(inicio, fim, agora)
+    somas = {}
+    for fonte in fontes:
+        if fonte['resolucao'] == 'bruta':
+            consulta = AmostraStatus.objects.filter(registrado_em__gte=fonte['inicio'], registrado_em__lt=fonte['fim'])
+            totais = dict(soma_amostras=Count('id'), total_online=Count('id', filter=Q(online=True)),
+                          soma_rtt=Sum('rtt'), peso_rtt=Count('rtt'))
+        else:
+            consulta = AgregadoStatus.objects.filter(periodo=fonte['resolucao'], inicio__gte=fonte['inicio'],
+                                                     inicio__lt=fonte['fim'])
+            totais = dict(soma_amostras=Sum('amostras'), total_online=Sum('online'),
+                          soma_rtt=Sum(F('rtt_medio') * F('online')),
+                          peso_rtt=Sum('online', filter=Q(rtt_medio__isnull=False)))
+
+        for grupo in consulta.filter(equipamento__empresa=empresa).values(*chave).annotate(**totais).order_by():
+            soma = somas.setdefault(grupo[chave[0]], {'nome': grupo[chave[1]], 'amostras': 0, 'online': 0,
+                                                      'soma_rtt': 0, 'peso_rtt': 0})
+            soma['amostras'] += grupo['soma_amostras'] or 0
+            soma['online'] += grupo['total_online'] or 0
+            if grupo['soma_rtt'] is not None:
+                soma['soma_rtt'] += grupo['soma_rtt']
+                soma['peso_rtt'] += grupo['peso_rtt'] or 0
+
+    resultados = []
+    for grupo_id, soma in sorted(somas.items(), key=lambda item: (item[1]['nome'] or '', item[0] or 0)):
+        rtt = soma['soma_rtt'] / soma['peso_rtt'] if soma['peso_rtt'] else None
+        resultados.append({
+            'id': grupo_id,
+            'nome': soma['nome'],
+            'amostras': soma['amostras'],
+            'online': soma['online'],
+            'disponibilidade': round(100 * soma['online'] / soma['amostras'], 3) if soma['amostras'] else None,
+            'rtt_medio': round(rtt, 2) if rtt is not None else None,
+        })
+    return {'inicio': inicio, 'fim': fim, 'agrupar': agrupar, 'fontes': fontes, 'resultados': resultados}
+
+
+def intervalo_equipamento(equipamento):
+    """Segundos entre verificações do equipamento, ou None se ele não deve ser monitorado."""
+    if equipamento.intervalo_verificacao is not None:
+        return equipamento.intervalo_verificacao or None
+    if equipamento.tipo in TIPOS_SEM_MONITORAMENTO:
+        return None
+    return INTERVALOS_POR_TIPO.get(equipamento.tipo, INTERVALO_PADRAO)
+
+
+class AgendaVerificacoes:
+    """
+    Próxima verificação de cada equipamento num heap (instante, pk).
+
+    A primeira verificação é espalhada ao longo do intervalo e as seguintes recebem um desvio aleatório
+    (JITTER), para a carga não chegar em rajadas. Equipamentos fora do ar são reverificados com intervalo
+    dobrado a cada falha seguida, até BACKOFF_MAXIMO.
+    """
+
+    def __init__(self, jitter=JITTER, backoff_maximo=BACKOFF_MAXIMO):
+        self.jitter = jitter
+        self.backoff_maximo = backoff_maximo
+        self.heap = []
+        self.agendados = set()
+        self.equipamentos = {}
+        self.falhas = {}
+
+    def carregar(self, equipamentos, agora):
+        """Troca o conjunto monitorado, agendando os novos e descartando (ao vencer) os removidos."""
+        self.equipamentos = {
+            equipamento.pk: equipamento for equipamento in equipamentos if intervalo_equipamento(equipamento)
+        }
+        for pk, equipamento in self.equipamentos.items():
+            if pk not in self.agendados:
+                self.agendados.add(pk)
+                heapq.heappush(self.heap, (agora + random.uniform(0, intervalo_equipamento(equipamento)), pk))
+
+    def vencidos(self, agora, limite):
+        """Retira do heap até `limite` equipamentos com verificação vencida."""
+        lote = []
+        while self.heap and self.heap[0][0] <= agora and len(lote) < limite:
+            _, pk = heapq.heappop(self.heap)
+            self.agendados.discard(pk)
+            if pk in self.equipamentos:
+                lote.append(self.equipamentos[pk])
+            else:
+                self.falhas.pop(pk, None)
+        return lote
+
+    def reagendar(self, equipamento, online, agora):
+        intervalo = intervalo_equipamento(equipamento)
+        if intervalo is None or equipamento.pk not in self.equipamentos:
+            return
+        if online:
+            self.falhas.pop(equipamento.pk, None)
+        else:
+            self.falhas[equipamento.pk] = self.falhas.get(equipamento.pk, 0) + 1
+            intervalo = min(intervalo * 2 ** self.falhas[equipamento.pk], max(intervalo, self.backoff_maximo))
+        self.agendados.add(equipamento.pk)
+        heapq.heappush(self.heap, (agora + intervalo * random.uniform(1 - self.jitter, 1 + self.jitter),
+                                   equipamento.pk))
+
+    def proxima(self):
+        """Instante da próxima verificação agendada (None com a agenda vazia)."""
+        return self.heap[0][0] if self.heap else None
+
+
+class Monitor:
+    """
+    Laço de monitoramento contínuo num loop asyncio: cada equipamento vencido na agenda vira uma sonda
+    independente (no máximo `simultaneas` em voo), de modo que um host lento não atrasa os demais. Os
+    resultados são acumulados e gravados em lote (gravar_sondagem) a cada `intervalo_gravacao` segundos ou
+    `tamanho_lote` resultados; a lista de equipamentos é relida a cada `intervalo_recarga` segundos e a
+    série temporal é consolidada (consolidar_status) a cada `intervalo_consolidacao`. O acesso ao banco roda
+    em thread (sync_to_async), fora do loop.
+    """
+
+    def __init__(self, equipamentos, simultaneas=SIMULTANEAS, timeout=TIMEOUT, intervalo_gravacao=INTERVALO_GRAVACAO,
+                 intervalo_recarga=INTERVALO_RECARGA, intervalo_consolidacao=INTERVALO_CONSOLIDACAO,
+                 tamanho_lote=TAMANHO_LOTE, agenda=None):
+        self.consulta = equipamentos.only('id', 'ip', 'porta', 'tipo', 'intervalo_verificacao')
+        self.simultaneas = simultaneas
+        self.timeout = timeout
+        self.intervalo_gravacao = intervalo_gravacao
+        self.intervalo_recarga = intervalo_recarga
+        self.intervalo_consolidacao = intervalo_consolidacao
+        self.tamanho_lote = tamanho_lote
+        self.agenda = agenda or AgendaVerificacoes()
+        self.resultados = {}
+        self.em_voo = set()
+        self.sondados = 0
+        self.alterados = 0
+
+    def _ler_equipamentos(self):
+        close_old_connections()
+        return list(self.consulta.all())
+
+    def _gravar(self, resultados):
+        """Grava os resultados comparando com o status atual do banco (que pode ter mudado por fora)."""
+        pks = list(resultados)
+        for inicio in range(0, len(pks), self.tamanho_lote):
+            lote = pks[inicio:inicio + self.tamanho_lote]
+            equipamentos = Equipamento.objects.filter(pk__in=lote).only('id', 'status')
+            alterados = gravar_sondagem(equipamentos, {pk: resultados[pk] for pk in lote}, self.tamanho_lote)
+            self.alterados += len(alterados)
+
+    async def _verificar(self, sonda, equipamento):
+        resultado = await sonda.sondar(equipamento.ip, equipamento.porta)
+        self.agenda.reagendar(equipamento, resultado['status'] == 'online', time.monotonic())
+        self.resultados[equipamento.pk] = resultado
+        self.sondados += 1
+
+    async def executar_async(self, duracao=None):
+        """Executa o monitoramento (indefinidamente, ou por `duracao` segundos)."""
+        inicio = time.monotonic()
+        proxima_recarga = inicio
+        proxima_gravacao = inicio + self.intervalo_gravacao
+        proxima_consolidacao = inicio + self.intervalo_consolidacao
+        async with Sonda(simultaneas=self.simultaneas, timeout=self.timeout) as sonda:
+            while duracao is None or time.monotonic() - inicio < duracao:
+                agora = time.monotonic()
+                if agora >= proxima_recarga:
+                    self.agenda.carregar(await sync_to_async(self._ler_equipamentos)(), agora)
+                    proxima_recarga = agora + self.intervalo_recarga
+
+                for equipamento in self.agenda.vencidos(agora, self.simultaneas - len(self.em_voo)):
+                    tarefa = asyncio.create_task(self._verificar(sonda, equipamento))
+                    self.em_voo.add(tarefa)
+                    tarefa.add_done_callback(self.em_voo.discard)
+
+                if self.resultados and (len(self.resultados) >= self.tamanho_lote or agora >= proxima_gravacao):
+                    resultados, self.resultados = self.resultados, {}
+                    await sync_to_async(self._gravar)(resultados)
+                    proxima_gravacao = time.monotonic() + self.intervalo_gravacao
+
+                if agora >= proxima_consolidacao:
+                    await sync_to_async(consolidar_status)()
+                    proxima_consolidacao = time.monotonic() + self.intervalo_consolidacao
+
+                proxima = min(proxima_recarga, proxima_consolidacao)
+                if duracao is not None:
+                    proxima = min(proxima, inicio + duracao)
+                if self.resultados:
+                    proxima = min(proxima, proxima_gravacao)
+                if self.agenda.proxima() is not None and len(self.em_voo) < self.simultaneas:
+                    proxima = min(proxima, self.agenda.proxima())
+                espera = max(0, proxima - time.monotonic())
+                if self.em_voo:
+                    # Acorda também quando uma sonda termina, liberando vaga para as vencidas
+                    await asyncio.wait(self.em_voo, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(espera)
+            if self.em_voo:
+                await asyncio.wait(self.em_voo)
+
+    def executar(self, duracao=None):
+        try:
+            asyncio.run(self.executar_async(duracao))
+        finally:
+            if self.resultados:
+                resultados, self.resultados = self.resultados, {}
+                self._gravar(resultados)
@@ -0,0 +1,650 @@
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from ipaddress import ip_address, ip_network
+from itertools import islice
+
+import requests
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .alocacao import chave_numerica, faixa_utilizavel
+from .ipam import recalcular_contadores_blocos, validar_blocos_em_lote, TAMANHO_LOTE
+from .models import BlocoIP, EnderecoIP, Equipamento, Fabricante, Modelo, Pop, Porta, SincronizacaoNetbox, \
+    VinculoNetbox
+from .prefixos import ArvorePrefixos, invalidar_arvore
+
+TAMANHO_PAGINA = 500
+PARALELISMO = 4
+# A marca d'água é o início da sincronização menos esta margem: cobre diferença de relógio com o NetBox e
+# objetos gravados lá enquanto a leitura estava em andamento
+MARGEM_MARCA_DAGUA = timedelta(minutes=5)
+
+
+class ClienteNetbox:
+    """
+    Cliente da API do NetBox com uma única requests.Session (keep-alive e novas tentativas com backoff).
+
+    `registros` lê a primeira página para saber o total e busca as demais por offset em paralelo, com no
+    máximo `paralelismo` requisições simultâneas, devolvendo os objetos na ordem da API conforme chegam.
+    """
+
+    def __init__(self, integracao, tamanho_pagina=TAMANHO_PAGINA, paralelismo=PARALELISMO, timeout=10,
+                 tentativas=3):
+        self.url = integracao.url.rstrip('/')
+        self.tamanho_pagina = tamanho_pagina
+        self.paralelismo = max(1, paralelismo)
+        self.timeout = timeout
+        self.total = None  # 'count' da última listagem iniciada por registros()
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Token {integracao.token}", "Accept": "application/json"})
+        retry = Retry(total=tentativas, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=self.paralelismo)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, caminho, **params):
+        url = caminho if caminho.startswith(('http://', 'https://')) else f"{self.url}/{caminho.strip('/')}/"
+        response = self.session.get(url, params=params or None, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _pagina(self, caminho, offset, filtros):
+        return self.get(caminho, limit=self.tamanho_pagina, offset=offset, **filtros)
+
+    def registros(self, caminho, **filtros):
+        """Gera todos os objetos do endpoint (com os filtros de consulta informados)."""
+        dados = self._pagina(caminho, 0, filtros)
+        self.total = dados.get('count')
+        yield from dados.get('results', [])
+        if not dados.get('next'):
+            return
+
+        offsets = iter(range(self.tamanho_pagina, dados.get('count') or 0, self.tamanho_pagina))
+        with ThreadPoolExecutor(max_workers=self.paralelismo) as executor:
+            pendentes = deque(
+                executor.submit(self._pagina, caminho, offset, filtros)
+                for offset in islice(offsets, self.paralelismo)
+            )
+            while pendentes:
+                dados = pendentes.popleft().result()
+                proximo = next(offsets, None)
+                if proximo is not None:
+                    pendentes.append(executor.submit(self._pagina, caminho, proximo, filtros))
+                yield from dados.get('results', [])
+
+        # Objetos criados durante a leitura deixam páginas além do total inicial: segue o 'next'
+        while dados.get('next'):
+            dados = self.get(dados['next'])
+            yield from dados.get('results', [])
+
+
+def _relatorio():
+    # vinculos: {id no NetBox: id local}; criados_ids: ids locais gravados por esta importação (só esses
+    # podem ser apagados quando somem do NetBox, ver reconciliar_exclusoes)
+    return {'linhas': 0, 'criados': 0, 'atualizados': 0, 'erros': [], 'vinculos': {}, 'criados_ids': set(),
+            'inicio': time.monotonic()}
+
+
+def _finalizar(relatorio):
+    relatorio['tempo'] = time.monotonic() - relatorio.pop('inicio')
+    relatorio['linhas_por_segundo'] = relatorio['linhas'] / relatorio['tempo'] if relatorio['tempo'] else 0
+    return relatorio
+
+
+def importar_equipamentos_netbox(integracao, registros, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa dispositivos do NetBox (dcim/devices) como Equipamento. Equipamentos já cadastrados com o mesmo
+    nome são mantidos; fabricantes, modelos e o POP são resolvidos uma vez por valor e os novos gravados
+    com bulk_create.
+    """
+    empresa = integracao.empresa
+    relatorio = _relatorio()
+
+    existentes = dict(Equipamento.objects.filter(empresa=empresa).values_list('nome', 'id'))
+    fabricantes = {}
+    modelos = {}
+    pop = None
+    novos = {}
+    chaves = {}
+
+    for dispositivo in registros:
+        relatorio['linhas'] += 1
+        nome = dispositivo.get("name") or "Sem Nome"
+        chaves[dispositivo.get('id')] = nome
+        if nome in existentes or nome in novos:
+            continue
+
+        primary_ip = dispositivo.get("primary_ip4")
+        ip = primary_ip.get("address").split('/')[0] if primary_ip and primary_ip.get("address") else "0.0.0.0"
+
+        device_type = dispositivo.get("device_type") or {}
+        nome_modelo = device_type.get("model", "Desconhecido")
+        nome_fabricante = (device_type.get("manufacturer") or {}).get("name", "Desconhecido")
+
+        if nome_fabricante not in fabricantes:
+            fabricantes[nome_fabricante], _ = Fabricante.objects.get_or_create(nome=nome_fabricante)
+        fabricante = fabricantes[nome_fabricante]
+        if (fabricante.pk, nome_modelo) not in modelos:
+            modelos[(fabricante.pk, nome_modelo)], _ = Modelo.objects.get_or_create(
+                modelo=nome_modelo, fabricante=fabricante)
+
+        # Usa o primeiro POP da empresa
+        if pop is None:
+            pop = Pop.objects.filter(empresa=empresa).first() or Pop.objects.create(
+                nome="POP Importado", endereco="Desconhecido", cidade="Desconhecida", empresa=empresa
+            )
+
+        novos[nome] = Equipamento(
+            nome=nome, ip=ip, usuario='admin', senha='admin', porta=22, protocolo='SSH', empresa=empresa,
+            pop=pop, fabricante=fabricante, modelo=modelos[(fabricante.pk, nome_modelo)], tipo='Switch',
+            status='Ativo', observacao='Importado do NetBox'
+        )
+
+    if novos:
+        Equipamento.objects.bulk_create(novos.values(), batch_size=tamanho_lote)
+        relatorio['criados'] = len(novos)
+        existentes = dict(Equipamento.objects.filter(empresa=empresa).values_list('nome', 'id'))
+        relatorio['criados_ids'] = {existentes[nome] for nome in novos if nome in existentes}
+
+    relatorio['vinculos'] = {
+        netbox_id: existentes[nome] for netbox_id, nome in chaves.items() if nome in existentes
+    }
+    return _finalizar(relatorio)
+
+
+def importar_portas_netbox(integracao, registros, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa interfaces do NetBox (dcim/interfaces) como Porta dos equipamentos de mesmo nome. Portas novas
+    vão para bulk_create e as existentes só são atualizadas quando algum campo padrão mudou.
+    """
+    empresa = integracao.empresa
+    relatorio = _relatorio()
+    padrao = {"tipo": "Fibra", "speed": "1G", "observacao": ""}
+
+    equipamentos = dict(Equipamento.objects.filter(empresa=empresa).values_list('nome', 'id'))
+    existentes = {
+        (porta.equipamento_id, porta.nome): porta
+        for porta in Porta.objects.filter(equipamento__empresa=empresa).only(
+            'id', 'nome', 'equipamento_id', 'empresa_id', 'tipo', 'speed', 'observacao')
+    }
+    novos = []
+    alterados = []
+    chaves = {}
+    criadas = set()
+
+    for iface in registros:
+        relatorio['linhas'] += 1
+        device = iface.get('device')
+        equipamento_id = equipamentos.get(device.get('name')) if device else None
+        nome = iface.get('name')
+        if not nome:
+            continue
+        if not equipamento_id:
+            relatorio['erros'].append(f"Equipamento não encontrado para a porta {nome}: {(device or {}).get('name')}")
+            continue
+
+        chave = (equipamento_id, nome)
+        chaves[iface.get('id')] = chave
+        porta = existentes.get(chave)
+        if porta is None:
+            porta = Porta(equipamento_id=equipamento_id, nome=nome, empresa=empresa, **padrao)
+            existentes[chave] = porta
+            novos.append(porta)
+            criadas.add(chave)
+        elif (porta.tipo, porta.speed, porta.observacao, porta.empresa_id) != (*padrao.values(), empresa.pk):
+            porta.tipo, porta.speed, porta.observacao, porta.empresa_id = *padrao.values(), empresa.pk
+            alterados.append(porta)
+
+        if len(novos) >= tamanho_lote:
+            Porta.objects.bulk_create(novos)
+            relatorio['criados'] += len(novos)
+            novos = []
+        if len(alterados) >= tamanho_lote:
+            Porta.objects.bulk_update(alterados, ['tipo', 'speed', 'observacao', 'empresa'])
+            relatorio['atualizados'] += len(alterados)
+            alterados = []
+
+    if novos:
+        Porta.objects.bulk_create(novos)
+        relatorio['criados'] += len(novos)
+    if alterados:
+        Porta.objects.bulk_update(alterados, ['tipo', 'speed', 'observacao', 'empresa'])
+        relatorio['atualizados'] += len(alterados)
+
+    ids = {chave: porta.pk for chave, porta in existentes.items()}
+    if relatorio['criados']:
+        ids = {(equipamento_id, nome): porta_id for porta_id, equipamento_id, nome in Porta.objects.filter(
+            equipamento__empresa=empresa).values_list('id', 'equipamento_id', 'nome').iterator(chunk_size=5000)}
+    relatorio['vinculos'] = {netbox_id: ids[chave] for netbox_id, chave in chaves.items() if ids.get(chave)}
+    relatorio['criados_ids'] = {ids[chave] for chave in criadas if ids.get(chave)}
+    return _finalizar(relatorio)
+
+
+def importar_prefixos_netbox(integracao, registros, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa prefixos do NetBox (iterável de objetos de ipam/prefixes) para BlocoIP da empresa.
+
+    Equipamentos por nome e blocos por CIDR são carregados uma vez. Prefixos existentes com descrição ou
+    equipamento diferentes vão para bulk_update em lotes; os novos são agrupados por tamanho de prefixo,
+    do maior para o menor bloco, recebem como parent o bloco mais específico que os contém e são
+    validados (validar_blocos_em_lote) e gravados com bulk_create um grupo por vez.
+    """
+    empresa = integracao.empresa
+    relatorio = _relatorio()
+
+    equipamentos = dict(Equipamento.objects.filter(empresa=empresa).values_list('nome', 'id'))
+    existentes = {}
+    blocos = BlocoIP.objects.filter(empresa=empresa).order_by('profundidade').only(
+        'id', 'bloco_cidr', 'descricao', 'equipamento_id', 'caminho', 'profundidade', 'empresa_id'
+    )
+    for bloco in blocos:
+        try:
+            existentes.setdefault(str(ip_network(bloco.bloco_cidr, strict=False)), bloco)
+        except ValueError:
+            continue
+
+    novos = {}
+    alterados = []
+    chaves = {}
+    for prefixo in registros:
+        relatorio['linhas'] += 1
+        cidr = prefixo.get('prefix')
+        try:
+            rede = ip_network(cidr, strict=False)
+        except (TypeError, ValueError):
+            relatorio['erros'].append(f"{cidr}: prefixo inválido.")
+            continue
+
+        chaves[prefixo.get('id')] = str(rede)
+        descricao = prefixo.get('description', '')
+        device_info = prefixo.get('device')
+        equipamento_id = equipamentos.get(device_info.get('name')) if isinstance(device_info, dict) else None
+
+        bloco = existentes.get(str(rede))
+        if bloco is None:
+            novos[str(rede)] = (rede, descricao, equipamento_id)
+        elif (bloco.descricao, bloco.equipamento_id) != (descricao, equipamento_id):
+            bloco.descricao, bloco.equipamento_id = descricao, equipamento_id
+            alterados.append(bloco)
+            if len(alterados) >= tamanho_lote:
+                BlocoIP.objects.bulk_update(alterados, ['descricao', 'equipamento'])
+                relatorio['atualizados'] += len(alterados)
+                alterados = []
+
+    if alterados:
+        BlocoIP.objects.bulk_update(alterados, ['descricao', 'equipamento'])
+        relatorio['atualizados'] += len(alterados)
+
+    _criar_prefixos(empresa, existentes, novos, relatorio, tamanho_lote)
+    relatorio['vinculos'] = {
+        netbox_id: existentes[chave].pk for netbox_id, chave in chaves.items() if chave in existentes
+    }
+    return _finalizar(relatorio)
+
+
+def _criar_prefixos(empresa, existentes, novos, relatorio, tamanho_lote):
+    arvore = ArvorePrefixos()
+    for chave, bloco in existentes.items():
+        arvore.inserir(bloco.pk, chave, (bloco.profundidade, bloco.pk, bloco))
+
+    por_tamanho = defaultdict(list)
+    for rede, descricao, equipamento_id in novos.values():
+        por_tamanho[rede.prefixlen].append((rede, descricao, equipamento_id))
+
+    for prefixlen in sorted(por_tamanho):
+        grupo = []
+        for rede, descricao, equipamento_id in por_tamanho[prefixlen]:
+            encontrado = arvore.buscar(rede.network_address, prefixo_maximo=prefixlen - 1)
+            grupo.append((rede, descricao, equipamento_id, encontrado[2] if encontrado else None))
+
+        invalidos = set()
+        for indice, mensagem in validar_blocos_em_lote(empresa, [(str(item[0]), item[3]) for item in grupo]):
+            invalidos.add(indice)
+            relatorio['erros'].append(mensagem)
+        grupo = [item for indice, item in enumerate(grupo) if indice not in invalidos]
+        if not grupo:
+            continue
+
+        parents = {str(rede): parent for rede, _, _, parent in grupo}
+        with transaction.atomic():
+            BlocoIP.objects.bulk_create([
+                BlocoIP(
+                    empresa=empresa,
+                    tipo_ip=f"IPv{rede.version}",
+                    bloco_cidr=str(rede),
+                    descricao=descricao,
+                    equipamento_id=equipamento_id,
+                    parent=parent,
+                    profundidade=parent.profundidade + 1 if parent else 0,
+                    inicio_numerico=chave_numerica(rede.network_address),
+                    fim_numerico=chave_numerica(rede.broadcast_address),
+                )
+                for rede, descricao, equipamento_id, parent in grupo
+            ], batch_size=tamanho_lote)
+
+            # O caminho depende do id gerado: busca os blocos recém-criados e completa em lote
+            cidrs = list(parents)
+            criados = []
+            for i in range(0, len(cidrs), tamanho_lote):
+                criados.extend(BlocoIP.objects.filter(
+                    empresa=empresa, caminho='', bloco_cidr__in=cidrs[i:i + tamanho_lote]
+                ).only('id', 'bloco_cidr', 'profundidade', 'empresa_id'))
+            for bloco in criados:
+                parent = parents[bloco.bloco_cidr]
+                bloco.caminho = f"{parent.caminho if parent else '/'}{bloco.pk}/"
+            BlocoIP.objects.bulk_update(criados, ['caminho'], batch_size=tamanho_lote)
+
+            ids_parents = {parent.pk for parent in parents.values() if parent}
+            BlocoIP.objects.filter(pk__in=ids_parents, tem_sub_blocos=False).update(tem_sub_blocos=True)
+
+        for bloco in criados:
+            existentes[bloco.bloco_cidr] = bloco
+            arvore.inserir(bloco.pk, bloco.bloco_cidr, (bloco.profundidade, bloco.pk, bloco))
+        relatorio['criados'] += len(criados)
+        relatorio['criados_ids'].update(bloco.pk for bloco in criados)
+
+    if novos:
+        invalidar_arvore(empresa.id)
+
+
+def importar_enderecos_netbox(integracao, registros, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa endereços do NetBox (iterável de objetos de ipam/ip-addresses) para EnderecoIP.
+
+    Equipamentos por nome, portas por (equipamento, nome), blocos por CIDR e os IPs já cadastrados são
+    carregados uma vez. Sem 'prefix' no objeto, o bloco é o mais específico que contém o IP. As regras
+    de EnderecoIP.clean são conferidas em memória e a gravação usa bulk_create/bulk_update em lotes;
+    no fim os contadores dos blocos são recalculados.
+    """
+    empresa = integracao.empresa
+    relatorio = _relatorio()
+
+    equipamentos = dict(Equipamento.objects.filter(empresa=empresa).values_list('nome', 'id'))
+    portas = {
+        (equipamento_id, nome): porta_id
+        for equipamento_id, nome, porta_id in Porta.objects.filter(equipamento__empresa=empresa).values_list(
+            'equipamento_id', 'nome', 'id')
+    }
+
+    arvore = ArvorePrefixos()
+    blocos = {}
+    por_cidr = {}
+    for bloco_id, bloco_cidr, profundidade, tem_sub_blocos in BlocoIP.objects.filter(empresa=empresa).values_list(
+            'id', 'bloco_cidr', 'profundidade', 'tem_sub_blocos'):
+        try:
+            rede = ip_network(bloco_cidr, strict=False)
+        except ValueError:
+            continue
+        blocos[bloco_id] = (rede, tem_sub_blocos)
+        por_cidr.setdefault(str(rede), bloco_id)
+        arvore.inserir(bloco_id, rede, (profundidade, bloco_id))
+
+    existentes = {}
+    gateways = {}
+    enderecos = EnderecoIP.objects.filter(bloco__empresa=empresa).values_list(
+        'id', 'bloco_id', 'ip', 'equipamento_id', 'porta_id', 'finalidade', 'next_hop', 'is_gateway'
+    )
+    for endereco_id, bloco_id, ip, equipamento_id, porta_id, finalidade, next_hop, is_gateway in enderecos.iterator(
+            chunk_size=5000):
+        existentes[(bloco_id, ip)] = (endereco_id, equipamento_id, porta_id, finalidade, next_hop, is_gateway)
+        if is_gateway:
+            gateways[bloco_id] = ip
+
+    novos = []
+    alterados = {}
+    chaves = {}
+    criados = set()
+    for ip_info in registros:
+        relatorio['linhas'] += 1
+        erro = None
+        endereco = (ip_info.get('address') or '').split('/')[0]
+        interface = ip_info.get('interface') or ip_info.get('assigned_object') or {}
+        device = ip_info.get('device') or interface.get('device') or {}
+
+        try:
+            valor = int(ip_address(endereco))
+        except ValueError:
+            relatorio['erros'].append(f"Endereço inválido: {ip_info.get('address')}")
+            continue
+
+        if not device.get('name') or not interface.get('name'):
+            relatorio['erros'].append(f"Faltando equipamento/porta para o IP {endereco}")
+            continue
+
+        prefixo = ip_info.get('prefix')
+        if isinstance(prefixo, dict) and prefixo.get('prefix'):
+            try:
+                bloco_id = por_cidr.get(str(ip_network(prefixo['prefix'], strict=False)))
+            except ValueError:
+                bloco_id = None
+            bloco_cidr = prefixo['prefix']
+        else:
+            encontrado = arvore.buscar(endereco)
+            bloco_id = encontrado[1] if encontrado else None
+            bloco_cidr = endereco
+
+        equipamento_id = equipamentos.get(device['name'])
+        porta_id = portas.get((equipamento_id, interface['name']))
+        finalidade = ip_info.get('description', '')
+        next_hop = ip_info.get('gateway') or None
+        is_gateway = bool(ip_info.get('is_gateway', False))
+
+        if bloco_id is None:
+            erro = f"Bloco de IP não encontrado para o CIDR: {bloco_cidr}"
+        elif equipamento_id is None:
+            erro = f"Equipamento não encontrado: {device['name']}"
+        elif porta_id is None:
+            erro = f"Porta não encontrada: {interface['name']} no equipamento {device['name']}"
+        else:
+            rede, tem_sub_blocos = blocos[bloco_id]
+            primeiro, ultimo = faixa_utilizavel(rede)
+            if tem_sub_blocos:
+                erro = f"O bloco {rede} foi subdividido. O IP {endereco} deve ficar em um sub-bloco."
+            elif ip_address(endereco) not in rede:
+                erro = f"O IP {endereco} não pertence ao bloco {rede}."
+            elif not primeiro <= valor <= ultimo:
+                erro = f"O IP {endereco} é um endereço de rede ou broadcast e não pode ser usado."
+            elif is_gateway and not next_hop:
+                erro = f"O campo 'next_hop' é obrigatório para o gateway ({endereco})."
+            elif is_gateway and gateways.get(bloco_id, endereco) != endereco:
+                erro = f"Já existe um gateway para o bloco {rede}. Apenas um é permitido."
+
+        if erro:
+            relatorio['erros'].append(erro)
+            continue
+
+        atual = existentes.get((bloco_id, endereco))
+        if atual is None:
+            novos.append(EnderecoIP(
+                bloco_id=bloco_id, ip=endereco, ip_numerico=chave_numerica(valor), equipamento_id=equipamento_id,
+                porta_id=porta_id, finalidade=finalidade, next_hop=next_hop, is_gateway=is_gateway,
+            ))
+            existentes[(bloco_id, endereco)] = (None, equipamento_id, porta_id, finalidade, next_hop, is_gateway)
+            criados.add((bloco_id, endereco))
+        elif atual[1:3] != (equipamento_id, porta_id):
+            relatorio['erros'].append(f"O IP {endereco} já está cadastrado neste bloco em outro equipamento/porta.")
+            continue
+        elif atual[3:] != (finalidade, next_hop, is_gateway):
+            if atual[0] is None:
+                # Repetido no mesmo lote ainda não gravado: vale a última linha
+                pendente = next((obj for obj in novos if obj.bloco_id == bloco_id and obj.ip == endereco), None)
+                if pendente is not None:
+                    pendente.finalidade, pendente.next_hop, pendente.is_gateway = finalidade, next_hop, is_gateway
+                else:
+                    EnderecoIP.objects.filter(bloco_id=bloco_id, ip=endereco).update(
+                        finalidade=finalidade, next_hop=next_hop, is_gateway=is_gateway)
+            else:
+                alterados[atual[0]] = EnderecoIP(
+                    id=atual[0], finalidade=finalidade, next_hop=next_hop, is_gateway=is_gateway
+                )
+            existentes[(bloco_id, endereco)] = atual[:3] + (finalidade, next_hop, is_gateway)
+
+        if is_gateway:
+            gateways[bloco_id] = endereco
+        chaves[ip_info.get('id')] = (bloco_id, endereco)
+
+        if len(novos) >= tamanho_lote:
+            EnderecoIP.objects.bulk_create(novos)
+            relatorio['criados'] += len(novos)
+            novos = []
+        if len(alterados) >= tamanho_lote:
+            EnderecoIP.objects.bulk_update(alterados.values(), ['finalidade', 'next_hop', 'is_gateway'])
+            relatorio['atualizados'] += len(alterados)
+            alterados = {}
+
+    if novos:
+        EnderecoIP.objects.bulk_create(novos)
+        relatorio['criados'] += len(novos)
+    if alterados:
+        EnderecoIP.objects.bulk_update(alterados.values(), ['finalidade', 'next_hop', 'is_gateway'])
+        relatorio['atualizados'] += len(alterados)
+
+    if relatorio['criados'] or relatorio['atualizados']:
+        recalcular_contadores_blocos(empresa=empresa)
+
+    ids = {chave: atual[0] for chave, atual in existentes.items()}
+    if relatorio['criados']:
+        ids = {(bloco_id, ip): endereco_id for endereco_id, bloco_id, ip in EnderecoIP.objects.filter(
+            bloco__empresa=empresa).values_list('id', 'bloco_id', 'ip').iterator(chunk_size=5000)}
+    relatorio['vinculos'] = {netbox_id: ids[chave] for netbox_id, chave in chaves.items() if ids.get(chave)}
+    relatorio['criados_ids'] = {ids[chave] for chave in criados if ids.get(chave)}
+    return _finalizar(relatorio)
+
+
+# Endpoints na ordem de dependência: portas precisam dos equipamentos e endereços, dos blocos e portas
+IMPORTADORES_NETBOX = {
+    'dcim/devices': (Equipamento, importar_equipamentos_netbox),
+    'dcim/interfaces': (Porta, importar_portas_netbox),
+    'ipam/prefixes': (BlocoIP, importar_prefixos_netbox),
+    'ipam/ip-addresses': (EnderecoIP, importar_enderecos_netbox),
+}
+
+
+def _informar_progresso(registros, progresso, cliente, etapa):
+    for processados, registro in enumerate(registros, 1):
+        progresso(processados, cliente.total, etapa)
+        yield registro
+
+
+def _registrar_vinculos(integracao, endpoint, vinculos, criados_ids=(), tamanho_lote=TAMANHO_LOTE):
+    """
+    Grava os vínculos {id no NetBox: id local}. Um vínculo é marcado como criado pela importação quando o
+    registro local foi gravado agora, ou quando já era assim e continua apontando para o mesmo registro;
+    registros que já existiam e só foram associados por nome/CIDR nunca são marcados.
+    """
+    vinculos = [(netbox_id, objeto_id) for netbox_id, objeto_id in vinculos.items() if netbox_id is not None]
+    for i in range(0, len(vinculos), tamanho_lote):
+        lote = vinculos[i:i + tamanho_lote]
+        anteriores = dict(VinculoNetbox.objects.filter(
+            integracao=integracao, endpoint=endpoint, netbox_id__in=[netbox_id for netbox_id, _ in lote],
+            criado_pela_importacao=True,
+        ).values_list('netbox_id', 'objeto_id'))
+        VinculoNetbox.objects.bulk_create(
+            [
+                VinculoNetbox(
+                    integracao=integracao, endpoint=endpoint, netbox_id=netbox_id, objeto_id=objeto_id,
+                    criado_pela_importacao=objeto_id in criados_ids or anteriores.get(netbox_id) == objeto_id,
+                )
+                for netbox_id, objeto_id in lote
+            ],
+            update_conflicts=True, unique_fields=['integracao', 'endpoint', 'netbox_id'],
+            update_fields=['objeto_id', 'criado_pela_importacao'],
+        )
+
+
+def reconciliar_exclusoes(cliente, sincronizacao, completo=False, tamanho_lote=TAMANHO_LOTE):
+    """
+    Trata os objetos que não existem mais no NetBox e devolve (removidos, desvinculados).
+
+    Primeiro lê a impressão do endpoint com uma requisição (limit=1, ordenada por id decrescente): total
+    e maior id. Os ids do NetBox só crescem, então qualquer objeto criado muda o maior id e qualquer
+    exclusão sem criação muda o total; se os dois forem iguais aos guardados na última reconciliação,
+    nada foi excluído desde então e a lista de ids não é baixada. Caso contrário, baixa só os ids (brief),
+    guarda a nova impressão e trata os vínculos cujo id sumiu: registros criados pela importação são
+    apagados; os que já existiam localmente (associados por nome/CIDR) são mantidos e só perdem o vínculo.
+    """
+    integracao, endpoint = sincronizacao.integracao, sincronizacao.endpoint
+    vinculos = VinculoNetbox.objects.filter(integracao=integracao, endpoint=endpoint)
+    impressao = None
+    if not completo:
+        dados = cliente.get(endpoint, limit=1, brief=1, ordering='-id')
+        resultados = dados.get('results') or []
+        impressao = (dados.get('count'), resultados[0]['id'] if resultados else None)
+        if impressao == (sincronizacao.total_remoto, sincronizacao.maior_id_remoto):
+            return 0, 0
+    if not vinculos.exists():
+        if impressao is not None:
+            sincronizacao.total_remoto, sincronizacao.maior_id_remoto = impressao
+        return 0, 0
+
+    remotos = {registro['id'] for registro in cliente.registros(endpoint, brief=1)}
+    sincronizacao.total_remoto, sincronizacao.maior_id_remoto = len(remotos), max(remotos, default=None)
+    excluidos = [
+        (netbox_id, objeto_id, criado)
+        for netbox_id, objeto_id, criado in vinculos.values_list(
+            'netbox_id', 'objeto_id', 'criado_pela_importacao').iterator(chunk_size=5000)
+        if netbox_id not in remotos
+    ]
+
+    modelo = IMPORTADORES_NETBOX[endpoint][0]
+    removidos = 0
+    for i in range(0, len(excluidos), tamanho_lote):
+        lote = excluidos[i:i + tamanho_lote]
+        with transaction.atomic():
+            # delete() do queryset mantém os sinais (contadores dos blocos e árvore de prefixos)
+            apagar = [objeto_id for _, objeto_id, criado in lote if criado]
+            removidos += modelo.objects.filter(pk__in=apagar).delete()[1].get(modelo._meta.label, 0)
+            vinculos.filter(netbox_id__in=[netbox_id for netbox_id, _, _ in lote]).delete()
+    return removidos, sum(1 for _, _, criado in excluidos if not criado)
+
+
+def sincronizar_netbox(integracao, endpoints=None, completo=False, progresso=None):
+    """
+    Sincroniza os endpoints informados (por padrão todos, na ordem de dependência) e devolve
+    {endpoint: relatório}.
+
+    Sem `completo`, cada endpoint só busca objetos com last_updated a partir da sua marca d'água, que passa
+    a ser o início da leitura menos MARGEM_MARCA_DAGUA (não o maior last_updated recebido, que perderia
+    objetos alterados durante a paginação). A marca avança mesmo com linhas rejeitadas (ficam no
+    relatório; uma sincronização completa as relê) e só é mantida quando a leitura falha: erros de rede
+    ou da API interrompem a sincronização antes de gravá-la.
+    `progresso(processados, total, etapa)` é chamado a cada objeto lido.
+    """
+    relatorios = {}
+    with ClienteNetbox(integracao) as cliente:
+        for endpoint in endpoints or IMPORTADORES_NETBOX:
+            importar = IMPORTADORES_NETBOX[endpoint][1]
+            sincronizacao, _ = SincronizacaoNetbox.objects.get_or_create(integracao=integracao, endpoint=endpoint)
+
+            filtros = {}
+            if sincronizacao.ultima_alteracao and not completo:
+                filtros['last_updated__gte'] = sincronizacao.ultima_alteracao.isoformat()
+            inicio = timezone.now()
+            registros = cliente.registros(endpoint, **filtros)
+            if progresso:
+                registros = _informar_progresso(registros, progresso, cliente, endpoint)
+            relatorio = importar(integracao, registros)
+            _registrar_vinculos(integracao, endpoint, relatorio['vinculos'], relatorio['criados_ids'])
+            relatorio['removidos'], relatorio['desvinculados'] = reconciliar_exclusoes(
+                cliente, sincronizacao, completo)
+            relatorio['incremental'] = bool(filtros)
+
+            sincronizacao.ultima_alteracao = inicio - MARGEM_MARCA_DAGUA
+            sincronizacao.save()
+            relatorios[endpoint] = relatorio
+    return relatorios
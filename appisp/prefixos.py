@@ -0,0 +1,250 @@
+import threading
+import time
+from ipaddress import ip_address, ip_network
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import BlocoIP, VersaoArvorePrefixos
+
+
+class ArvorePrefixos:
+    """
+    Árvore binária de prefixos (uma raiz para IPv4 e outra para IPv6) para busca do prefixo mais longo.
+
+    Cada nó é uma lista [filho_0, filho_1, blocos], onde `blocos` guarda {chave: valor} dos blocos que
+    terminam naquele prefixo. A busca desce pelos bits do endereço guardando o último nó com bloco,
+    então custa no máximo 32 (IPv4) ou 128 (IPv6) passos, independente da quantidade de blocos.
+    """
+
+    def __init__(self):
+        self._raizes = {4: [None, None, None], 6: [None, None, None]}
+        self._redes = {}
+
+    def __len__(self):
+        return len(self._redes)
+
+    def inserir(self, chave, cidr, valor):
+        """Insere (ou move) o bloco `chave` no prefixo `cidr`."""
+        rede = ip_network(cidr, strict=False)
+        if chave in self._redes:
+            self.remover(chave)
+
+        no = self._raizes[rede.version]
+        bits = rede.max_prefixlen
+        endereco = int(rede.network_address)
+        for i in range(rede.prefixlen):
+            bit = (endereco >> (bits - 1 - i)) & 1
+            if no[bit] is None:
+                no[bit] = [None, None, None]
+            no = no[bit]
+
+        if no[2] is None:
+            no[2] = {}
+        no[2][chave] = valor
+        self._redes[chave] = rede
+
+    def remover(self, chave):
+        """Remove o bloco e poda os nós que ficaram vazios."""
+        rede = self._redes.pop(chave, None)
+        if rede is None:
+            return False
+
+        caminho = []
+        no = self._raizes[rede.version]
+        bits = rede.max_prefixlen
+        endereco = int(rede.network_address)
+        for i in range(rede.prefixlen):
+            bit = (endereco >> (bits - 1 - i)) & 1
+            caminho.append((no, bit))
+            no = no[bit]
+
+        no[2].pop(chave, None)
+        if not no[2]:
+            no[2] = None
+        while caminho and no[0] is None and no[1] is None and no[2] is None:
+            pai, bit = caminho.pop()
+            pai[bit] = None
+            no = pai
+        return True
+
+    def buscar(self, ip, prefixo_maximo=None):
+        """
+        Valor do bloco mais específico que contém o IP, ou None. Com `prefixo_maximo`, só blocos até
+        aquele prefixo são considerados (ex.: o menor bloco que contém uma rede inteira).
+        """
+        endereco = ip_address(ip)
+        valor = int(endereco)
+        bits = endereco.max_prefixlen
+        profundidade = bits if prefixo_maximo is None else min(prefixo_maximo, bits)
+
+        no = self._raizes[endereco.version]
+        melhor = no[2]
+        for i in range(bits - 1, bits - 1 - profundidade, -1):
+            no = no[(valor >> i) & 1]
+            if no is None:
+                break
+            if no[2]:
+                melhor = no[2]
+
+        if not melhor:
+            return None
+        # Blocos com o mesmo CIDR (filho igual ao pai): vence o mais profundo
+        return max(melhor.values())
+
+
+# Árvores por empresa, montadas sob demanda: {empresa_id: [versao, arvore, conferida_em]}. Os sinais
+# de BlocoIP abaixo aplicam cada alteração direto na árvore deste processo e incrementam a versão no
+# banco (VersaoArvorePrefixos); os demais processos veem a versão nova e remontam a árvore.
+_arvores = {}
+_trava = threading.Lock()
+
+# Intervalo (segundos) entre conferências da versão no banco: alterações feitas por outros processos
+# aparecem nas buscas deste com no máximo esse atraso
+INTERVALO_VERSAO = 1.0
+
+
+def _valor(bloco_id, bloco_cidr, profundidade):
+    return profundidade, bloco_id, bloco_cidr
+
+
+def _versao_atual(empresa_id):
+    versao = VersaoArvorePrefixos.objects.filter(empresa_id=empresa_id).values_list('versao', flat=True).first()
+    if versao is None:
+        versao = VersaoArvorePrefixos.objects.get_or_create(empresa_id=empresa_id)[0].versao
+    return versao
+
+
+def _avancar_versao(empresa_id=None):
+    """Marca a árvore da empresa (ou de todas) como desatualizada em todos os processos."""
+    versoes = VersaoArvorePrefixos.objects.all()
+    if empresa_id is not None:
+        versoes = versoes.filter(empresa_id=empresa_id)
+    versoes.update(versao=F('versao') + 1)
+
+
+def _alterar_arvore(empresa_id, alteracao=None):
+    """
+    Avança a versão da empresa e aplica `alteracao(arvore)` na árvore deste processo. Se a árvore não
+    estava na versão anterior (outro processo alterou no meio) ou não há alteração incremental
+    possível, ela é descartada e remontada na próxima busca.
+    """
+    _avancar_versao(empresa_id)
+    if empresa_id not in _arvores:
+        return
+    versao = VersaoArvorePrefixos.objects.filter(empresa_id=empresa_id).values_list('versao', flat=True).first()
+    with _trava:
+        atual = _arvores.get(empresa_id)
+        if atual is None:
+            return
+        if alteracao is not None and versao is not None and atual[0] + 1 == versao:
+            alteracao(atual[1])
+            atual[0] = versao
+        else:
+            del _arvores[empresa_id]
+
+
+def arvore_da_empresa(empresa_id):
+    """
+    Árvore de prefixos dos blocos da empresa. A versão no banco é conferida (uma consulta pela chave
+    primária) no máximo a cada INTERVALO_VERSAO; a árvore só é remontada, com uma única consulta,
+    quando a versão mudou.
+    """
+    agora = time.monotonic()
+    atual = _arvores.get(empresa_id)
+    if atual is not None and agora - atual[2] < INTERVALO_VERSAO:
+        return atual[1]
+
+    versao = _versao_atual(empresa_id)
+    if atual is not None and atual[0] == versao:
+        atual[2] = agora
+        return atual[1]
+
+    with _trava:
+        atual = _arvores.get(empresa_id)
+        if atual is not None and atual[0] == versao:
+            atual[2] = agora
+            return atual[1]
+        arvore = ArvorePrefixos()
+        blocos = BlocoIP.objects.filter(empresa_id=empresa_id).values_list('id', 'bloco_cidr', 'profundidade')
+        for bloco_id, bloco_cidr, profundidade in blocos:
+            try:
+                arvore.inserir(bloco_id, bloco_cidr, _valor(bloco_id, bloco_cidr, profundidade))
+            except ValueError:
+                continue  # CIDR inválido gravado antes das validações
+        _arvores[empresa_id] = [versao, arvore, agora]
+    return arvore
+
+
+def invalidar_arvore(empresa_id=None):
+    """Descarta a árvore da empresa (ou todas) após alterações feitas sem save(), como update/bulk_create."""
+    _avancar_versao(empresa_id)
+    with _trava:
+        if empresa_id is None:
+            _arvores.clear()
+        else:
+            _arvores.pop(empresa_id, None)
+
+
+def bloco_do_ip(empresa_id, ip):
+    """Retorna {'id', 'bloco_cidr'} do bloco mais específico da empresa que contém o IP, ou None."""
+    encontrado = arvore_da_empresa(empresa_id).buscar(ip)
+    if encontrado is None:
+        return None
+    _, bloco_id, bloco_cidr = encontrado
+    return {'id': bloco_id, 'bloco_cidr': bloco_cidr}
+
+
+def blocos_dos_ips(empresa_id, ips):
+    """Busca em lote: lista de {'ip', 'bloco'} (ou {'ip', 'erro'} para endereços inválidos)."""
+    arvore = arvore_da_empresa(empresa_id)
+    resultados = []
+    for ip in ips:
+        ip = str(ip).strip()
+        try:
+            encontrado = arvore.buscar(ip)
+        except ValueError:
+            resultados.append({'ip': ip, 'erro': "Endereço IP inválido."})
+            continue
+        bloco = None
+        if encontrado is not None:
+            _, bloco_id, bloco_cidr = encontrado
+            bloco = {'id': bloco_id, 'bloco_cidr': bloco_cidr}
+        resultados.append({'ip': ip, 'bloco': bloco})
+    return resultados
+
+
+@receiver(pre_save, sender=BlocoIP)
+def bloco_mudou_de_empresa(sender, instance, **kwargs):
+    if instance.pk:
+        anterior = BlocoIP.objects.filter(pk=instance.pk).exclude(empresa_id=instance.empresa_id).values_list(
+            'empresa_id', flat=True).first()
+        if anterior is not None:
+            _alterar_arvore(anterior, lambda arvore: arvore.remover(instance.pk))
+
+
+@receiver(post_save, sender=BlocoIP)
+def atualizar_arvore_bloco(sender, instance, created, **kwargs):
+    # Roda antes de atualizar_caminho: a profundidade nova vem do parent
+    profundidade = 0
+    if instance.parent_id:
+        profundidade = BlocoIP.objects.filter(pk=instance.parent_id).values_list('profundidade', flat=True).first()
+        profundidade = 0 if profundidade is None else profundidade + 1
+
+    def inserir(arvore):
+        try:
+            arvore.inserir(instance.pk, instance.bloco_cidr, _valor(instance.pk, instance.bloco_cidr, profundidade))
+        except ValueError:
+            arvore.remover(instance.pk)
+
+    # Mudar de nível muda a profundidade de toda a subárvore: nesse caso a árvore é remontada
+    mudou_de_nivel = not created and profundidade != instance.profundidade
+    _alterar_arvore(instance.empresa_id, None if mudou_de_nivel else inserir)
+
+
+@receiver(post_delete, sender=BlocoIP)
+def remover_arvore_bloco(sender, instance, **kwargs):
+    # Os filhos de um bloco apagado sobem de nível (ver reposicionar_sub_blocos): a árvore é remontada
+    _alterar_arvore(instance.empresa_id,
+                    None if instance.tem_sub_blocos else lambda arvore: arvore.remover(instance.pk))
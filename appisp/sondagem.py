@@ -0,0 +1,211 @@
+import asyncio
+import itertools
+import os
+import socket
+import struct
+import time
+from ipaddress import ip_address
+
+# Sondas simultâneas em voo (limita sockets abertos e a rajada de pacotes na rede)
+SIMULTANEAS = 500
+TIMEOUT = 2.0
+CONTAGEM = 1
+# Espera entre as sondas sucessivas ao mesmo host quando CONTAGEM > 1
+INTERVALO = 0.2
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+
+def _checksum(dados):
+    if len(dados) % 2:
+        dados += b'\0'
+    soma = sum(struct.unpack(f'!{len(dados) // 2}H', dados))
+    soma = (soma >> 16) + (soma & 0xffff)
+    soma += soma >> 16
+    return ~soma & 0xffff
+
+
+class SocketICMP:
+    """
+    Socket ICMP (versao=4) ou ICMPv6 (versao=6) compartilhado por todas as sondas daquela versão no loop.
+
+    Usa o socket ICMP não privilegiado (SOCK_DGRAM, net.ipv4.ping_group_range no Linux, que vale também
+    para o ICMPv6) e, sem ele, o raw socket (root/CAP_NET_RAW). As respostas são distribuídas às sondas
+    pendentes por (ip, sequência).
+    """
+
+    def __init__(self, versao=4):
+        self.versao = versao
+        if versao == 6:
+            familia, protocolo = socket.AF_INET6, socket.IPPROTO_ICMPV6
+            self.pedido, self.resposta = ICMPV6_ECHO_REQUEST, ICMPV6_ECHO_REPLY
+        else:
+            familia, protocolo = socket.AF_INET, socket.IPPROTO_ICMP
+            self.pedido, self.resposta = ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY
+        try:
+            self.sock = socket.socket(familia, socket.SOCK_DGRAM, protocolo)
+            self.raw = False
+        except OSError:
+            self.sock = socket.socket(familia, socket.SOCK_RAW, protocolo)
+            self.raw = True
+        self.sock.setblocking(False)
+        # Buffer maior para não descartar respostas quando muitas chegam juntas
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        # No socket não privilegiado o kernel substitui o identificador pelo do próprio socket
+        self.identificador = os.getpid() & 0xffff
+        self.sequencias = itertools.cycle(range(1, 0x10000))
+        self.pendentes = {}
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(self.sock.fileno(), self._receber)
+
+    def fechar(self):
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+    def _receber(self):
+        while True:
+            try:
+                dados, endereco = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            # Raw sockets IPv4 (e os DGRAM de alguns sistemas) entregam também o cabeçalho IP; no ICMPv6 não
+            if self.versao == 4 and dados and dados[0] >> 4 == 4:
+                dados = dados[(dados[0] & 0x0f) * 4:]
+            if len(dados) < 8:
+                continue
+            tipo, _, _, identificador, sequencia = struct.unpack('!BBHHH', dados[:8])
+            if tipo != self.resposta or (self.raw and identificador != self.identificador):
+                continue
+            futuro = self.pendentes.pop((str(ip_address(endereco[0].split('%')[0])), sequencia), None)
+            if futuro and not futuro.done():
+                futuro.set_result(time.perf_counter())
+
+    async def echo(self, ip, timeout):
+        """RTT em milissegundos de um echo request, ou None se não houve resposta no tempo."""
+        ip = str(ip_address(ip))  # Mesma forma do endereço devolvido pelo recvfrom
+        sequencia = next(self.sequencias)
+        carga = b'ispdoc'.ljust(32, b'\0')
+        # No ICMPv6 o checksum inclui o pseudo-cabeçalho IPv6 e é calculado pelo kernel
+        checksum = 0
+        if self.versao == 4:
+            checksum = _checksum(struct.pack('!BBHHH', self.pedido, 0, 0, self.identificador, sequencia) + carga)
+        pacote = struct.pack('!BBHHH', self.pedido, 0, checksum, self.identificador, sequencia) + carga
+
+        futuro = self.loop.create_future()
+        self.pendentes[(ip, sequencia)] = futuro
+        inicio = time.perf_counter()
+        try:
+            self.sock.sendto(pacote, (ip, 0))
+            return (await asyncio.wait_for(futuro, timeout) - inicio) * 1000
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self.pendentes.pop((ip, sequencia), None)
+
+
+async def _conectar_tcp(ip, porta, timeout):
+    """RTT em milissegundos do handshake TCP. Conexão recusada (RST) também prova que o host responde."""
+    inicio = time.perf_counter()
+    try:
+        _, escritor = await asyncio.wait_for(asyncio.open_connection(ip, porta), timeout)
+    except ConnectionRefusedError:
+        return (time.perf_counter() - inicio) * 1000
+    except (asyncio.TimeoutError, OSError):
+        return None
+    escritor.close()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def _resultado(ip, metodo, rtts):
+    respostas = [rtt for rtt in rtts if rtt is not None]
+    return {
+        'ip': ip,
+        'status': 'online' if respostas else 'offline',
+        'metodo': metodo,
+        'rtt': round(sum(respostas) / len(respostas), 2) if respostas else None,
+        'perda': round(100 * (len(rtts) - len(respostas)) / len(rtts)) if rtts else 100,
+    }
+
+
+async def _sondar_host(icmp, ip, porta, timeout, contagem, intervalo):
+    async def repetir(sonda):
+        rtts = []
+        for tentativa in range(contagem):
+            if tentativa:
+                await asyncio.sleep(intervalo)
+            rtts.append(await sonda())
+        return rtts
+
+    try:
+        versao = ip_address(ip).version
+    except ValueError:
+        return _resultado(ip, None, [])
+
+    icmp = icmp.get(versao)
+    if icmp:
+        resultado = _resultado(ip, 'icmp', await repetir(lambda: icmp.echo(ip, timeout)))
+        # Equipamentos que filtram ICMP ainda podem responder na porta de gerência
+        if resultado['status'] == 'online' or not porta:
+            return resultado
+    if porta:
+        return _resultado(ip, 'tcp', await repetir(lambda: _conectar_tcp(ip, porta, timeout)))
+    return _resultado(ip, None, [])
+
+
+class Sonda:
+    """
+    Sondador reutilizável dentro de um loop asyncio (`async with Sonda() as sonda`): mantém o socket ICMP
+    aberto e limita a `simultaneas` os hosts em voo. `await sonda.sondar(ip, porta)` devolve
+    {'ip', 'status' ('online'/'offline'), 'metodo' ('icmp'/'tcp'), 'rtt' (ms), 'perda' (%)}.
+
+    ICMP/ICMPv6 echo quando o processo pode abrir o socket da versão do IP; senão, ou se o host não
+    responde ao echo, conexão TCP na porta informada.
+    """
+
+    def __init__(self, simultaneas=SIMULTANEAS, timeout=TIMEOUT, contagem=CONTAGEM, intervalo=INTERVALO):
+        self.simultaneas = simultaneas
+        self.timeout = timeout
+        self.contagem = contagem
+        self.intervalo = intervalo
+        self.icmp = {}
+
+    async def __aenter__(self):
+        for versao in (4, 6):
+            try:
+                self.icmp[versao] = SocketICMP(versao)
+            except OSError:
+                pass  # Sem permissão ou sem suporte a IPv6: fica só o TCP para essa versão
+        self.limite = asyncio.Semaphore(self.simultaneas)
+        return self
+
+    async def __aexit__(self, *exc):
+        for icmp in self.icmp.values():
+            icmp.fechar()
+        self.icmp = {}
+
+    async def sondar(self, ip, porta=None):
+        async with self.limite:
+            return await _sondar_host(self.icmp, ip, porta, self.timeout, self.contagem, self.intervalo)
+
+
+async def sondar_async(alvos, **opcoes):
+    """Sonda os `alvos` [(ip, porta)] concorrentemente e devolve os resultados na mesma ordem (ver Sonda)."""
+    async with Sonda(**opcoes) as sonda:
+        return await asyncio.gather(*(sonda.sondar(ip, porta) for ip, porta in alvos))
+
+
+def sondar(alvos, **opcoes):
+    """Versão síncrona de `sondar_async`, para views, comandos e tarefas."""
+    return asyncio.run(sondar_async(list(alvos), **opcoes))
+
+
+def sondar_equipamentos(equipamentos, **opcoes):
+    """Sonda os equipamentos (IP e porta de gerência) e devolve {equipamento.pk: resultado}."""
+    equipamentos = list(equipamentos)
+    resultados = sondar([(equipamento.ip, equipamento.porta) for equipamento in equipamentos], **opcoes)
+    return {equipamento.pk: resultado for equipamento, resultado in zip(equipamentos, resultados)}
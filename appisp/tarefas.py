@@ -0,0 +1,237 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Empresa, IntegracaoNetbox, IntegracaoZabbix, TarefaSincronizacao
+from .netbox import sincronizar_netbox
+from .zabbix import ingerir_status_zabbix, sincronizar_equipamentos_zabbix, sincronizar_portas_zabbix
+
+# Intervalo mínimo entre gravações de progresso (e leituras do pedido de cancelamento)
+INTERVALO_PROGRESSO = 1.0
+# Tarefa "executando" sem atualização por mais que isso é considerada abandonada (worker morto)
+TEMPO_ABANDONO = timedelta(minutes=15)
+# Intervalo do batimento que mantém atualizado_em em dia mesmo em etapas longas sem progresso
+INTERVALO_BATIMENTO = 60.0
+MAX_ITENS_RESULTADO = 50
+
+
+class TarefaCancelada(Exception):
+    pass
+
+
+class Progresso:
+    """
+    Callback `progresso(processados, total, etapa)` passado às sincronizações. Grava o andamento na tarefa
+    no máximo uma vez por INTERVALO_PROGRESSO e, na mesma consulta, interrompe a execução com
+    TarefaCancelada se o cancelamento foi pedido.
+    """
+
+    def __init__(self, tarefa):
+        self.tarefa = tarefa
+        self.ultima_gravacao = 0
+
+    def __call__(self, processados, total=None, etapa=''):
+        agora = time.monotonic()
+        if agora - self.ultima_gravacao < INTERVALO_PROGRESSO:
+            return
+        self.ultima_gravacao = agora
+
+        TarefaSincronizacao.objects.filter(pk=self.tarefa.pk).update(
+            processados=processados, total=total, etapa=etapa, atualizado_em=timezone.now()
+        )
+        if TarefaSincronizacao.objects.filter(pk=self.tarefa.pk, cancelar=True).exists():
+            raise TarefaCancelada()
+
+
+class Batimento:
+    """
+    Thread que renova atualizado_em da tarefa a cada INTERVALO_BATIMENTO enquanto ela executa, independente
+    dos callbacks de progresso: uma etapa longa (uma consulta pesada, uma página lenta da API) não faz a
+    tarefa parecer abandonada. Se o processo morre, o batimento para junto e liberar_abandonadas a recolhe.
+    """
+
+    def __init__(self, tarefa, intervalo=INTERVALO_BATIMENTO):
+        self.tarefa = tarefa
+        self.intervalo = intervalo
+        self.parar = threading.Event()
+        self.thread = threading.Thread(target=self._executar, name=f'batimento-tarefa-{tarefa.pk}', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar.set()
+        self.thread.join()
+
+    def _executar(self):
+        try:
+            while not self.parar.wait(self.intervalo):
+                TarefaSincronizacao.objects.filter(pk=self.tarefa.pk, status='executando').update(
+                    atualizado_em=timezone.now())
+        finally:
+            connection.close()  # Conexão própria desta thread
+
+
+def _resumo(relatorio):
+    """Relatório de importação em formato JSON: sem mapas internos e com as listas truncadas."""
+    resumo = {}
+    for chave, valor in relatorio.items():
+        if chave in ('vinculos', 'criados_ids'):
+            continue
+        if isinstance(valor, list):
+            resumo[f'total_{chave}'] = len(valor)
+            valor = valor[:MAX_ITENS_RESULTADO]
+        resumo[chave] = valor
+    return resumo
+
+
+def _executar_zabbix_equipamentos(tarefa, progresso):
+    integracao = IntegracaoZabbix.objects.get(pk=tarefa.parametros['integracao'])
+    simular = tarefa.parametros.get('simular', False)
+    relatorio = sincronizar_equipamentos_zabbix(integracao, progresso, simular=simular)
+    if not simular:
+        integracao.ultima_sincronizacao = timezone.now()
+        integracao.save(update_fields=['ultima_sincronizacao'])
+    return _resumo(relatorio)
+
+
+def _executar_zabbix_portas(tarefa, progresso):
+    integracao = IntegracaoZabbix.objects.get(pk=tarefa.parametros['integracao'])
+    relatorio = sincronizar_portas_zabbix(integracao, progresso)
+    integracao.ultima_sincronizacao = timezone.now()
+    integracao.save(update_fields=['ultima_sincronizacao'])
+    return _resumo(relatorio)
+
+
+def _executar_zabbix_status(tarefa, progresso):
+    integracao = IntegracaoZabbix.objects.get(pk=tarefa.parametros['integracao'])
+    return _resumo(ingerir_status_zabbix(integracao, progresso))
+
+
+def _executar_netbox(tarefa, progresso):
+    integracao = IntegracaoNetbox.objects.get(pk=tarefa.parametros['integracao'])
+    relatorios = sincronizar_netbox(
+        integracao, tarefa.parametros.get('endpoints'), completo=tarefa.parametros.get('completo', False),
+        progresso=progresso,
+    )
+    integracao.ultima_sincronizacao = timezone.now()
+    integracao.save(update_fields=['ultima_sincronizacao'])
+    return {endpoint: _resumo(relatorio) for endpoint, relatorio in relatorios.items()}
+
+
+EXECUTORES = {
+    'zabbix_equipamentos': _executar_zabbix_equipamentos,
+    'zabbix_portas': _executar_zabbix_portas,
+    'zabbix_status': _executar_zabbix_status,
+    'netbox': _executar_netbox,
+}
+
+
+def enfileirar(empresa, tipo, **parametros):
+    """
+    Cria a tarefa pendente, ou devolve a que já está na fila/executando com os mesmos parâmetros, para que
+    cliques repetidos no admin não dupliquem a sincronização. A linha da empresa fica travada durante a
+    verificação: dois pedidos simultâneos não criam duas tarefas.
+    """
+    with transaction.atomic():
+        Empresa.objects.select_for_update().filter(pk=empresa.pk).exists()
+        existente = TarefaSincronizacao.objects.filter(
+            empresa=empresa, tipo=tipo, parametros=parametros, status__in=['pendente', 'executando'],
+        ).first()
+        if existente:
+            return existente
+        return TarefaSincronizacao.objects.create(empresa=empresa, tipo=tipo, parametros=parametros)
+
+
+def cancelar(tarefa):
+    """Cancela na hora uma tarefa pendente; em execução, deixa o pedido para o worker atender."""
+    if TarefaSincronizacao.objects.filter(pk=tarefa.pk, status='pendente').update(
+            status='cancelada', cancelar=True, finalizado_em=timezone.now()):
+        return True
+    return bool(TarefaSincronizacao.objects.filter(pk=tarefa.pk, status='executando').update(cancelar=True))
+
+
+def reenfileirar(tarefa):
+    """Coloca de volta na fila uma tarefa que falhou ou foi cancelada."""
+    return bool(TarefaSincronizacao.objects.filter(pk=tarefa.pk, status__in=['falhou', 'cancelada']).update(
+        status='pendente', cancelar=False, erro='', etapa='', processados=0, total=None, resultado={},
+        worker='', iniciado_em=None, finalizado_em=None,
+    ))
+
+
+def liberar_abandonadas():
+    """Marca como falhas as tarefas em execução cujo worker parou de dar notícias."""
+    return TarefaSincronizacao.objects.filter(
+        status='executando', atualizado_em__lt=timezone.now() - TEMPO_ABANDONO,
+    ).update(status='falhou', erro='Worker interrompido durante a execução.', finalizado_em=timezone.now())
+
+
+def reservar_proxima(worker=None):
+    """Reserva a tarefa pendente mais antiga (SKIP LOCKED quando o banco suporta) e a marca como executando."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    with transaction.atomic():
+        tarefa = TarefaSincronizacao.objects.select_for_update(
+            skip_locked=connection.features.has_select_for_update_skip_locked
+        ).filter(status='pendente').order_by('criado_em').first()
+        if tarefa is None:
+            return None
+        tarefa.status = 'executando'
+        tarefa.worker = worker
+        tarefa.tentativas += 1
+        tarefa.iniciado_em = timezone.now()
+        tarefa.save(update_fields=['status', 'worker', 'tentativas', 'iniciado_em', 'atualizado_em'])
+    return tarefa
+
+
+def executar(tarefa):
+    """
+    Executa a tarefa reservada e grava o resultado, o erro ou o cancelamento. A gravação final só acontece
+    se a tarefa ainda é deste worker: se liberar_abandonadas já a marcou como falha, o status dela é mantido.
+    """
+    erro = ''
+    try:
+        with Batimento(tarefa):
+            tarefa.resultado = EXECUTORES[tarefa.tipo](tarefa, Progresso(tarefa))
+        status = 'concluida'
+    except TarefaCancelada:
+        status = 'cancelada'
+    except Exception:
+        status = 'falhou'
+        erro = traceback.format_exc()
+
+    TarefaSincronizacao.objects.filter(pk=tarefa.pk, status='executando', worker=tarefa.worker).update(
+        status=status, resultado=tarefa.resultado, erro=erro, finalizado_em=timezone.now(),
+        atualizado_em=timezone.now(),
+    )
+    tarefa.refresh_from_db()
+    return tarefa
+
+
+def status_tarefa(tarefa):
+    """Representação JSON da tarefa, consultada pelo admin enquanto ela executa."""
+    return {
+        'id': tarefa.pk,
+        'tipo': tarefa.tipo,
+        'tipo_display': tarefa.get_tipo_display(),
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'etapa': tarefa.etapa,
+        'processados': tarefa.processados,
+        'total': tarefa.total,
+        'percentual': tarefa.percentual,
+        'resultado': tarefa.resultado,
+        'erro': tarefa.erro,
+        'cancelar': tarefa.cancelar,
+        'tentativas': tarefa.tentativas,
+        'criado_em': tarefa.criado_em,
+        'iniciado_em': tarefa.iniciado_em,
+        'finalizado_em': tarefa.finalizado_em,
+        'finalizada': tarefa.status in ('concluida', 'falhou', 'cancelada'),
+    }
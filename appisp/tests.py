@@ -1,3 +1,1552 @@
-from django.test import TestCase
+import asyncio
+import heapq
+import json
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from ipaddress import ip_address
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlencode, urlsplit
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+import requests
+from rest_framework.test import APIClient
+
+from .alocacao import AlocadorBuddy, AlocadorIP, prefixo_para_hosts
+from .ipam import calcular_utilizacao, cadastrar_enderecos_em_lote, exportar_subarvore, janela_ips, \
+    planejar_subdivisao, planejar_vlsm, registrar_historico_utilizacao, subdividir_bloco, validar_blocos_em_lote
+from .models import AgregadoStatus, AmostraStatus, BlocoIP, EnderecoIP, Empresa, EmpresaToken, Equipamento, \
+    Fabricante, HistoricoStatus, HistoricoUtilizacaoBloco, IntegracaoNetbox, IntegracaoZabbix, Modelo, Pop, Porta, \
+    SincronizacaoNetbox, TarefaSincronizacao, VersaoArvorePrefixos, VinculoNetbox
+from .monitoramento import AgendaVerificacoes, Monitor, consolidar_status, disponibilidade, gravar_sondagem, \
+    gravar_status, intervalo_equipamento
+from .netbox import ClienteNetbox, importar_enderecos_netbox, importar_equipamentos_netbox, importar_portas_netbox, \
+    importar_prefixos_netbox, sincronizar_netbox
+from .prefixos import ArvorePrefixos, arvore_da_empresa, bloco_do_ip, blocos_dos_ips
+from .sondagem import SocketICMP, _checksum, _resultado, sondar
+from .tarefas import cancelar, enfileirar, executar, liberar_abandonadas, reenfileirar, reservar_proxima
+from .zabbix import ClienteZabbix, ErroZabbix, _disponibilidade, ingerir_status_zabbix, \
+    sincronizar_equipamentos_zabbix, sincronizar_portas_zabbix
+
+
+def int_ip(ip):
+    return int(ip_address(ip))
+
+
+def criar_empresa(nome='Empresa', cpf_cnpj='00.000.000/0001-00'):
+    return Empresa.objects.create(
+        nome=nome, endereco='Rua 1', cidade='Cidade', estado='SP', telefone='0000',
+        cpf_cnpj=cpf_cnpj, representante='Fulano', email='contato@example.com',
+    )
+
+
+class AlocadorIPTests(SimpleTestCase):
+    def test_proximo_livre_pula_faixas_ocupadas(self):
+        alocador = AlocadorIP('10.0.0.0/29', ['10.0.0.1', '10.0.0.2', '10.0.0.4'])
+        self.assertEqual(alocador.proximo_livre(), '10.0.0.3')
+        self.assertEqual(alocador.proximo_livre('10.0.0.4'), '10.0.0.5')
+        self.assertEqual(alocador.proximos_livres(5), ['10.0.0.3', '10.0.0.5', '10.0.0.6'])
+
+    def test_rede_e_broadcast_fora_da_faixa_utilizavel(self):
+        alocador = AlocadorIP('10.0.0.0/30', ['10.0.0.0', '10.0.0.3'])
+        self.assertEqual(alocador.total_utilizavel(), 2)
+        self.assertEqual(alocador.total_ocupado(), 0)
+        # /31 e /32 usam todos os endereços
+        self.assertEqual(AlocadorIP('10.0.0.0/31').total_utilizavel(), 2)
+        self.assertEqual(AlocadorIP('10.0.0.7/32').proximo_livre(), '10.0.0.7')
+
+    def test_bloco_cheio(self):
+        alocador = AlocadorIP('10.0.0.0/30', ['10.0.0.1', '10.0.0.2'])
+        self.assertIsNone(alocador.proximo_livre())
+        self.assertEqual(alocador.faixas_ocupadas(), [(int_ip('10.0.0.1'), int_ip('10.0.0.2'))])
+
+    def test_ocupar_e_liberar_mesclam_intervalos(self):
+        alocador = AlocadorIP('10.0.0.0/28', ['10.0.0.1', '10.0.0.3'])
+        self.assertTrue(alocador.ocupar('10.0.0.2'))
+        self.assertFalse(alocador.ocupar('10.0.0.2'))
+        self.assertFalse(alocador.ocupar('10.0.1.1'))
+        self.assertEqual(len(alocador.faixas_ocupadas()), 1)
+
+        self.assertTrue(alocador.liberar('10.0.0.2'))
+        self.assertFalse(alocador.liberar('10.0.0.2'))
+        self.assertEqual(alocador.faixas_ocupadas(), [(int_ip('10.0.0.1'),) * 2, (int_ip('10.0.0.3'),) * 2])
+
+    def test_primeira_faixa_livre(self):
+        ocupados = ['10.0.0.1', '10.0.0.4', '10.0.0.5', '10.0.0.10']
+        alocador = AlocadorIP('10.0.0.0/28', ocupados)
+        self.assertEqual(alocador.primeira_faixa_livre(2), ('10.0.0.2', '10.0.0.3'))
+        self.assertEqual(alocador.primeira_faixa_livre(4), ('10.0.0.6', '10.0.0.9'))
+        self.assertEqual(alocador.primeira_faixa_livre(5), None)
+        # A árvore é refeita depois de uma alteração
+        alocador.liberar('10.0.0.10')
+        self.assertEqual(alocador.primeira_faixa_livre(5), ('10.0.0.6', '10.0.0.10'))
+
+    def test_ipv6(self):
+        alocador = AlocadorIP('2001:db8::/126', ['2001:db8::1'])
+        self.assertEqual(alocador.proximo_livre(), '2001:db8::2')
+        self.assertEqual(alocador.total_utilizavel(), 2)
+
+
+def criar_equipamento(empresa, nome='SW1'):
+    pop = Pop.objects.get_or_create(nome='POP', empresa=empresa, defaults={'endereco': 'Rua 1', 'cidade': 'Cidade'})[0]
+    fabricante = Fabricante.objects.get_or_create(nome='Fabricante')[0]
+    modelo = Modelo.objects.get_or_create(modelo='Modelo', fabricante=fabricante)[0]
+    return Equipamento.objects.create(
+        nome=nome, empresa=empresa, ip='192.0.2.1', usuario='u', senha='s', porta=22, protocolo='SSH',
+        pop=pop, fabricante=fabricante, modelo=modelo, observacao='',
+    )
+
+
+class CaminhoBlocoTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+
+    def bloco(self, cidr, parent=None):
+        return BlocoIP.objects.create(empresa=self.empresa, bloco_cidr=cidr, tipo_ip='IPv4', parent=parent)
+
+    def cadeia(self):
+        a = self.bloco('10.0.0.0/8')
+        b = self.bloco('10.0.0.0/16', a)
+        c = self.bloco('10.0.0.0/24', b)
+        d = self.bloco('10.0.0.0/28', c)
+        return a, b, c, d
+
+    def assertCaminho(self, bloco, *ids):
+        bloco.refresh_from_db()
+        self.assertEqual(bloco.caminho, ''.join(f'/{pk}' for pk in ids) + '/')
+        self.assertEqual(bloco.profundidade, len(ids) - 1)
+
+    def test_caminho_no_save(self):
+        a, b, c, d = self.cadeia()
+        self.assertCaminho(d, a.pk, b.pk, c.pk, d.pk)
+        self.assertEqual(list(a.descendentes().order_by('profundidade')), [b, c, d])
+        self.assertEqual(d.ancestrais_ids(), [a.pk, b.pk, c.pk])
+
+    def test_mover_leva_a_subarvore(self):
+        a, b, c, d = self.cadeia()
+        outro = self.bloco('10.1.0.0/16', a)
+        BlocoIP.objects.filter(pk=d.pk).update(bloco_cidr='10.1.0.0/28')
+        c.bloco_cidr, c.parent = '10.1.0.0/24', outro
+        c.save()
+        self.assertCaminho(d, a.pk, outro.pk, c.pk, d.pk)
+        b.refresh_from_db()
+        self.assertFalse(b.tem_sub_blocos)
+
+    def test_apagar_bloco_promove_filhos(self):
+        a, b, c, d = self.cadeia()
+        b.delete()
+        self.assertCaminho(c, c.pk)
+        self.assertCaminho(d, c.pk, d.pk)
+
+    def test_contar_descendentes(self):
+        a, b, c, d = self.cadeia()
+        self.bloco('10.1.0.0/16', a)
+        with CaptureQueriesContext(connection) as consultas:
+            totais = BlocoIP.objects.contar_descendentes(BlocoIP.objects.filter(pk__in=[a.pk, b.pk, d.pk]))
+        self.assertEqual(len(consultas.captured_queries), 2)  # Os blocos da página e a agregação
+        self.assertEqual(totais, {a.pk: 4, b.pk: 2, d.pk: 0})
+        self.assertEqual(BlocoIP.objects.contar_descendentes([]), {})
+
+    def test_listagem_do_admin(self):
+        a, b, c, d = self.cadeia()
+        usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        resposta = self.client.get('/admin/appisp/blocoip/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual({bloco.pk: bloco.total_descendentes for bloco in resposta.context['cl'].result_list},
+                         {a.pk: 3, b.pk: 2, c.pk: 1, d.pk: 0})
+
+    def test_apagar_ancestral_e_descendente_juntos(self):
+        a, b, c, d = self.cadeia()
+        BlocoIP.objects.filter(pk__in=[a.pk, c.pk]).delete()
+        self.assertCaminho(b, b.pk)
+        self.assertCaminho(d, d.pk)
+        self.assertIsNone(d.parent_id)
+
+
+class ArvorePrefixosTests(SimpleTestCase):
+    def test_prefixo_mais_longo(self):
+        arvore = ArvorePrefixos()
+        arvore.inserir(1, '10.0.0.0/8', 'a')
+        arvore.inserir(2, '10.1.0.0/16', 'b')
+        arvore.inserir(3, '10.1.2.0/24', 'c')
+        self.assertEqual(arvore.buscar('10.1.2.3'), 'c')
+        self.assertEqual(arvore.buscar('10.1.3.1'), 'b')
+        self.assertEqual(arvore.buscar('10.200.0.1'), 'a')
+        self.assertIsNone(arvore.buscar('192.168.0.1'))
+        self.assertEqual(arvore.buscar('10.1.2.3', prefixo_maximo=16), 'b')
+
+    def test_remover_e_mover(self):
+        arvore = ArvorePrefixos()
+        arvore.inserir(1, '10.0.0.0/8', 'a')
+        arvore.inserir(2, '10.1.0.0/16', 'b')
+        self.assertTrue(arvore.remover(2))
+        self.assertFalse(arvore.remover(2))
+        self.assertEqual(arvore.buscar('10.1.0.1'), 'a')
+        arvore.inserir(1, '192.168.0.0/16', 'a')
+        self.assertEqual(len(arvore), 1)
+        self.assertIsNone(arvore.buscar('10.1.0.1'))
+        self.assertEqual(arvore.buscar('192.168.1.1'), 'a')
+
+    def test_mesmo_cidr_vence_o_mais_profundo_e_ipv6(self):
+        arvore = ArvorePrefixos()
+        arvore.inserir(1, '2001:db8::/32', (0, 1))
+        arvore.inserir(2, '2001:db8::/32', (1, 2))
+        self.assertEqual(arvore.buscar('2001:db8::1'), (1, 2))
+        self.assertIsNone(arvore.buscar('10.0.0.1'))
+
+
+class BlocoDoIPTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        # Árvores de testes anteriores (ids reaproveitados após o rollback) não valem aqui
+        arvores = mock.patch.dict('appisp.prefixos._arvores', clear=True)
+        arvores.start()
+        self.addCleanup(arvores.stop)
+
+    def bloco(self, cidr, parent=None):
+        return BlocoIP.objects.create(empresa=self.empresa, bloco_cidr=cidr, tipo_ip='IPv4', parent=parent)
+
+    def test_acompanha_save_e_delete(self):
+        pai = self.bloco('10.0.0.0/16')
+        self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.5.1')['id'], pai.id)
+        filho = self.bloco('10.0.0.0/16', pai)  # Mesmo CIDR: vale o filho, mais profundo
+        self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.5.1')['id'], filho.id)
+        filho.delete()
+        self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.5.1')['id'], pai.id)
+        self.assertEqual(blocos_dos_ips(self.empresa.id, ['10.0.0.1', 'x', '11.0.0.1']), [
+            {'ip': '10.0.0.1', 'bloco': {'id': pai.id, 'bloco_cidr': '10.0.0.0/16'}},
+            {'ip': 'x', 'erro': "Endereço IP inválido."},
+            {'ip': '11.0.0.1', 'bloco': None},
+        ])
+
+    def test_save_altera_a_arvore_sem_remontar(self):
+        pai = self.bloco('10.0.0.0/16')
+        arvore = arvore_da_empresa(self.empresa.id)
+        filho = self.bloco('10.0.5.0/24', pai)
+        filho.bloco_cidr = '10.0.6.0/24'
+        filho.save()
+        self.assertIs(arvore_da_empresa(self.empresa.id), arvore)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.6.1')['id'], filho.id)
+            self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.5.1')['id'], pai.id)
+        self.assertEqual(len(consultas.captured_queries), 0)
+        # A versão no banco continua avançando para os outros processos
+        self.assertEqual(VersaoArvorePrefixos.objects.get(empresa=self.empresa).versao, 2)
+
+        # Mover para outro nível muda a profundidade da subárvore: a árvore é remontada
+        filho.bloco_cidr, filho.parent = '10.1.0.0/16', None
+        filho.save()
+        self.assertIsNot(arvore_da_empresa(self.empresa.id), arvore)
+        self.assertEqual(bloco_do_ip(self.empresa.id, '10.1.0.1')['id'], filho.id)
+
+    def test_alteracao_feita_em_outro_processo(self):
+        self.bloco('10.0.0.0/16')
+        self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.5.1')['bloco_cidr'], '10.0.0.0/16')
+        # Outro processo grava sem passar por este: só a versão no banco avisa da mudança
+        BlocoIP.objects.bulk_create([BlocoIP(empresa=self.empresa, bloco_cidr='10.0.5.0/24', tipo_ip='IPv4')])
+        VersaoArvorePrefixos.objects.filter(empresa=self.empresa).update(versao=F('versao') + 1)
+        self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.5.1')['bloco_cidr'], '10.0.0.0/16')
+        with mock.patch('appisp.prefixos.INTERVALO_VERSAO', 0):
+            self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.5.1')['bloco_cidr'], '10.0.5.0/24')
+
+
+class SobreposicaoBlocosTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.raiz = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/16', tipo_ip='IPv4')
+        for cidr in ('10.0.0.0/24', '10.0.4.0/22', '10.0.9.0/24'):
+            BlocoIP.objects.create(empresa=self.empresa, bloco_cidr=cidr, tipo_ip='IPv4', parent=self.raiz)
+
+    def test_sobreposicao(self):
+        irmaos = BlocoIP.objects.filter(parent=self.raiz)
+        self.assertEqual(irmaos.sobreposicao('10.0.6.0/24').bloco_cidr, '10.0.4.0/22')
+        self.assertEqual(irmaos.sobreposicao('10.0.8.0/22').bloco_cidr, '10.0.9.0/24')
+        # O candidato de maior início (10.0.4.0/22) termina antes do CIDR
+        self.assertIsNone(irmaos.sobreposicao('10.0.8.0/24'))
+        self.assertIsNone(irmaos.sobreposicao('10.0.1.0/24'))
+        self.assertIsNone(irmaos.sobreposicao('2001:db8::/32'))
+
+    def test_validar_blocos_em_lote(self):
+        erros = validar_blocos_em_lote(self.empresa, [
+            ('10.0.1.0/24', self.raiz),     # ok
+            ('10.0.5.0/24', self.raiz),     # dentro de 10.0.4.0/22, já existente
+            ('10.0.2.0/23', self.raiz),     # ok
+            ('10.0.3.0/24', self.raiz),     # dentro de 10.0.2.0/23, do mesmo lote
+            ('10.1.0.0/24', self.raiz),     # fora do parent
+            ('10.0.0.0/33', None),          # CIDR inválido
+            ('10.0.128.0/17', None),        # sobrepõe a raiz existente
+            ('192.168.0.0/24', None),       # ok
+        ])
+        self.assertEqual([indice for indice, _ in erros], [1, 3, 4, 5, 6])
+        self.assertEqual(erros[0][1], "O bloco 10.0.5.0/24 se sobrepõe com 10.0.4.0/22.")
+        self.assertEqual(erros[1][1], "O bloco 10.0.3.0/24 se sobrepõe com 10.0.2.0/23.")
+
+    def test_validar_parent_de_outra_empresa(self):
+        outra = criar_empresa('Outra', '11.111.111/0001-11')
+        self.assertEqual(validar_blocos_em_lote(outra, [('10.0.1.0/24', self.raiz)]),
+                         [(0, "O parent 10.0.0.0/16 pertence a outra empresa.")])
+        self.assertEqual(validar_blocos_em_lote(outra, [('10.0.0.0/16', None)]), [])
+
+
+class ContadoresBlocoTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.equipamento = criar_equipamento(self.empresa)
+        self.portas = [Porta.objects.create(nome=f'eth{i}', equipamento=self.equipamento, empresa=self.empresa,
+                                            observacao='') for i in range(2)]
+        self.blocos = [BlocoIP.objects.create(empresa=self.empresa, bloco_cidr=cidr, tipo_ip='IPv4')
+                       for cidr in ('10.0.0.0/24', '10.0.1.0/24')]
+        for bloco in self.blocos:
+            for i in range(1, 5):
+                EnderecoIP.objects.create(bloco=bloco, ip=bloco.bloco_cidr.replace('0/24', str(i)),
+                                          equipamento=self.equipamento, porta=self.portas[i % 2], is_gateway=i == 1,
+                                          next_hop='192.0.2.254' if i == 1 else None)
+
+    def contadores(self):
+        return [(bloco.ips_usados, bloco.gateway_ip) for bloco in BlocoIP.objects.order_by('bloco_cidr')]
+
+    def test_delete_em_lote_agrupa_os_descontos(self):
+        self.assertEqual(self.contadores(), [(4, '10.0.0.1'), (4, '10.0.1.1')])
+        with CaptureQueriesContext(connection) as consultas:
+            EnderecoIP.objects.filter(ip__in=['10.0.0.1', '10.0.0.2', '10.0.1.3']).delete()
+        atualizacoes = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(atualizacoes), 1)
+        self.assertEqual(self.contadores(), [(2, None), (3, '10.0.1.1')])
+
+    def test_delete_individual_e_em_cascata(self):
+        EnderecoIP.objects.get(ip='10.0.1.4').delete()
+        self.assertEqual(self.contadores(), [(4, '10.0.0.1'), (3, '10.0.1.1')])
+        self.portas[1].delete()  # Leva os .1 e .3 dos dois blocos
+        self.assertEqual(self.contadores(), [(2, None), (1, None)])
+
+
+class CadastroEmLoteTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.equipamento = criar_equipamento(self.empresa)
+        self.porta = Porta.objects.create(nome='eth0', equipamento=self.equipamento, empresa=self.empresa,
+                                          observacao='')
+        self.bloco = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/28', tipo_ip='IPv4')
+        EnderecoIP.objects.create(bloco=self.bloco, ip='10.0.0.3', equipamento=self.equipamento, porta=self.porta)
+
+    def test_cadastra_os_livres_em_lotes(self):
+        relatorio = cadastrar_enderecos_em_lote(self.bloco, self.equipamento, self.porta, tamanho_lote=4)
+        self.assertEqual((relatorio['criados'], relatorio['ignorados']), (13, 0))
+        self.bloco.refresh_from_db()
+        self.assertEqual(self.bloco.ips_usados, 14)
+        enderecos = EnderecoIP.objects.filter(bloco=self.bloco).order_by('ip_numerico')
+        self.assertEqual([int_ip(ip) - int_ip('10.0.0.0') for ip in enderecos.values_list('ip', flat=True)],
+                         list(range(1, 15)))
+        self.assertFalse(EnderecoIP.objects.filter(ip_numerico='').exists())
+
+    def test_gateway_cadastra_um_so(self):
+        relatorio = cadastrar_enderecos_em_lote(self.bloco, self.equipamento, self.porta, is_gateway=True,
+                                                next_hop='192.0.2.254')
+        self.assertEqual((relatorio['criados'], relatorio['ignorados']), (1, 12))
+        self.bloco.refresh_from_db()
+        self.assertEqual((self.bloco.ips_usados, self.bloco.gateway_ip), (2, '10.0.0.1'))
+        # Já existe gateway: nada é cadastrado
+        relatorio = cadastrar_enderecos_em_lote(self.bloco, self.equipamento, self.porta, is_gateway=True,
+                                                next_hop='192.0.2.254')
+        self.assertEqual(relatorio['criados'], 0)
+
+    def test_limite_de_enderecos(self):
+        with self.assertRaises(ValidationError):
+            cadastrar_enderecos_em_lote(self.bloco, self.equipamento, self.porta, max_enderecos=12)
+        self.assertEqual(EnderecoIP.objects.filter(bloco=self.bloco).count(), 1)
+        self.assertEqual(cadastrar_enderecos_em_lote(self.bloco, self.equipamento, self.porta,
+                                                     max_enderecos=13)['criados'], 13)
+
+    def test_recusa_bloco_subdividido_e_porta_de_outro_equipamento(self):
+        BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.8/29', tipo_ip='IPv4', parent=self.bloco)
+        with self.assertRaises(ValidationError):
+            cadastrar_enderecos_em_lote(self.bloco, self.equipamento, self.porta)
+        outro = criar_equipamento(self.empresa, 'SW2')
+        with self.assertRaises(ValidationError):
+            cadastrar_enderecos_em_lote(self.bloco, outro, self.porta)
+
+
+class JanelaIPsTests(TestCase):
+    def setUp(self):
+        empresa = criar_empresa()
+        equipamento = criar_equipamento(empresa)
+        porta = Porta.objects.create(nome='eth0', equipamento=equipamento, empresa=empresa, observacao='')
+        self.bloco = BlocoIP.objects.create(empresa=empresa, bloco_cidr='10.0.0.0/24', tipo_ip='IPv4')
+        for final in (1, 2, 5, 200):
+            EnderecoIP.objects.create(bloco=self.bloco, ip=f'10.0.0.{final}', equipamento=equipamento, porta=porta)
+        self.bloco.refresh_from_db()
+
+    def test_janela_agrupa_livres(self):
+        with CaptureQueriesContext(connection) as consultas:
+            janela = janela_ips(self.bloco, offset=0, limit=8)
+        self.assertEqual(len(consultas.captured_queries), 1)  # Só os IPs da janela
+        self.assertEqual([(linha['ip'], linha['tipo'], linha.get('quantidade')) for linha in janela['linhas']], [
+            ('10.0.0.0', 'IP de rede', None), ('10.0.0.1', 'Cadastrado', None), ('10.0.0.2', 'Cadastrado', None),
+            ('10.0.0.3', 'Livre', 2), ('10.0.0.5', 'Cadastrado', None), ('10.0.0.6', 'Livre', 2),
+        ])
+        self.assertEqual(janela['faixas_livres'], [
+            {'inicio': '10.0.0.3', 'fim': '10.0.0.4', 'quantidade': 2},
+            {'inicio': '10.0.0.6', 'fim': '10.0.0.7', 'quantidade': 2},
+        ])
+        self.assertEqual((janela['cadastrados'], janela['utilizaveis'], janela['total']), (4, 254, 256))
+        self.assertEqual((janela['offset_anterior'], janela['proximo_offset']), (None, 8))
+
+    def test_ultima_janela(self):
+        janela = janela_ips(self.bloco, offset=196, limit=100, agrupar_livres=False)
+        self.assertEqual((janela['primeiro'], janela['ultimo'], janela['proximo_offset']), (197, 256, None))
+        self.assertEqual(janela['linhas'][4]['tipo'], 'Cadastrado')
+        self.assertEqual(janela['linhas'][-1], {'ip': '10.0.0.255', 'tipo': 'IP de broadcast'})
+        self.assertEqual(len(janela['linhas']), 60)
+        self.assertEqual([(faixa['inicio'], faixa['fim']) for faixa in janela['faixas_livres']],
+                         [('10.0.0.196', '10.0.0.199'), ('10.0.0.201', '10.0.0.254')])
+
+
+class EstruturaBlocoTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        equipamento = criar_equipamento(self.empresa)
+        porta = Porta.objects.create(nome='eth0', equipamento=equipamento, empresa=self.empresa, observacao='')
+        self.raiz = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/16', tipo_ip='IPv4')
+        self.filho = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/24', tipo_ip='IPv4',
+                                            parent=self.raiz)
+        self.neto = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/28', tipo_ip='IPv4',
+                                           parent=self.filho)
+        EnderecoIP.objects.create(bloco=self.neto, ip='10.0.0.1', equipamento=equipamento, porta=porta)
+        self.usuario = User.objects.create_user('usuario', password='senha')
+        self.empresa.usuarios.add(self.usuario)
+
+    def test_exportar_subarvore(self):
+        with CaptureQueriesContext(connection) as consultas:
+            arvore = exportar_subarvore(self.raiz, campos_ip=['ip', 'inexistente'])
+        self.assertEqual(len(consultas.captured_queries), 2)
+        [filho] = arvore['sub_blocos']
+        [neto] = filho['sub_blocos']
+        self.assertEqual((filho['bloco'], neto['bloco']), ('10.0.0.0/24', '10.0.0.0/28'))
+        self.assertEqual(neto['ips'], [{'ip': '10.0.0.1'}])
+        self.assertEqual(exportar_subarvore(self.raiz, profundidade_maxima=1)['sub_blocos'][0]['sub_blocos'], [])
+
+    def test_view(self):
+        url = f'/ajax/estrutura_bloco/{self.raiz.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 302)  # Exige login
+
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(url, {'profundidade': 0, 'ips': 0})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(json.loads(b''.join(resposta.streaming_content))['sub_blocos'], [])
+        self.assertEqual(self.client.get(url, {'profundidade': -1}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'profundidade': 'x'}).status_code, 400)
+
+        # Bloco de empresa que não é do usuário
+        outro = User.objects.create_user('outro', password='senha')
+        criar_empresa('Outra', '11.111.111/0001-11').usuarios.add(outro)
+        self.client.force_login(outro)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class UtilizacaoBlocosTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        equipamento = criar_equipamento(self.empresa)
+        porta = Porta.objects.create(nome='eth0', equipamento=equipamento, empresa=self.empresa, observacao='')
+        self.raiz = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/22', tipo_ip='IPv4')
+        self.filhos = [BlocoIP.objects.create(empresa=self.empresa, bloco_cidr=cidr, tipo_ip='IPv4', parent=self.raiz)
+                       for cidr in ('10.0.0.0/24', '10.0.2.0/24')]
+        for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.5', '10.0.0.6', '10.0.2.1', '10.0.2.2'):
+            bloco = self.filhos[0] if ip.startswith('10.0.0.') else self.filhos[1]
+            EnderecoIP.objects.create(bloco=bloco, ip=ip, equipamento=equipamento, porta=porta)
+
+    def test_consolida_os_sub_blocos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            blocos = calcular_utilizacao(self.empresa)
+        self.assertEqual(len(consultas.captured_queries), 2)
+
+        raiz = blocos[self.raiz.pk]
+        # Sub-blocos contam como alocados: sobram 10.0.1.0/24 inteiro e 10.0.3.0-10.0.3.254
+        self.assertEqual((raiz['total'], raiz['usados'], raiz['livres'], raiz['faixas_livres']), (1022, 6, 511, 2))
+        self.assertEqual((raiz['maior_faixa_livre'], raiz['fragmentacao']), (256, round(1 - 256 / 511, 4)))
+        self.assertEqual(raiz['percentual'], round(6 / 1022 * 100, 2))
+
+        filho = blocos[self.filhos[0].pk]
+        self.assertEqual((filho['usados'], filho['livres'], filho['faixas_livres'], filho['maior_faixa_livre']),
+                         (4, 250, 2, 248))
+
+    def test_historico_e_relatorio(self):
+        ontem = date(2026, 10, 17)
+        self.assertEqual(registrar_historico_utilizacao(self.empresa, data=ontem), 3)
+        EnderecoIP.objects.filter(ip='10.0.2.2').delete()
+        registrar_historico_utilizacao(self.empresa, data=ontem)  # A mesma data é atualizada, não duplicada
+        self.assertEqual(HistoricoUtilizacaoBloco.objects.count(), 3)
+        self.assertEqual(HistoricoUtilizacaoBloco.objects.get(bloco=self.raiz).usados, 5)
+
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Token {EmpresaToken.objects.create(empresa=self.empresa).token}")
+        with mock.patch('appisp.ipam.timezone.localdate', return_value=date(2026, 10, 18)):
+            resposta = cliente.get('/api/relatorio-utilizacao/', {'top': 1})
+        self.assertEqual(resposta.status_code, 200)
+        relatorio = resposta.json()
+        self.assertEqual(relatorio['total_blocos'], 3)
+        [raiz] = relatorio['raizes']
+        self.assertEqual((raiz['id'], raiz['usados']), (self.raiz.pk, 5))
+        self.assertEqual(raiz['tendencia'], [{'data': '2026-10-17', 'usados': 5, 'percentual': raiz['percentual']}])
+        self.assertEqual([bloco['id'] for bloco in relatorio['mais_utilizados']], [self.filhos[0].pk])
+        self.assertEqual(cliente.get('/api/relatorio-utilizacao/', {'top': 'x'}).status_code, 400)
+
+
+class AlocadorBuddyTests(SimpleTestCase):
+    def test_best_fit_preserva_blocos_grandes(self):
+        alocador = AlocadorBuddy([(0, 255)])
+        self.assertEqual(alocador.alocar(4), 0)
+        # As metades que sobraram do /24 atendem os próximos pedidos sem quebrar o bloco de 128
+        self.assertEqual(alocador.alocar(64), 64)
+        self.assertEqual(alocador.alocar(32), 32)
+        self.assertEqual(alocador.alocar(128), 128)
+        self.assertIsNone(alocador.alocar(128))
+
+    def test_faixas_livres_desalinhadas(self):
+        alocador = AlocadorBuddy([(3, 12)])
+        self.assertIsNone(alocador.alocar(8))
+        self.assertEqual(alocador.alocar(4), 4)
+        self.assertEqual(alocador.alocar(2), 8)
+        self.assertEqual(alocador.alocar(1), 3)
+        self.assertEqual(alocador.alocar(2), 10)
+        self.assertEqual(alocador.alocar(1), 12)
+        self.assertIsNone(alocador.alocar(1))
+
+    def test_prefixo_para_hosts(self):
+        self.assertEqual(prefixo_para_hosts(50), 26)
+        self.assertEqual(prefixo_para_hosts(3), 29)
+        self.assertEqual(prefixo_para_hosts(2), 31)  # /31 ponto a ponto: os dois endereços são utilizáveis
+        self.assertEqual(prefixo_para_hosts(1), 32)
+        self.assertEqual(prefixo_para_hosts(3, versao=6), 125)
+
+
+class PlanejarVLSMTests(TestCase):
+    def setUp(self):
+        self.bloco = BlocoIP.objects.create(empresa=criar_empresa(), bloco_cidr='10.0.0.0/24', tipo_ip='IPv4')
+
+    def test_planejar_vlsm(self):
+        plano = planejar_vlsm(self.bloco, [2, 50, 20])
+        self.assertEqual(plano['prefixos'], [31, 26, 27])
+        self.assertEqual(plano['redes'], [
+            {'bloco': '10.0.0.0/26', 'hosts': 50, 'utilizaveis': 62},
+            {'bloco': '10.0.0.64/27', 'hosts': 20, 'utilizaveis': 30},
+            {'bloco': '10.0.0.96/31', 'hosts': 2, 'utilizaveis': 2},
+        ])
+        self.assertEqual(plano['livres_apos'], 256 - 64 - 32 - 2)
+
+    def test_respeita_sub_blocos_existentes(self):
+        BlocoIP.objects.create(empresa=self.bloco.empresa, bloco_cidr='10.0.0.0/25', tipo_ip='IPv4', parent=self.bloco)
+        redes = planejar_vlsm(self.bloco, [50, 2])['redes']
+        self.assertEqual([rede['bloco'] for rede in redes], ['10.0.0.128/26', '10.0.0.192/31'])
+        self.assertEqual([str(rede) for rede in planejar_subdivisao(self.bloco, novo_prefixo=26)],
+                         ['10.0.0.128/26', '10.0.0.192/26'])
+        with self.assertRaises(ValidationError):
+            planejar_vlsm(self.bloco, [100, 20])
+
+    def test_pedido_maior_que_o_bloco(self):
+        with self.assertRaises(ValidationError):
+            planejar_vlsm(self.bloco, [300])
+        with self.assertRaises(ValidationError):
+            planejar_vlsm(self.bloco, [0])
+
+
+class SubdividirBlocoTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.bloco = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/24', tipo_ip='IPv4')
+        self.existente = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/25', tipo_ip='IPv4',
+                                                parent=self.bloco)
+
+    def test_grava_os_filhos_com_caminho_e_faixa(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            arvore = subdividir_bloco(self.bloco, novo_prefixo=26)
+        self.assertEqual([filho['bloco'] for filho in arvore['sub_blocos']],
+                         ['10.0.0.0/25', '10.0.0.128/26', '10.0.0.192/26'])
+
+        for novo in BlocoIP.objects.filter(parent=self.bloco).exclude(pk=self.existente.pk):
+            salvo = BlocoIP.objects.get(pk=novo.pk)
+            # O mesmo que o save() individual calcularia
+            novo.save()
+            novo.refresh_from_db()
+            self.assertEqual((salvo.caminho, salvo.profundidade), (f'/{self.bloco.pk}/{novo.pk}/', 1))
+            self.assertEqual((salvo.inicio_numerico, salvo.fim_numerico), (novo.inicio_numerico, novo.fim_numerico))
+        self.bloco.refresh_from_db()
+        self.assertTrue(self.bloco.tem_sub_blocos)
+        self.assertEqual(bloco_do_ip(self.empresa.id, '10.0.0.200')['bloco_cidr'], '10.0.0.192/26')
+
+    def test_vlsm_e_plano_invalido(self):
+        subdividir_bloco(self.bloco, prefixos=[27, 26])
+        self.assertEqual(sorted(BlocoIP.objects.filter(parent=self.bloco).values_list('bloco_cidr', flat=True)),
+                         ['10.0.0.0/25', '10.0.0.128/26', '10.0.0.192/27'])
+        with self.assertRaises(ValidationError):
+            subdividir_bloco(self.bloco, prefixos=[26])  # Não cabe mais
+        with self.assertRaises(ValidationError):
+            subdividir_bloco(self.bloco, novo_prefixo=24)
+        self.assertEqual(BlocoIP.objects.filter(parent=self.bloco).count(), 3)
+
+
+class SerieStatusTests(TestCase):
+    agora = datetime(2026, 10, 18, 12, 1, 30, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.equipamento = criar_equipamento(self.empresa)
+
+    def amostras(self, *amostras):
+        AmostraStatus.objects.bulk_create([
+            AmostraStatus(equipamento=self.equipamento, registrado_em=momento, online=rtt is not None, rtt=rtt)
+            for momento, rtt in amostras
+        ])
+
+    def hora(self, horas, minutos=0, segundos=0):
+        return datetime(2026, 10, 18, horas, minutos, segundos, tzinfo=dt_timezone.utc)
+
+    def test_consolidar_status(self):
+        self.amostras(
+            (self.hora(11, 50), 10), (self.hora(11, 51), 20), (self.hora(11, 52), None),
+            (self.hora(11, 55), 40), (self.hora(11, 59, 59), 40),
+            (self.hora(12, 0, 10), 30),  # Janela em andamento: fica só na série bruta
+        )
+        relatorio = consolidar_status(agora=self.agora)
+        self.assertEqual((relatorio['5m'], relatorio['1h']), (2, 1))
+
+        cinco = list(AgregadoStatus.objects.filter(periodo='5m').order_by('inicio').values_list(
+            'inicio', 'amostras', 'online', 'rtt_medio', 'rtt_maximo'))
+        self.assertEqual(cinco, [(self.hora(11, 50), 3, 2, 15.0, 20.0), (self.hora(11, 55), 2, 2, 40.0, 40.0)])
+        hora = AgregadoStatus.objects.get(periodo='1h')
+        self.assertEqual((hora.inicio, hora.amostras, hora.online, hora.rtt_maximo), (self.hora(11), 5, 4, 40.0))
+        self.assertAlmostEqual(hora.rtt_medio, (15 * 2 + 40 * 2) / 4)
+
+        # Nada novo a consolidar e nada fora da retenção
+        self.assertEqual(consolidar_status(agora=self.agora),
+                         {'5m': 0, '1h': 0, 'amostras_removidas': 0, 'agregados_removidos': 0})
+        self.assertEqual(AmostraStatus.objects.count(), 6)
+
+    def test_disponibilidade_combina_as_fontes(self):
+        self.amostras(
+            (self.agora - timedelta(days=35), 50),                            # só resta o agregado de 1 hora
+            (self.hora(10) - timedelta(days=3), 10), (self.hora(10, 0, 20) - timedelta(days=3), None),  # 5 min
+            (self.hora(11, 50), 10), (self.hora(11, 51), None),                # consolidadas, ainda brutas
+            (self.hora(12, 0, 10), 30), (self.hora(12, 1), 30),                # cauda não consolidada
+        )
+        consolidar_status(agora=self.agora)
+        self.assertEqual(AmostraStatus.objects.count(), 4)
+        self.assertFalse(AgregadoStatus.objects.filter(periodo='5m', inicio__lt=self.agora - timedelta(days=30)).exists())
+
+        with mock.patch('appisp.monitoramento.timezone.now', return_value=self.agora):
+            resultado = disponibilidade(self.empresa, self.agora - timedelta(days=40), self.agora)
+        self.assertEqual([fonte['resolucao'] for fonte in resultado['fontes']], ['1h', '5m', 'bruta'])
+        # A série bruta vale a partir da primeira janela de 5 minutos dentro da retenção
+        self.assertEqual(resultado['fontes'][-1]['inicio'], self.hora(12, 5) - timedelta(days=2))
+        [linha] = resultado['resultados']
+        self.assertEqual((linha['id'], linha['amostras'], linha['online']), (self.equipamento.pk, 7, 5))
+        self.assertEqual(linha['disponibilidade'], round(100 * 5 / 7, 3))
+        self.assertEqual(linha['rtt_medio'], (50 + 10 + 10 + 30 + 30) / 5)
+
+    def test_api_rejeita_data_invalida(self):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Token {EmpresaToken.objects.create(empresa=self.empresa).token}")
+        resposta = cliente.get('/api/disponibilidade/', {'inicio': '2026-13-01T00:00:00'})
+        self.assertEqual(resposta.status_code, 400)
+        resposta = cliente.get('/api/disponibilidade/', {'horas': 1})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['resultados'], [])
+
+
+def dispositivo_netbox(netbox_id, nome, ip=None):
+    return {
+        'id': netbox_id, 'name': nome, 'primary_ip4': {'address': f'{ip}/24'} if ip else None,
+        'device_type': {'model': 'CCR2004', 'manufacturer': {'name': 'MikroTik'}},
+    }
+
+
+class GravarStatusTests(TestCase):
+    def setUp(self):
+        empresa = criar_empresa()
+        self.equipamentos = [criar_equipamento(empresa, f'SW{i}') for i in range(3)]
+
+    def test_grava_somente_as_mudancas(self):
+        estavel, caiu, ausente = self.equipamentos
+        alterados = gravar_status(self.equipamentos, {estavel.pk: 'Ativo', caiu.pk: 'Inativo'}, 'teste',
+                                  rtts={estavel.pk: 1.5})
+        self.assertEqual(alterados, [caiu])
+
+        estavel.refresh_from_db()
+        caiu.refresh_from_db()
+        ausente.refresh_from_db()
+        self.assertEqual((estavel.status, caiu.status, ausente.status), ('Ativo', 'Inativo', 'Ativo'))
+        self.assertIsNone(estavel.status_alterado_em)
+        self.assertEqual(caiu.status_alterado_em, caiu.ultima_verificacao)
+        self.assertEqual(estavel.ultimo_contato, estavel.ultima_verificacao)
+        self.assertIsNone(caiu.ultimo_contato)
+        self.assertIsNone(ausente.ultima_verificacao)
+
+        self.assertEqual(list(HistoricoStatus.objects.values_list('equipamento', 'status', 'origem')),
+                         [(caiu.pk, 'Inativo', 'teste')])
+        self.assertEqual(sorted(AmostraStatus.objects.values_list('equipamento', 'online', 'rtt')),
+                         [(estavel.pk, True, 1.5), (caiu.pk, False, None)])
+
+        # Repetir o mesmo resultado não gera histórico nem regrava o status
+        caiu.status = 'Inativo'
+        self.assertEqual(gravar_status([caiu], {caiu.pk: 'Inativo'}, 'teste'), [])
+        self.assertEqual(HistoricoStatus.objects.count(), 1)
+        self.assertEqual(AmostraStatus.objects.count(), 3)
+
+    def test_consultas_nao_crescem_com_os_equipamentos(self):
+        def consultas(equipamentos, status):
+            with CaptureQueriesContext(connection) as contexto:
+                gravar_status(equipamentos, {equipamento.pk: status for equipamento in equipamentos}, 'teste')
+            return len(contexto)
+
+        empresa = Empresa.objects.get()
+        muitos = self.equipamentos + [criar_equipamento(empresa, f'SW{i}') for i in range(3, 8)]
+        self.assertEqual(consultas(muitos[:2], 'Ativo'), consultas(muitos, 'Ativo'))
+        for equipamento in muitos:
+            equipamento.refresh_from_db()
+        self.assertEqual(consultas(muitos[:2], 'Inativo'), consultas(muitos[2:], 'Inativo'))
+        self.assertEqual(Equipamento.objects.filter(status='Inativo').count(), len(muitos))
+
+    def test_gravar_sondagem(self):
+        online, offline, _ = self.equipamentos
+        alterados = gravar_sondagem(self.equipamentos, {
+            online.pk: {'status': 'online', 'rtt': 2.0},
+            offline.pk: {'status': 'offline', 'rtt': None},
+        })
+        self.assertEqual(alterados, [offline])
+        self.assertEqual(HistoricoStatus.objects.get().origem, 'sondagem')
+        self.assertEqual(AmostraStatus.objects.get(equipamento=online).rtt, 2.0)
+
+
+def equipamento_agendado(pk, tipo='Switch', intervalo_verificacao=None):
+    return SimpleNamespace(pk=pk, tipo=tipo, intervalo_verificacao=intervalo_verificacao)
+
+
+class AgendaVerificacoesTests(SimpleTestCase):
+    def test_intervalo_equipamento(self):
+        self.assertEqual(intervalo_equipamento(equipamento_agendado(1)), 60)
+        self.assertEqual(intervalo_equipamento(equipamento_agendado(1, 'Roteador')), 30)
+        self.assertEqual(intervalo_equipamento(equipamento_agendado(1, 'Roteador', 5)), 5)
+        self.assertIsNone(intervalo_equipamento(equipamento_agendado(1, 'Passivo')))
+        self.assertIsNone(intervalo_equipamento(equipamento_agendado(1, intervalo_verificacao=0)))
+
+    def test_primeira_verificacao_espalhada(self):
+        agenda = AgendaVerificacoes()
+        agenda.carregar([equipamento_agendado(pk) for pk in range(200)] + [equipamento_agendado(999, 'Passivo')],
+                        1000)
+        instantes = [instante for instante, _ in agenda.heap]
+        self.assertEqual(len(instantes), 200)
+        self.assertTrue(all(1000 <= instante <= 1060 for instante in instantes))
+        self.assertGreater(max(instantes) - min(instantes), 30)  # Não ficam todos no mesmo instante
+
+        # Recarregar não duplica quem já está agendado
+        agenda.carregar([equipamento_agendado(pk) for pk in range(200)], 1000)
+        self.assertEqual(len(agenda.heap), 200)
+
+    def test_jitter(self):
+        agenda = AgendaVerificacoes(jitter=0.1)
+        equipamento = equipamento_agendado(1)
+        agenda.carregar([equipamento], 0)
+        agenda.vencidos(60, 10)
+        for _ in range(50):
+            agenda.reagendar(equipamento, True, 0)
+        instantes = [instante for instante, _ in agenda.heap]
+        self.assertTrue(all(54 <= instante <= 66 for instante in instantes))
+        self.assertGreater(len(set(instantes)), 1)
+
+    def test_backoff_dos_offline(self):
+        agenda = AgendaVerificacoes(jitter=0, backoff_maximo=600)
+        equipamento = equipamento_agendado(1)
+        lento = equipamento_agendado(2, intervalo_verificacao=900)
+        agenda.carregar([equipamento, lento], 0)
+        agenda.vencidos(900, 10)
+
+        def proximo(online):
+            agenda.reagendar(equipamento, online, 0)
+            instante, _ = heapq.heappop(agenda.heap)
+            agenda.agendados.discard(equipamento.pk)
+            return instante
+
+        self.assertEqual([proximo(False) for _ in range(5)], [120, 240, 480, 600, 600])
+        self.assertEqual(proximo(True), 60)
+        self.assertEqual(proximo(False), 120)  # Voltar ao ar zera a contagem de falhas
+        self.assertEqual(agenda.falhas, {equipamento.pk: 1})
+
+        # Intervalo próprio acima do teto não é reduzido pelo backoff
+        agenda.reagendar(lento, False, 0)
+        self.assertEqual(agenda.proxima(), 900)
+
+    def test_vencidos(self):
+        agenda = AgendaVerificacoes(jitter=0)
+        equipamentos = [equipamento_agendado(pk) for pk in range(5)]
+        agenda.carregar(equipamentos, 0)
+        self.assertEqual(agenda.vencidos(-1, 10), [])
+        self.assertEqual(len(agenda.vencidos(60, 3)), 3)  # Respeita o limite de vagas
+
+        # Removido da lista monitorada: sai da agenda ao vencer, levando a contagem de falhas
+        agenda = AgendaVerificacoes(jitter=0)
+        agenda.carregar(equipamentos, 0)
+        agenda.falhas[4] = 2
+        agenda.carregar(equipamentos[:4], 0)
+        self.assertEqual(sorted(equipamento.pk for equipamento in agenda.vencidos(60, 10)), [0, 1, 2, 3])
+        self.assertNotIn(4, agenda.falhas)
+        self.assertIsNone(agenda.proxima())
+        agenda.reagendar(equipamentos[4], False, 0)
+        self.assertIsNone(agenda.proxima())
+
+
+class SondaMonitorFalsa:
+    """Sonda do Monitor sem rede: só 192.0.2.1 responde."""
+    sondados = []
+
+    def __init__(self, **opcoes):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def sondar(self, ip, porta=None):
+        SondaMonitorFalsa.sondados.append(ip)
+        online = ip == '192.0.2.1'
+        return {'ip': ip, 'status': 'online' if online else 'offline', 'metodo': 'icmp',
+                'rtt': 1.0 if online else None, 'perda': 0 if online else 100}
+
+
+class MonitorTests(TransactionTestCase):
+    # O Monitor lê e grava em thread (sync_to_async), fora da transação de um TestCase
+
+    def test_executar(self):
+        empresa = criar_empresa()
+        online = criar_equipamento(empresa, 'SW1')
+        offline = criar_equipamento(empresa, 'SW2')
+        Equipamento.objects.filter(pk=offline.pk).update(ip='192.0.2.2')
+        criar_equipamento(empresa, 'PP1')
+        Equipamento.objects.filter(nome='PP1').update(tipo='Patch Panel', ip='192.0.2.3')
+
+        SondaMonitorFalsa.sondados = []
+        # Primeira verificação imediata e reagendamentos no limite inferior do jitter
+        with mock.patch('appisp.monitoramento.Sonda', SondaMonitorFalsa), \
+                mock.patch('appisp.monitoramento.random.uniform', side_effect=lambda inicio, fim: inicio):
+            monitor = Monitor(Equipamento.objects.all(), simultaneas=1, intervalo_gravacao=0.05)
+            monitor.executar(duracao=0.3)
+
+        self.assertEqual(sorted(SondaMonitorFalsa.sondados), ['192.0.2.1', '192.0.2.2'])
+        self.assertEqual((monitor.sondados, monitor.alterados), (2, 1))
+        self.assertEqual(monitor.agenda.falhas, {offline.pk: 1})
+        self.assertEqual(monitor.resultados, {})
+
+        online.refresh_from_db()
+        offline.refresh_from_db()
+        self.assertEqual((online.status, offline.status), ('Ativo', 'Inativo'))
+        self.assertIsNotNone(online.ultimo_contato)
+        self.assertIsNotNone(offline.ultima_verificacao)
+        self.assertIsNone(Equipamento.objects.get(nome='PP1').ultima_verificacao)
+        self.assertEqual(list(HistoricoStatus.objects.values_list('equipamento', 'origem')),
+                         [(offline.pk, 'sondagem')])
+        self.assertEqual(AmostraStatus.objects.count(), 2)
+
+
+class AtualizarStatusLoteTests(TestCase):
+    url = '/api/atualizar_status/batch/'
+
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Token {EmpresaToken.objects.create(empresa=self.empresa).token}")
+        self.ativo = criar_equipamento(self.empresa, 'SW1')
+        self.caindo = criar_equipamento(self.empresa, 'SW2')
+        self.alheio = criar_equipamento(criar_empresa('Outra', '11.111.111/0001-11'), 'SW3')
+
+    def test_itens_mistos(self):
+        itens = [
+            {'id': self.ativo.pk, 'status': 'Ativo'},
+            {'id': self.caindo.pk, 'status': 'Inativo'},
+            {'id': self.alheio.pk, 'status': 'Inativo'},
+            {'id': 999999, 'status': 'Ativo'},
+            {'id': str(self.ativo.pk), 'status': 'Ativo'},
+            {'id': True, 'status': 'Ativo'},
+            {'id': self.ativo.pk, 'status': 'Desligado'},
+            'lixo',
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.cliente.post(self.url, {'equipamentos': itens}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['atualizados'], 1)
+        self.assertEqual([resultado['resultado'] for resultado in dados['resultados']], [
+            'inalterado', 'atualizado', 'nao_encontrado', 'nao_encontrado', 'invalido', 'invalido', 'invalido',
+            'invalido',
+        ])
+        self.assertEqual(dados['resultados'][1], {'id': self.caindo.pk, 'resultado': 'atualizado',
+                                                  'status_anterior': 'Ativo', 'novo_status': 'Inativo'})
+        self.assertEqual(dados['resultados'][2], {'id': self.alheio.pk, 'resultado': 'nao_encontrado',
+                                                  'error': 'Equipamento não encontrado.'})
+        self.assertEqual(dados['resultados'][4]['id'], str(self.ativo.pk))
+        self.assertIn('Ativo, Inativo', dados['resultados'][6]['error'])
+
+        self.assertEqual(dict(Equipamento.objects.values_list('nome', 'status')),
+                         {'SW1': 'Ativo', 'SW2': 'Inativo', 'SW3': 'Ativo'})  # O da outra empresa não é tocado
+        self.assertEqual(list(HistoricoStatus.objects.values_list('equipamento', 'status', 'origem')),
+                         [(self.caindo.pk, 'Inativo', 'api')])
+        # IDs validados numa consulta só, não uma por item
+        self.assertEqual(sum('"appisp_equipamento"' in consulta['sql'] and consulta['sql'].startswith('SELECT')
+                             for consulta in consultas.captured_queries), 1)
+
+    def test_id_repetido_vale_o_ultimo(self):
+        resposta = self.cliente.post(self.url, [
+            {'id': self.caindo.pk, 'status': 'Inativo'}, {'id': self.caindo.pk, 'status': 'Ativo'},
+        ], format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['atualizados'], 0)
+        self.assertEqual(Equipamento.objects.get(pk=self.caindo.pk).status, 'Ativo')
+
+    def test_requisicoes_invalidas(self):
+        self.assertEqual(self.cliente.post(self.url, {'equipamentos': []}, format='json').status_code, 400)
+        self.assertEqual(self.cliente.post(self.url, {'equipamentos': {'id': 1}}, format='json').status_code, 400)
+        with mock.patch('appisp.views.MAX_STATUS_POR_LOTE', 1):
+            resposta = self.cliente.post(self.url, [{'id': self.ativo.pk, 'status': 'Ativo'}] * 2, format='json')
+        self.assertEqual(resposta.status_code, 400)
+
+        anonimo = APIClient().post(self.url, [{'id': self.ativo.pk, 'status': 'Inativo'}], format='json')
+        self.assertEqual(anonimo.status_code, 401)
+        self.assertEqual(Equipamento.objects.get(pk=self.ativo.pk).status, 'Ativo')
+
+
+class ImportadoresNetboxTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.integracao = IntegracaoNetbox.objects.create(empresa=self.empresa, url='http://netbox.local/api/',
+                                                          token='t')
+        self.sw1 = criar_equipamento(self.empresa)
+
+    def test_equipamentos(self):
+        relatorio = importar_equipamentos_netbox(self.integracao, [
+            dispositivo_netbox(1, 'SW1'), dispositivo_netbox(2, 'R1', '10.0.0.1'),
+            dispositivo_netbox(3, 'R2'), dispositivo_netbox(4, 'R1'),
+        ])
+        self.assertEqual((relatorio['linhas'], relatorio['criados'], relatorio['erros']), (4, 2, []))
+        r1, r2 = Equipamento.objects.get(nome='R1'), Equipamento.objects.get(nome='R2')
+        self.assertEqual((r1.ip, r1.modelo.modelo, r1.fabricante.nome), ('10.0.0.1', 'CCR2004', 'MikroTik'))
+        self.assertEqual(r2.ip, '0.0.0.0')
+        self.assertEqual(relatorio['vinculos'], {1: self.sw1.pk, 2: r1.pk, 3: r2.pk, 4: r1.pk})
+        # O SW1 já existia: não é marcado como criado pela importação
+        self.assertEqual(relatorio['criados_ids'], {r1.pk, r2.pk})
+        self.assertEqual(Fabricante.objects.filter(nome='MikroTik').count(), 1)
+
+    def test_portas(self):
+        existente = Porta.objects.create(nome='eth0', equipamento=self.sw1, empresa=self.empresa, tipo='Fibra',
+                                         speed='1G', observacao='')
+        relatorio = importar_portas_netbox(self.integracao, [
+            {'id': 10, 'name': 'eth0', 'device': {'name': 'SW1'}},
+            {'id': 11, 'name': 'eth1', 'device': {'name': 'SW1'}},
+            {'id': 12, 'name': 'eth0', 'device': {'name': 'Inexistente'}},
+        ])
+        self.assertEqual((relatorio['criados'], relatorio['atualizados'], len(relatorio['erros'])), (1, 0, 1))
+        nova = Porta.objects.get(equipamento=self.sw1, nome='eth1')
+        self.assertEqual(relatorio['vinculos'], {10: existente.pk, 11: nova.pk})
+        self.assertEqual(relatorio['criados_ids'], {nova.pk})
+
+    def test_prefixos_recebem_o_parent_mais_especifico(self):
+        raiz = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/16', tipo_ip='IPv4')
+        relatorio = importar_prefixos_netbox(self.integracao, [
+            {'id': 1, 'prefix': '10.0.1.128/25', 'description': 'clientes'},
+            {'id': 2, 'prefix': '10.0.1.0/24', 'device': {'name': 'SW1'}},
+            {'id': 3, 'prefix': '10.0.0.0/16', 'description': 'backbone'},
+            {'id': 4, 'prefix': 'x'},
+        ])
+        self.assertEqual((relatorio['criados'], relatorio['atualizados']), (2, 1))
+        self.assertEqual(relatorio['erros'], ['x: prefixo inválido.'])
+
+        media = BlocoIP.objects.get(bloco_cidr='10.0.1.0/24')
+        menor = BlocoIP.objects.get(bloco_cidr='10.0.1.128/25')
+        self.assertEqual((media.parent_id, media.equipamento_id), (raiz.pk, self.sw1.pk))
+        self.assertEqual((menor.parent_id, menor.caminho, menor.profundidade),
+                         (media.pk, f'/{raiz.pk}/{media.pk}/{menor.pk}/', 2))
+        raiz.refresh_from_db()
+        self.assertEqual((raiz.descricao, raiz.tem_sub_blocos), ('backbone', True))
+        self.assertEqual(relatorio['criados_ids'], {media.pk, menor.pk})
+
+    def test_enderecos(self):
+        porta = Porta.objects.create(nome='eth0', equipamento=self.sw1, empresa=self.empresa, observacao='')
+        raiz = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.0.0/16', tipo_ip='IPv4')
+        bloco = BlocoIP.objects.create(empresa=self.empresa, bloco_cidr='10.0.1.0/24', tipo_ip='IPv4', parent=raiz)
+        interface = {'name': 'eth0', 'device': {'name': 'SW1'}}
+        relatorio = importar_enderecos_netbox(self.integracao, [
+            {'id': 1, 'address': '10.0.1.10/24', 'assigned_object': interface, 'description': 'cliente'},
+            {'id': 2, 'address': '10.0.1.1/24', 'assigned_object': interface, 'is_gateway': True,
+             'gateway': '10.0.1.254'},
+            {'id': 3, 'address': '10.0.1.0/24', 'assigned_object': interface},     # endereço de rede
+            {'id': 4, 'address': '10.0.5.1/16', 'assigned_object': interface},     # bloco subdividido
+            {'id': 5, 'address': '10.0.1.11/24', 'interface': {'name': 'eth9', 'device': {'name': 'SW1'}}},
+            {'id': 6, 'address': '10.0.1.10/24', 'assigned_object': interface, 'description': 'alterado'},
+        ])
+        self.assertEqual((relatorio['linhas'], relatorio['criados'], len(relatorio['erros'])), (6, 2, 3))
+        self.assertEqual(EnderecoIP.objects.get(ip='10.0.1.10').finalidade, 'alterado')
+        self.assertEqual(EnderecoIP.objects.get(ip='10.0.1.10').porta_id, porta.pk)
+        bloco.refresh_from_db()
+        self.assertEqual((bloco.ips_usados, bloco.gateway_ip), (2, '10.0.1.1'))
+        self.assertEqual(set(relatorio['vinculos']), {1, 2, 6})
+        self.assertEqual(relatorio['criados_ids'], set(EnderecoIP.objects.values_list('id', flat=True)))
+
+
+class NetboxFalso(BaseHTTPRequestHandler):
+    """API paginada do NetBox: server.total objetos, server.falhas respostas 503 antes de responder."""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {chave: valores[0] for chave, valores in parse_qs(url.query).items()}
+        self.server.pedidos.append((url.path, params, self.headers.get('Authorization')))
+        if self.server.falhas:
+            self.server.falhas -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        total = self.server.total
+        self.server.total += self.server.crescer  # Objetos criados no NetBox durante a leitura
+        self.server.crescer = 0
+        offset, limit = int(params.get('offset', 0)), int(params.get('limit', 50))
+        resultados = [{'id': i} if params.get('brief') else {'id': i, 'name': f'obj{i}'}
+                      for i in range(offset + 1, min(offset + limit, total) + 1)]
+        proximo = None
+        if offset + limit < total:
+            proximo = f"http://{self.headers['Host']}{url.path}?{urlencode(dict(params, offset=offset + limit))}"
+
+        corpo = json.dumps({'count': total, 'next': proximo, 'results': resultados}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ClienteNetboxTests(SimpleTestCase):
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), NetboxFalso)
+        self.servidor.total, self.servidor.falhas, self.servidor.crescer, self.servidor.pedidos = 23, 0, 0, []
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.integracao = SimpleNamespace(url=f'http://127.0.0.1:{self.servidor.server_port}/api/', token='segredo')
+
+    def offsets(self):
+        return sorted(int(params.get('offset', 0)) for _, params, _ in self.servidor.pedidos)
+
+    def test_paginas_em_paralelo_por_offset(self):
+        with ClienteNetbox(self.integracao, tamanho_pagina=5, paralelismo=2) as cliente:
+            ids = [registro['id'] for registro in cliente.registros('dcim/devices', status='active')]
+            self.assertEqual(cliente.total, 23)
+        self.assertEqual(ids, list(range(1, 24)))
+        self.assertEqual(self.offsets(), [0, 5, 10, 15, 20])
+        for caminho, params, autorizacao in self.servidor.pedidos:
+            self.assertEqual((caminho, params['limit'], params['status']), ('/api/dcim/devices/', '5', 'active'))
+            self.assertEqual(autorizacao, 'Token segredo')
+
+    def test_brief_em_todas_as_paginas(self):
+        with ClienteNetbox(self.integracao, tamanho_pagina=10) as cliente:
+            registros = list(cliente.registros('ipam/prefixes', brief=1))
+            self.assertEqual(cliente.get('ipam/prefixes', limit=1, brief=1)['count'], 23)
+        self.assertEqual(registros, [{'id': i} for i in range(1, 24)])
+        self.assertTrue(all(params.get('brief') == '1' for _, params, _ in self.servidor.pedidos))
+
+    def test_segue_o_next_alem_do_total_inicial(self):
+        self.servidor.total, self.servidor.crescer = 10, 2
+        with ClienteNetbox(self.integracao, tamanho_pagina=5) as cliente:
+            ids = [registro['id'] for registro in cliente.registros('dcim/devices')]
+        self.assertEqual(ids, list(range(1, 13)))
+        self.assertEqual(self.offsets(), [0, 5, 10])
+
+    @mock.patch('urllib3.util.retry.time.sleep')  # Sem esperar o backoff
+    def test_novas_tentativas(self, espera):
+        self.servidor.falhas = 2
+        with ClienteNetbox(self.integracao) as cliente:
+            self.assertEqual(cliente.session.get_adapter('https://netbox').max_retries.total, 3)
+            self.assertEqual(cliente.get('dcim/devices')['count'], 23)
+        self.assertEqual(len(self.servidor.pedidos), 3)
+
+        self.servidor.falhas, self.servidor.pedidos = 5, []
+        with ClienteNetbox(self.integracao, tentativas=1) as cliente:
+            with self.assertRaises(requests.RequestException):
+                cliente.get('dcim/devices')
+        self.assertEqual(len(self.servidor.pedidos), 2)
+        self.assertTrue(espera.called)
+
+
+class NetboxEmMemoria:
+    """Substitui ClienteNetbox: um endpoint de dispositivos com os objetos {id: nome} informados."""
+
+    def __init__(self, nomes):
+        self.nomes = dict(nomes)
+        self.listagens = []
+        self.total = None
+
+    def __call__(self, integracao):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def get(self, caminho, **params):
+        ids = sorted(self.nomes, reverse=params.get('ordering') == '-id')
+        return {'count': len(ids), 'results': [{'id': netbox_id} for netbox_id in ids[:params.get('limit')]]}
+
+    def registros(self, caminho, **filtros):
+        self.listagens.append(filtros)
+        self.total = len(self.nomes)
+        for netbox_id in sorted(self.nomes):
+            yield {'id': netbox_id} if filtros.get('brief') else dispositivo_netbox(netbox_id, self.nomes[netbox_id])
+
+
+class ReconciliacaoNetboxTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.integracao = IntegracaoNetbox.objects.create(empresa=self.empresa, url='http://netbox.local/api/',
+                                                          token='t')
+        self.sw1 = criar_equipamento(self.empresa)
+        self.netbox = NetboxEmMemoria({1: 'SW1', 2: 'R1', 3: 'R2'})
+        cliente = mock.patch('appisp.netbox.ClienteNetbox', self.netbox)
+        cliente.start()
+        self.addCleanup(cliente.stop)
+
+    def sincronizar(self):
+        self.netbox.listagens = []
+        return sincronizar_netbox(self.integracao, endpoints=['dcim/devices'])['dcim/devices']
+
+    def baixou_os_ids(self):
+        return any(filtros.get('brief') for filtros in self.netbox.listagens)
+
+    def test_excluido_e_criado_entre_sincronizacoes(self):
+        relatorio = self.sincronizar()
+        self.assertEqual((relatorio['criados'], relatorio['removidos']), (2, 0))
+        sincronizacao = SincronizacaoNetbox.objects.get(integracao=self.integracao)
+        self.assertEqual((sincronizacao.total_remoto, sincronizacao.maior_id_remoto), (3, 3))
+
+        # Nada mudou no NetBox: a impressão confere e os ids não são baixados
+        self.assertEqual(self.sincronizar()['removidos'], 0)
+        self.assertFalse(self.baixou_os_ids())
+
+        # Um excluído e um criado: o total continua 3, mas o maior id mudou
+        del self.netbox.nomes[2]
+        self.netbox.nomes[4] = 'R3'
+        relatorio = self.sincronizar()
+        self.assertTrue(self.baixou_os_ids())
+        self.assertEqual((relatorio['criados'], relatorio['removidos']), (1, 1))
+        self.assertEqual(sorted(Equipamento.objects.values_list('nome', flat=True)), ['R2', 'R3', 'SW1'])
+
+    def test_registro_que_ja_existia_so_perde_o_vinculo(self):
+        self.sincronizar()
+        del self.netbox.nomes[1]
+        relatorio = self.sincronizar()
+        self.assertEqual((relatorio['removidos'], relatorio['desvinculados']), (0, 1))
+        self.assertTrue(Equipamento.objects.filter(pk=self.sw1.pk).exists())
+        self.assertFalse(VinculoNetbox.objects.filter(netbox_id=1).exists())
+
+
+class TarefasTests(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+
+    def executor(self, funcao):
+        return mock.patch.dict('appisp.tarefas.EXECUTORES', {'netbox': funcao})
+
+    def test_enfileirar_nao_duplica(self):
+        tarefa = enfileirar(self.empresa, 'netbox', integracao=1, endpoints=['dcim/devices'])
+        self.assertEqual(enfileirar(self.empresa, 'netbox', integracao=1, endpoints=['dcim/devices']), tarefa)
+        self.assertNotEqual(enfileirar(self.empresa, 'netbox', integracao=1, endpoints=['ipam/prefixes']), tarefa)
+        TarefaSincronizacao.objects.filter(pk=tarefa.pk).update(status='concluida')
+        self.assertNotEqual(enfileirar(self.empresa, 'netbox', integracao=1, endpoints=['dcim/devices']), tarefa)
+
+    def test_reservar_a_mais_antiga(self):
+        primeira = enfileirar(self.empresa, 'netbox', integracao=1)
+        segunda = enfileirar(self.empresa, 'netbox', integracao=2)
+        TarefaSincronizacao.objects.filter(pk=segunda.pk).update(criado_em=primeira.criado_em - timedelta(minutes=1))
+
+        reservada = reservar_proxima('w1')
+        self.assertEqual((reservada.pk, reservada.status, reservada.worker, reservada.tentativas),
+                         (segunda.pk, 'executando', 'w1', 1))
+        self.assertEqual(reservar_proxima('w2').pk, primeira.pk)
+        self.assertIsNone(reservar_proxima('w3'))
+
+    def test_executar_conclui_ou_falha(self):
+        enfileirar(self.empresa, 'netbox', integracao=1)
+        with self.executor(lambda tarefa, progresso: {'criados': 2}):
+            tarefa = executar(reservar_proxima('w1'))
+        self.assertEqual((tarefa.status, tarefa.resultado, tarefa.erro), ('concluida', {'criados': 2}, ''))
+        self.assertIsNotNone(tarefa.finalizado_em)
+
+        enfileirar(self.empresa, 'netbox', integracao=1)
+        with self.executor(lambda tarefa, progresso: 1 / 0):
+            tarefa = executar(reservar_proxima('w1'))
+        self.assertEqual(tarefa.status, 'falhou')
+        self.assertIn('ZeroDivisionError', tarefa.erro)
+
+    def test_cancelar(self):
+        pendente = enfileirar(self.empresa, 'netbox', integracao=1)
+        self.assertTrue(cancelar(pendente))
+        pendente.refresh_from_db()
+        self.assertEqual(pendente.status, 'cancelada')
+        self.assertFalse(cancelar(pendente))  # Já finalizada
+
+        def trabalho(tarefa, progresso):
+            cancelar(tarefa)  # Pedido feito pelo admin durante a execução
+            progresso(1, 10, 'lendo')
+            return {}
+
+        enfileirar(self.empresa, 'netbox', integracao=2)
+        with self.executor(trabalho), mock.patch('appisp.tarefas.INTERVALO_PROGRESSO', 0):
+            tarefa = executar(reservar_proxima('w1'))
+        self.assertEqual((tarefa.status, tarefa.processados, tarefa.etapa), ('cancelada', 1, 'lendo'))
+
+    def test_reenfileirar(self):
+        tarefa = enfileirar(self.empresa, 'netbox', integracao=1)
+        TarefaSincronizacao.objects.filter(pk=tarefa.pk).update(status='falhou', erro='x', processados=5, worker='w1')
+        self.assertTrue(reenfileirar(tarefa))
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.erro, tarefa.processados, tarefa.worker), ('pendente', '', 0, ''))
+        self.assertFalse(reenfileirar(tarefa))  # Só falhas e canceladas voltam para a fila
+
+    def test_abandonada_nao_e_sobrescrita_pelo_worker(self):
+        enfileirar(self.empresa, 'netbox', integracao=1)
+        ociosa = enfileirar(self.empresa, 'netbox', integracao=2)
+        TarefaSincronizacao.objects.filter(pk=ociosa.pk).update(status='executando')
+
+        def trabalho(tarefa, progresso):
+            # O worker ficou parado além do tempo de abandono e outro processo recolheu as tarefas
+            with mock.patch('appisp.tarefas.TEMPO_ABANDONO', timedelta(seconds=-1)):
+                self.assertEqual(liberar_abandonadas(), 2)
+            return {'criados': 1}
+
+        with self.executor(trabalho):
+            tarefa = executar(reservar_proxima('w1'))
+        self.assertEqual((tarefa.status, tarefa.erro), ('falhou', 'Worker interrompido durante a execução.'))
+        self.assertEqual(tarefa.resultado, {})
+
+
+class ZabbixFalso:
+    """
+    API JSON-RPC do Zabbix em memória, no lugar de ClienteZabbix._post. O user.login gera um token novo e
+    invalida os anteriores; `expirar()` simula o fim da sessão. Respostas em lote voltam fora de ordem.
+    """
+
+    def __init__(self, hosts=(), itens=()):
+        self.hosts = list(hosts)
+        self.itens = list(itens)
+        self.chamadas = []
+        self.requisicoes = 0
+        self.logins = 0
+        self.token_valido = None
+
+    def expirar(self):
+        self.token_valido = None
+
+    def __call__(self, cliente, payload):
+        self.requisicoes += 1
+        if isinstance(payload, list):
+            return [self.responder(chamada) for chamada in reversed(payload)]
+        return self.responder(payload)
+
+    def responder(self, chamada):
+        metodo, params = chamada['method'], chamada['params']
+        self.chamadas.append((metodo, params, chamada.get('auth')))
+        resposta = {'jsonrpc': '2.0', 'id': chamada['id']}
+        if metodo == 'user.login':
+            self.logins += 1
+            self.token_valido = f'sessao{self.logins}'
+            return dict(resposta, result=self.token_valido)
+        if chamada.get('auth') not in (self.token_valido, 'token-api'):
+            return dict(resposta, error={'code': -32602, 'message': 'Invalid params.',
+                                         'data': 'Session terminated, re-login, please.'})
+        if metodo == 'host.get':
+            return dict(resposta, result=self.hosts)
+        if metodo == 'item.get':
+            hostids = params.get('hostids')
+            return dict(resposta, result=[item for item in self.itens if hostids is None or item['hostid'] in hostids])
+        return dict(resposta, error={'code': -32601, 'message': 'Method not found.', 'data': metodo})
+
+    def metodos(self):
+        return [metodo for metodo, _, _ in self.chamadas]
+
+
+class ZabbixTestCase(TestCase):
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.integracao = IntegracaoZabbix.objects.create(
+            empresa=self.empresa, url='http://zabbix.local/api_jsonrpc.php', usuario='api', senha='senha')
+        self.zabbix = ZabbixFalso()
+        for alvo in (mock.patch.object(ClienteZabbix, '_post', autospec=True, side_effect=self.zabbix),
+                     mock.patch.dict('appisp.zabbix._tokens', clear=True)):
+            alvo.start()
+            self.addCleanup(alvo.stop)
+
+
+def item_zabbix(hostid, chave, nome):
+    return {'hostid': hostid, 'key_': chave, 'name': nome}
+
+
+class SincronizarPortasZabbixTests(ZabbixTestCase):
+    def test_consulta_os_itens_em_lotes_de_hosts(self):
+        sw1 = criar_equipamento(self.empresa, 'SW1')
+        criar_equipamento(self.empresa, 'SW2')
+        criar_equipamento(self.empresa, 'SW3')
+        existente = Porta.objects.create(nome='sfp1', equipamento=sw1, empresa=self.empresa, tipo='Cobre',
+                                         speed='10G', observacao='')
+        self.zabbix.hosts = [{'hostid': '10', 'host': 'SW1'}, {'hostid': '11', 'host': 'SW2'},
+                             {'hostid': '12', 'host': 'SW3'}, {'hostid': '13', 'host': 'Sem cadastro'}]
+        self.zabbix.itens = [
+            item_zabbix('10', 'net.if.type[sfp1]', 'Interface sfp1(uplink): Interface type'),
+            item_zabbix('10', 'net.if.in[sfp1]', 'Interface sfp1(uplink): Bits received'),
+            item_zabbix('10', 'net.if.out[sfp1]', 'Interface sfp1(uplink): Bits sent'),
+            item_zabbix('11', 'net.if.in[ethernet2]', 'Interface ethernet2: Bits received'),
+            item_zabbix('11', 'net.if.in[bridge1]', 'Interface bridge1: Bits received'),  # Fora das palavras-chave
+            item_zabbix('12', 'net.if.speed[sfp-sfpplus1]', 'Interface sfp-sfpplus1: Speed'),
+            item_zabbix('13', 'net.if.in[sfp9]', 'Interface sfp9: Bits received'),
+        ]
+        progresso = mock.Mock()
+
+        relatorio = sincronizar_portas_zabbix(self.integracao, progresso, hosts_por_consulta=2)
+        self.assertEqual(relatorio, {'hosts': 4, 'criados': 2, 'atualizados': 1, 'erros': []})
+        consultas = [params for metodo, params, _ in self.zabbix.chamadas if metodo == 'item.get']
+        self.assertEqual(sorted(sorted(params['hostids']) for params in consultas), [['10', '11'], ['12']])
+        self.assertTrue(all(params['search'] == {'key_': ['net.if.type', 'net.if.in', 'net.if.out', 'net.if.speed']}
+                            for params in consultas))
+        self.assertEqual(progresso.call_args_list, [mock.call(2, 3, 'Portas'), mock.call(3, 3, 'Portas')])
+
+        self.assertEqual(sorted(Porta.objects.values_list('equipamento__nome', 'nome')),
+                         [('SW1', 'sfp1'), ('SW2', 'ethernet2'), ('SW3', 'sfp-sfpplus1')])
+        existente.refresh_from_db()
+        self.assertEqual((existente.tipo, existente.speed, existente.observacao),
+                         ('Fibra', '1G', 'Importado do Zabbix'))
+
+        # Sem mudanças, nada é regravado
+        self.assertEqual(sincronizar_portas_zabbix(self.integracao, hosts_por_consulta=2),
+                         {'hosts': 4, 'criados': 0, 'atualizados': 0, 'erros': []})
+
+
+class ClienteZabbixTests(ZabbixTestCase):
+    def test_token_de_sessao_reaproveitado_e_renovado(self):
+        with ClienteZabbix(self.integracao) as cliente:
+            cliente.chamar('host.get', {})
+        with ClienteZabbix(self.integracao) as cliente:
+            cliente.chamar('host.get', {})
+            self.assertEqual(self.zabbix.logins, 1)  # Cache por integração
+
+            self.zabbix.expirar()
+            self.assertEqual(cliente.chamar('host.get', {}), [])
+        self.assertEqual(self.zabbix.logins, 2)
+        self.assertEqual([auth for metodo, _, auth in self.zabbix.chamadas if metodo == 'host.get'],
+                         ['sessao1', 'sessao1', 'sessao1', 'sessao2'])
+
+    def test_token_de_api_nao_faz_login(self):
+        self.integracao.token = 'token-api'
+        with ClienteZabbix(self.integracao) as cliente:
+            self.assertEqual(cliente.chamar('host.get', {}), [])
+            with self.assertRaises(ErroZabbix) as erro:
+                cliente.chamar('host.delete', [])
+        self.assertFalse(erro.exception.sessao_expirada)
+        self.assertEqual(self.zabbix.logins, 0)
+
+    def test_lote_em_uma_requisicao(self):
+        self.zabbix.hosts = [{'hostid': '1'}]
+        self.zabbix.itens = [{'hostid': '1', 'lastvalue': '1'}]
+        with ClienteZabbix(self.integracao) as cliente:
+            cliente.token()
+            self.zabbix.expirar()
+            requisicoes = self.zabbix.requisicoes
+            hosts, itens = cliente.lote([('host.get', {}), ('item.get', {})])
+            self.assertEqual(cliente.lote([]), [])
+        # As respostas vieram fora de ordem e com a sessão expirada: novo login e o lote refeito uma vez
+        self.assertEqual((hosts, itens), (self.zabbix.hosts, self.zabbix.itens))
+        self.assertEqual(self.zabbix.requisicoes - requisicoes, 3)
+        self.assertEqual(self.zabbix.logins, 2)
+
+    def test_mapear_mantem_a_ordem(self):
+        self.zabbix.itens = [{'hostid': str(i)} for i in range(10)]
+        with ClienteZabbix(self.integracao, paralelismo=4) as cliente:
+            resultados = list(cliente.mapear('item.get', [{'hostids': [str(i)]} for i in range(10)]))
+            retry = cliente.session.get_adapter('http://zabbix.local').max_retries
+        self.assertEqual(resultados, [[{'hostid': str(i)}] for i in range(10)])
+        self.assertEqual(self.zabbix.logins, 1)
+        # Só falhas de conexão são repetidas: host.create e afins não são idempotentes
+        self.assertEqual((retry.connect, retry.read, retry.status), (3, 0, 0))
+
+
+def host_zabbix(hostid, nome, *ips, **extra):
+    return dict({'hostid': hostid, 'host': nome, 'name': nome, 'interfaces': [{'ip': ip} for ip in ips]}, **extra)
+
+
+class SincronizarEquipamentosZabbixTests(ZabbixTestCase):
+    def setUp(self):
+        super().setUp()
+        criar_equipamento(self.empresa, 'SW1')  # 192.0.2.1
+        antigo = criar_equipamento(self.empresa, 'BGP-ANTIGO')
+        Equipamento.objects.filter(pk=antigo.pk).update(ip='192.0.2.9', observacao='Importado do Zabbix')
+        self.zabbix.hosts = [
+            host_zabbix('1', 'sw_core', '192.0.2.1'),
+            host_zabbix('2', 'BRAS-01', '192.0.2.20'),
+            host_zabbix('3', 'BRAS-01 reserva', '192.0.2.20'),
+            host_zabbix('4', 'impressora', '192.0.2.30'),
+        ]
+
+    def test_simulacao_so_calcula_a_diferenca(self):
+        relatorio = sincronizar_equipamentos_zabbix(self.integracao, simular=True)
+        self.assertEqual((relatorio['hosts'], relatorio['ignorados'], relatorio['criados']), (4, 1, 0))
+        self.assertEqual(relatorio['novos'], [{'ip': '192.0.2.20', 'nome': 'BRAS-01'}])
+        self.assertEqual(relatorio['alterados'], [{'ip': '192.0.2.1', 'nome': 'SW1', 'nome_zabbix': 'sw_core'}])
+        self.assertEqual(relatorio['ausentes'], [{'ip': '192.0.2.9', 'nome': 'BGP-ANTIGO'}])
+        self.assertEqual(Equipamento.objects.count(), 2)
+
+    def test_grava_os_novos(self):
+        progresso = mock.Mock()
+        relatorio = sincronizar_equipamentos_zabbix(self.integracao, progresso)
+        self.assertEqual((relatorio['criados'], relatorio['erros']), (1, []))
+        novo = Equipamento.objects.get(ip='192.0.2.20')
+        self.assertEqual((novo.nome, novo.observacao), ('BRAS-01', 'Importado do Zabbix'))
+        progresso.assert_called_once_with(1, 1, 'Equipamentos')
+        self.assertEqual(sincronizar_equipamentos_zabbix(self.integracao)['novos'], [])
+
+
+def icmpping(hostid, valor, lastclock='1792324800', state='0'):
+    return {'hostid': hostid, 'lastvalue': valor, 'lastclock': lastclock, 'state': state}
+
+
+class DisponibilidadeZabbixTests(SimpleTestCase):
+    def test_item_icmpping(self):
+        host = {'interfaces': [{'available': '2'}]}
+        self.assertEqual(_disponibilidade(host, icmpping('1', '1')), 'Ativo')
+        self.assertEqual(_disponibilidade({}, icmpping('1', '0')), 'Inativo')
+
+    def test_item_sem_dado_nao_vira_inativo(self):
+        self.assertIsNone(_disponibilidade({}, icmpping('1', '0', lastclock='0')))  # Nunca coletado
+        self.assertIsNone(_disponibilidade({}, icmpping('1', '', lastclock=None)))
+        self.assertIsNone(_disponibilidade({}, icmpping('1', 'x')))
+        # Item sem suporte: vale a disponibilidade das interfaces
+        self.assertEqual(_disponibilidade({'interfaces': [{'available': '1'}]}, icmpping('1', '0', state='1')), 'Ativo')
+
+    def test_sem_item(self):
+        self.assertEqual(_disponibilidade({'interfaces': [{'available': '2'}, {'available': '0'}]}, None), 'Inativo')
+        self.assertEqual(_disponibilidade({'available': '1', 'interfaces': []}, None), 'Ativo')
+        self.assertIsNone(_disponibilidade({'interfaces': [{'available': '0'}]}, None))
+
+
+class IngerirStatusZabbixTests(ZabbixTestCase):
+    def test_atualiza_so_o_que_mudou(self):
+        sw1, sw2, sw3 = (criar_equipamento(self.empresa, nome) for nome in ('SW1', 'SW2', 'SW3'))
+        Equipamento.objects.filter(pk=sw2.pk).update(ip='192.0.2.2')
+        Equipamento.objects.filter(pk=sw3.pk).update(ip='192.0.2.3')
+        self.zabbix.hosts = [
+            host_zabbix('1', 'sw1-zabbix', '192.0.2.1'),
+            host_zabbix('2', 'SW2', '10.9.9.9'),     # Sem IP correspondente: ligado pelo nome
+            host_zabbix('3', 'SW3', '192.0.2.3'),
+        ]
+        self.zabbix.itens = [icmpping('1', '1'), icmpping('2', '0'), icmpping('3', '0', lastclock='0')]
+
+        relatorio = ingerir_status_zabbix(self.integracao)
+        self.assertEqual(relatorio, {'hosts': 3, 'equipamentos': 2, 'alterados': 1, 'online': 1, 'offline': 1,
+                                     'desconhecidos': 1})
+        self.assertEqual(self.zabbix.metodos(), ['user.login', 'item.get', 'host.get'])  # Um único lote
+        [item_get] = [params for metodo, params, _ in self.zabbix.chamadas if metodo == 'item.get']
+        self.assertEqual(item_get['output'], ['hostid', 'lastvalue', 'lastclock', 'state'])
+
+        self.assertEqual(dict(Equipamento.objects.values_list('nome', 'status')),
+                         {'SW1': 'Ativo', 'SW2': 'Inativo', 'SW3': 'Ativo'})
+        self.assertEqual(list(HistoricoStatus.objects.values_list('equipamento__nome', 'status', 'origem')),
+                         [('SW2', 'Inativo', 'zabbix')])
+        self.assertIsNone(Equipamento.objects.get(pk=sw3.pk).ultima_verificacao)
+
+        self.assertEqual(ingerir_status_zabbix(self.integracao)['alterados'], 0)
+        self.assertEqual(HistoricoStatus.objects.count(), 1)
+
+
+def icmp_disponivel():
+    async def abrir():
+        SocketICMP(4).fechar()
+    try:
+        asyncio.run(abrir())
+    except OSError:
+        return False
+    return True
+
+
+class ICMPFalso:
+    """SocketICMP que devolve os RTTs informados, em sequência, sem tocar na rede."""
+    rtts = []
+
+    def __init__(self, versao=4):
+        self.versao = versao
+
+    def fechar(self):
+        pass
+
+    async def echo(self, ip, timeout):
+        return ICMPFalso.rtts.pop(0) if ICMPFalso.rtts else None
+
+
+class SondaTests(SimpleTestCase):
+    def porta_livre(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def test_resultado(self):
+        self.assertEqual(_resultado('10.0.0.1', 'icmp', [10, None, 20, None]),
+                         {'ip': '10.0.0.1', 'status': 'online', 'metodo': 'icmp', 'rtt': 15.0, 'perda': 50})
+        self.assertEqual(_resultado('10.0.0.1', 'tcp', [None])['status'], 'offline')
+        self.assertEqual(_resultado('x', None, []), {'ip': 'x', 'status': 'offline', 'metodo': None, 'rtt': None,
+                                                     'perda': 100})
+
+    def test_checksum(self):
+        cabecalho = struct.pack('!BBHHH', 8, 0, 0, 1, 1) + b'ispdoc'
+        pacote = struct.pack('!BBHHH', 8, 0, _checksum(cabecalho), 1, 1) + b'ispdoc'
+        self.assertEqual(_checksum(pacote), 0)
+        self.assertEqual(_checksum(b'\x01'), _checksum(b'\x01\x00'))  # Tamanho ímpar completado com zero
+
+    @mock.patch('appisp.sondagem.SocketICMP', ICMPFalso)
+    def test_icmp_com_perda_e_fallback_tcp(self):
+        servidor = socket.socket()
+        servidor.bind(('127.0.0.1', 0))
+        servidor.listen()
+        self.addCleanup(servidor.close)
+        porta = servidor.getsockname()[1]
+
+        ICMPFalso.rtts = [1.0, None, 3.0]
+        [resultado] = sondar([('127.0.0.1', porta)], contagem=3, intervalo=0)
+        self.assertEqual((resultado['metodo'], resultado['rtt'], resultado['perda']), ('icmp', 2.0, 33))
+
+        # Sem resposta ao echo: a porta de gerência decide (conexão aceita ou recusada prova que o host responde)
+        ICMPFalso.rtts = []
+        resultados = sondar([('127.0.0.1', porta), ('127.0.0.1', self.porta_livre()), ('127.0.0.1', None),
+                             ('ip-invalido', 22)], timeout=0.5)
+        self.assertEqual([(r['status'], r['metodo']) for r in resultados],
+                         [('online', 'tcp'), ('online', 'tcp'), ('offline', 'icmp'), ('offline', None)])
+        self.assertEqual(resultados[3]['ip'], 'ip-invalido')
+
+    def test_sem_socket_icmp_usa_tcp(self):
+        with mock.patch('appisp.sondagem.SocketICMP', side_effect=OSError):
+            resultados = sondar([('127.0.0.1', self.porta_livre()), ('127.0.0.1', None)], timeout=0.5)
+        self.assertEqual([(r['status'], r['metodo']) for r in resultados], [('online', 'tcp'), ('offline', None)])
+
+    @skipUnless(icmp_disponivel(), 'sem permissão para socket ICMP')
+    def test_echo_no_loopback(self):
+        resultados = sondar([('127.0.0.1', None), ('::1', None)], timeout=1)
+        self.assertEqual(resultados[0]['metodo'], 'icmp')
+        self.assertEqual(resultados[0]['status'], 'online')
+        if resultados[1]['metodo'] == 'icmp':  # Ambiente sem IPv6 cai fora do ICMPv6
+            self.assertEqual(resultados[1]['status'], 'online')
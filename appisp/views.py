@@ -1,22 +1,23 @@
+from datetime import timedelta
 from ipaddress import ip_network
 
 import json
-import requests
 from django import forms
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from dal import autocomplete
-import platform
 from django.contrib import messages
 from django.db import transaction
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.template.response import TemplateResponse
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from rest_framework.authentication import TokenAuthentication
 from django.db.models import Prefetch
-from concurrent.futures import ThreadPoolExecutor
-import subprocess
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
@@ -31,6 +32,12 @@ from rest_framework.permissions import BasePermission
 import json
 from rest_framework.response import Response
 from .serializers import EquipamentoSerializer, BlocoIPSerializer, EmpresaSerializer
+from .ipam import (janela_ips, exportar_subarvore, relatorio_utilizacao, planejar_vlsm, subdividir_bloco,
+                   JANELA_PADRAO, CAMPOS_IP_SUBARVORE)
+from .prefixos import blocos_dos_ips
+from .monitoramento import disponibilidade, gravar_sondagem, gravar_status
+from .sondagem import sondar_equipamentos
+from .zabbix import ClienteZabbix, ErroZabbix
 
 
 @api_view(['GET'])
@@ -70,6 +77,131 @@ def listar_blocos_ip_api(request):
         return Response({"error": "Token inválido."}, status=status.HTTP_403_FORBIDDEN)
 
 
+MAX_IPS_POR_BUSCA = 10000
+
+
+@api_view(['GET', 'POST'])
+def buscar_blocos_por_ip(request):
+    """
+    Retorna o bloco mais específico da empresa do token que contém cada IP.
+    GET ?ip=10.0.0.1&ip=10.0.0.2 (ou separados por vírgula) ou POST {"ips": [...]} para lotes grandes.
+    """
+    empresa = request.user if isinstance(request.user, Empresa) else None
+    if empresa is None:
+        return Response({"error": "Token de autenticação não fornecido."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    if request.method == 'POST':
+        ips = request.data.get('ips') or []
+        if not isinstance(ips, list):
+            return Response({"error": "O campo 'ips' deve ser uma lista."}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        ips = [ip for valor in request.query_params.getlist('ip') for ip in valor.split(',') if ip.strip()]
+
+    if not ips:
+        return Response({"error": "Informe ao menos um IP."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ips) > MAX_IPS_POR_BUSCA:
+        return Response({"error": f"Máximo de {MAX_IPS_POR_BUSCA} IPs por consulta."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({"resultados": blocos_dos_ips(empresa.id, ips)})
+
+
+@api_view(['GET'])
+def relatorio_utilizacao_api(request):
+    """
+    Relatório de utilização consolidada dos blocos da empresa do token.
+    Parâmetros: ?top=N (blocos mais cheios/fragmentados, padrão 10) e ?dias=N (tendência, padrão 30).
+    """
+    empresa = request.user if isinstance(request.user, Empresa) else None
+    if empresa is None:
+        return Response({"error": "Token de autenticação não fornecido."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        top = min(max(int(request.query_params.get('top', 10)), 1), 100)
+        dias = min(max(int(request.query_params.get('dias', 30)), 1), 366)
+    except ValueError:
+        return Response({"error": "Parâmetros 'top' e 'dias' devem ser inteiros."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(relatorio_utilizacao(empresa, top=top, dias=dias))
+
+
+@api_view(['POST'])
+def planejar_vlsm_api(request, bloco_id):
+    """
+    Planeja sub-redes para {"hosts": [60, 60, 2, ...]} no espaço livre do bloco.
+    Sem "confirmar" devolve só a prévia; com "confirmar": true grava o mesmo plano em lote.
+    """
+    empresa = request.user if isinstance(request.user, Empresa) else None
+    if empresa is None:
+        return Response({"error": "Token de autenticação não fornecido."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    bloco = BlocoIP.objects.filter(pk=bloco_id, empresa=empresa).first()
+    if bloco is None:
+        return Response({"error": "Bloco não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+    hosts = request.data.get('hosts')
+    if not isinstance(hosts, list) or not hosts or not all(isinstance(item, int) for item in hosts):
+        return Response({"error": "O campo 'hosts' deve ser uma lista de inteiros."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        plano = planejar_vlsm(bloco, hosts)
+        if request.data.get('confirmar'):
+            plano['arvore'] = subdividir_bloco(bloco, prefixos=plano['prefixos'])
+    except ValidationError as e:
+        return Response({"error": '; '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(plano, status=status.HTTP_201_CREATED if 'arvore' in plano else status.HTTP_200_OK)
+
+
+MAX_HORAS_DISPONIBILIDADE = 24 * 366
+
+
+@api_view(['GET'])
+def disponibilidade_api(request):
+    """
+    Disponibilidade (%) e RTT médio dos equipamentos da empresa do token numa janela.
+    Parâmetros: ?horas=N (janela até agora, padrão 24) ou ?inicio=...&fim=... (ISO 8601) e
+    ?agrupar=equipamento|pop (padrão equipamento).
+    """
+    empresa = request.user if isinstance(request.user, Empresa) else None
+    if empresa is None:
+        return Response({"error": "Token de autenticação não fornecido."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    agrupar = request.query_params.get('agrupar', 'equipamento')
+    if agrupar not in ('equipamento', 'pop'):
+        return Response({"error": "O parâmetro 'agrupar' deve ser 'equipamento' ou 'pop'."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        horas = min(max(int(request.query_params.get('horas', 24)), 1), MAX_HORAS_DISPONIBILIDADE)
+    except ValueError:
+        return Response({"error": "O parâmetro 'horas' deve ser inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+    fim = timezone.now()
+    inicio = fim - timedelta(hours=horas)
+    for nome in ('inicio', 'fim'):
+        if request.query_params.get(nome):
+            try:
+                valor = parse_datetime(request.query_params[nome])
+            except ValueError:  # Formato certo com data impossível, ex.: 2026-13-01
+                valor = None
+            if valor is None:
+                return Response({"error": f"O parâmetro '{nome}' deve estar no formato ISO 8601."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(valor):
+                valor = timezone.make_aware(valor)
+            if nome == 'inicio':
+                inicio = valor
+            else:
+                fim = valor
+    if inicio >= fim:
+        return Response({"error": "O início da janela deve ser anterior ao fim."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(disponibilidade(empresa, inicio, fim, agrupar))
+
+
 def get_equipamento(request, equipamento_id):
     try:
         equipamento = Equipamento.objects.get(id=equipamento_id)
@@ -90,49 +222,17 @@ def get_equipamento(request, equipamento_id):
         return JsonResponse({'error': 'Equipamento não encontrado'}, status=404)
 
 
-def ping(ip):
-    try:
-        # Verifica o sistema operacional
-        if platform.system().lower() == "windows":
-            response = subprocess.run(
-                ["ping", "-n", "1", ip],  # Windows
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=2
-            )
-        else:
-            response = subprocess.run(
-                ["ping", "-c", "1", ip],  # Linux
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=2
-            )
-
-        return {"ip": ip, "status": "online" if response.returncode == 0 else "offline"}
-    except Exception as e:
-        print(f"Error pinging {ip}: {e}")
-        return {"ip": ip, "status": "offline"}
-
-
 def verificar_status_equipamentos(request):
     # Obtemos todos os equipamentos
-    equipamentos = Equipamento.objects.all()
+    equipamentos = list(Equipamento.objects.only('id', 'ip', 'porta', 'status'))
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # Realizamos o ping para cada equipamento
-        resultados = list(executor.map(ping, [equipamento.ip for equipamento in equipamentos]))
+    # Sondagem concorrente (ICMP, com fallback TCP na porta de gerência) em vez de um processo ping por IP
+    resultados = sondar_equipamentos(equipamentos)
 
-    # Atualizamos o status dos equipamentos com base no ping
-    for equipamento, resultado in zip(equipamentos, resultados):
-        if resultado["status"] == "online":
-            equipamento.status = "Ativo"
-        else:
-            equipamento.status = "Inativo"
-        equipamento.save()  # Salva a alteração no banco de dados
+    # Grava só as mudanças de status (e o histórico delas)
+    gravar_sondagem(equipamentos, resultados)
 
-    return JsonResponse(resultados, safe=False)
+    return JsonResponse([resultados[equipamento.pk] for equipamento in equipamentos], safe=False)
 
 
 def adicionar_endereco_ip(request):
@@ -212,6 +312,63 @@ def atualizar_status_equipamento(request, equipamento_id):
         return JsonResponse({"error": "Equipamento não encontrado"}, status=404)
 
 
+MAX_STATUS_POR_LOTE = 10000
+
+
+@api_view(['POST'])
+def atualizar_status_lote(request):
+    """
+    Atualiza o status de vários equipamentos da empresa do token numa chamada:
+    {"equipamentos": [{"id": 1, "status": "Ativo"}, ...]}. Os IDs são validados numa única consulta e as
+    mudanças gravadas num bulk_update (com histórico). Devolve o resultado de cada item.
+    """
+    empresa = request.user if isinstance(request.user, Empresa) else None
+    if empresa is None:
+        return Response({"error": "Token de autenticação não fornecido."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    itens = request.data.get('equipamentos') if isinstance(request.data, dict) else request.data
+    if not isinstance(itens, list) or not itens:
+        return Response({"error": "O campo 'equipamentos' deve ser uma lista não vazia de {id, status}."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(itens) > MAX_STATUS_POR_LOTE:
+        return Response({"error": f"Máximo de {MAX_STATUS_POR_LOTE} equipamentos por chamada."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    status_validos = {valor for valor, _ in Equipamento._meta.get_field('status').choices}
+    resultados = [None] * len(itens)
+    novos_status = {}
+    for posicao, item in enumerate(itens):
+        equipamento_id = item.get('id') if isinstance(item, dict) else None
+        novo_status = item.get('status') if isinstance(item, dict) else None
+        if not isinstance(equipamento_id, int) or isinstance(equipamento_id, bool):
+            resultados[posicao] = {"id": equipamento_id, "resultado": "invalido", "error": "ID inválido."}
+        elif novo_status not in status_validos:
+            resultados[posicao] = {"id": equipamento_id, "resultado": "invalido",
+                                   "error": f"Status deve ser um de: {', '.join(sorted(status_validos))}."}
+        else:
+            # Com o mesmo ID repetido, vale o último
+            novos_status[equipamento_id] = novo_status
+
+    equipamentos = list(Equipamento.objects.filter(empresa=empresa, id__in=novos_status).only('id', 'status'))
+    status_anterior = {equipamento.pk: equipamento.status for equipamento in equipamentos}
+    alterados = {equipamento.pk for equipamento in gravar_status(equipamentos, novos_status, 'api')}
+
+    for posicao, item in enumerate(itens):
+        if resultados[posicao] is not None:
+            continue
+        equipamento_id = item['id']
+        if equipamento_id not in status_anterior:
+            resultados[posicao] = {"id": equipamento_id, "resultado": "nao_encontrado",
+                                   "error": "Equipamento não encontrado."}
+        else:
+            resultados[posicao] = {"id": equipamento_id,
+                                   "resultado": "atualizado" if equipamento_id in alterados else "inalterado",
+                                   "status_anterior": status_anterior[equipamento_id],
+                                   "novo_status": novos_status[equipamento_id]}
+
+    return Response({"atualizados": len(alterados), "resultados": resultados})
+
+
 @api_view(['GET'])
 def obter_dados_empresa(request):
     """
@@ -942,39 +1099,27 @@ def get_sub_blocos(request, bloco_id):
     return JsonResponse({'sub_blocos': list(sub_blocos)})
 
 
+@login_required(login_url='/admin/login/')
 def visualizar_ips_do_bloco(request, bloco_id):
-    bloco = get_object_or_404(BlocoIP, id=bloco_id)
-    rede = ip_network(bloco.bloco_cidr, strict=False)
-    enderecos_existentes = EnderecoIP.objects.filter(bloco=bloco).values_list('ip', flat=True)
-    lista_ips = []
-
-    for ip in rede:
-        info = {'ip': str(ip)}
-        if ip == rede.network_address:
-            info['tipo'] = 'IP de rede'
-        elif ip == rede.broadcast_address:
-            info['tipo'] = 'IP de broadcast'
-        elif str(ip) in enderecos_existentes:
-            endereco = EnderecoIP.objects.get(bloco=bloco, ip=str(ip))
-            info['tipo'] = 'Cadastrado'
-            info['equipamento'] = endereco.equipamento.nome
-            info['porta'] = endereco.porta
-            info['finalidade'] = endereco.finalidade
-            info['next_hop'] = endereco.next_hop
-            info['is_gateway'] = endereco.is_gateway
-        else:
-            info['tipo'] = 'Livre'
-        lista_ips.append(info)
+    """
+    Retorna em JSON uma janela de IPs do bloco (?offset=&limit= sobre os endereços inteiros),
+    com os cadastrados detalhados e o espaço livre resumido em faixas. Só blocos das empresas do usuário.
+    """
+    blocos = BlocoIP.objects.all()
+    if not request.user.is_superuser:
+        blocos = blocos.filter(empresa__in=request.user.empresas.all())
+    bloco = get_object_or_404(blocos, id=bloco_id)
 
-    # 👇 Aqui criamos o dicionário "context"
-    context = {
-        'bloco': bloco,
-        'lista_ips': lista_ips,
-        'pode_adicionar_ip': not bloco.sub_blocos.exists(),
-    }
+    try:
+        offset = int(request.GET.get('offset', 0))
+        limit = int(request.GET.get('limit', JANELA_PADRAO))
+    except ValueError:
+        return JsonResponse({'error': 'offset e limit devem ser inteiros.'}, status=400)
+
+    dados = janela_ips(bloco, offset=offset, limit=limit)
+    dados['pode_adicionar_ip'] = not bloco.sub_blocos.exists()
 
-    # 👇 Passa esse context para o render
-    return render(request, 'admin/visualizar_ips_modal.html', context)
+    return JsonResponse(dados)
 
 
 @login_required
@@ -1071,87 +1216,75 @@ def listar_ips_por_bloco(request, bloco_id):
 def dados_hierarquicos(request, bloco_id):
     try:
         bloco = BlocoIP.objects.get(id=bloco_id)
-        sub_blocos = BlocoIP.objects.filter(parent=bloco)
-
-        dados = {
-            'bloco': bloco.bloco_cidr,
-            'sub_blocos': []
-        }
-
-        for sub_bloco in sub_blocos:
+    except BlocoIP.DoesNotExist:
+        return JsonResponse({'error': 'Bloco não encontrado'}, status=404)
 
-            ips = EnderecoIP.objects.filter(bloco=sub_bloco).values(
-                "id", "ip", "equipamento__nome", "porta__nome",
-                "next_hop", "is_gateway", 'finalidade'
-            )
+    # Apenas o primeiro nível de sub-blocos, com os IPs de cada um
+    arvore = exportar_subarvore(bloco, profundidade_maxima=1)
 
-            sub_dados = {
-                'sub_bloco': sub_bloco.bloco_cidr,
-                'descricao': sub_bloco.descricao or 'N/A',
-                'equipamento': sub_bloco.equipamento.nome if sub_bloco.equipamento else 'N/A',
-                'ips': list(ips)
+    dados = {
+        'bloco': bloco.bloco_cidr,
+        'sub_blocos': [
+            {
+                'sub_bloco': sub_bloco['bloco'],
+                'descricao': sub_bloco['descricao'] or 'N/A',
+                'equipamento': sub_bloco['equipamento'] or 'N/A',
+                'ips': sub_bloco['ips'],
             }
+            for sub_bloco in arvore['sub_blocos']
+        ]
+    }
 
-            dados['sub_blocos'].append(sub_dados)
-
-
-        return JsonResponse(dados)
-
-    except BlocoIP.DoesNotExist:
-        print("❌ Bloco não encontrado")
-        return JsonResponse({'error': 'Bloco não encontrado'}, status=404)
+    return JsonResponse(dados)
 
 
+@login_required(login_url='/admin/login/')
 def estrutura_bloco(request, bloco_id):
-    # Função recursiva para montar a hierarquia
-    def montar_hierarquia(bloco):
-        # Buscar os sub-blocos do bloco atual
-        sub_blocos = BlocoIP.objects.filter(parent=bloco)
-
-        # Buscar os IPs associados a esse bloco
-        ips = EnderecoIP.objects.filter(bloco=bloco).values("id", "ip", "equipamento__nome", "porta__nome", "next_hop", "is_gateway", 'finalidade')
-
-        # Montar o dicionário com os dados
-        return {
-            "bloco": bloco.bloco_cidr,  # CIDR do bloco
-            "sub_blocos": [montar_hierarquia(sb) for sb in sub_blocos],  # Recursivamente monta os sub-blocos
-            "ips": list(ips) if ips else []  # Lista de IPs ou uma lista vazia se não houver IPs
-        }
-
+    """
+    Exporta a subárvore do bloco (sub-blocos e IPs) em JSON, em número constante de consultas.
+    Parâmetros opcionais: ?profundidade=N limita os níveis, ?campos=ip,finalidade escolhe as
+    colunas dos IPs e ?ips=0 omite os IPs. Só blocos das empresas do usuário.
+    """
+    blocos = BlocoIP.objects.all()
+    if not request.user.is_superuser:
+        blocos = blocos.filter(empresa__in=request.user.empresas.all())
     try:
         # Recupera o BlocoIP com base no id
-        bloco = BlocoIP.objects.get(id=bloco_id)
-
-        # Monta a hierarquia do bloco
-        estrutura = montar_hierarquia(bloco)
-
-        # Retorna a estrutura em formato JSON
-        return JsonResponse(estrutura)
-
+        bloco = blocos.get(id=bloco_id)
     except BlocoIP.DoesNotExist:
         # Caso o bloco com o id fornecido não seja encontrado
         return JsonResponse({'error': 'Bloco não encontrado'}, status=404)
 
+    profundidade = request.GET.get('profundidade')
+    campos = request.GET.get('campos')
+
+    try:
+        profundidade = int(profundidade) if profundidade else None
+    except ValueError:
+        return JsonResponse({'error': 'profundidade deve ser um inteiro.'}, status=400)
+    if profundidade is not None and profundidade < 0:
+        return JsonResponse({'error': 'profundidade não pode ser negativa.'}, status=400)
+
+    estrutura = exportar_subarvore(
+        bloco,
+        profundidade_maxima=profundidade,
+        campos_ip=campos.split(',') if campos else CAMPOS_IP_SUBARVORE,
+        incluir_ips=request.GET.get('ips') != '0',
+    )
+
+    # A árvore é serializada aos pedaços para não montar uma string única com todo o JSON
+    return StreamingHttpResponse(DjangoJSONEncoder().iterencode(estrutura), content_type='application/json')
+
 
 @staff_member_required
 def testar_conexao(request, pk):
     integracao = get_object_or_404(IntegracaoZabbix, pk=pk)
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "user.login",
-        "params": {
-            "user": integracao.usuario,
-            "password": integracao.senha
-        },
-        "id": 1
-    }
     try:
-        response = requests.post(integracao.url, json=payload, timeout=5)
-        data = response.json()
-        if 'result' in data:
-            messages.success(request, "✅ Conexão com Zabbix bem-sucedida!")
-        else:
-            messages.error(request, f"❌ Falha na autenticação com o Zabbix: {data.get('error')}")
+        with ClienteZabbix(integracao) as cliente:
+            cliente.testar()
+        messages.success(request, "✅ Conexão com Zabbix bem-sucedida!")
+    except ErroZabbix as e:
+        messages.error(request, f"❌ Falha na autenticação com o Zabbix: {e}")
     except Exception as e:
         messages.warning(request, f"⚠️ Erro ao conectar: {str(e)}")
 
@@ -0,0 +1,451 @@
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db import transaction
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .ipam import TAMANHO_LOTE
+from .models import Equipamento, Fabricante, Modelo, Pop, Porta
+from .monitoramento import gravar_status
+
+PALAVRAS_EQUIPAMENTO = ["sw_", "PPPoE", "BRAS", "BORDA", "CORE", "OLT", "ROTEADOR", "BGP"]
+PALAVRAS_PORTA = ["ethernet", "sfp", "eoip", "interface"]
+
+# Regexes do nome das interfaces nos itens do Zabbix, compiladas uma vez
+RE_INTERFACE = re.compile(r'Interface (.+?)(?:\(|:)')
+RE_INTERFACE_ALT = re.compile(r'(\S+)\s*Interface')
+RE_PARENTESES = re.compile(r'\([^)]+\)')
+RE_NORMALIZAR = re.compile(r'[ /-]')
+
+# Prefixos das chaves de item usadas na sincronização de portas (filtrados no próprio Zabbix)
+CHAVES_TIPO = ("net.if.type",)
+CHAVES_PORTA = ("net.if.in", "net.if.out", "net.if.speed")
+HOSTS_POR_CONSULTA = 200
+PARALELISMO = 4
+# Trechos das mensagens de erro do Zabbix quando o token de sessão expirou ou foi invalidado
+ERROS_SESSAO = ('session terminated', 're-login', 'not authorised', 'not authorized', 'session expired')
+PADRAO_PORTA_ZABBIX = {'speed': '1G', 'tipo': 'Fibra', 'observacao': 'Importado do Zabbix'}
+
+
+def filtro_por_palavras_chave(texto, palavras):
+    if not palavras:
+        return True
+    return any(palavra.lower() in texto.lower() for palavra in palavras)
+
+
+# Tokens de sessão (user.login) por integração, reaproveitados entre cliques no admin e tarefas
+_tokens = {}
+_trava_tokens = threading.Lock()
+
+
+class ErroZabbix(Exception):
+    def __init__(self, metodo, erro):
+        self.metodo = metodo
+        self.erro = erro
+        super().__init__(f"Erro do Zabbix em {metodo}: {erro.get('data') or erro.get('message') or erro}")
+
+    @property
+    def sessao_expirada(self):
+        texto = f"{self.erro.get('message', '')} {self.erro.get('data', '')}".lower()
+        return any(trecho in texto for trecho in ERROS_SESSAO)
+
+
+class ClienteZabbix:
+    """
+    Cliente JSON-RPC do Zabbix com uma requests.Session por instância (keep-alive, novas tentativas só em
+    falha de conexão, pois chamadas como host.create não são idempotentes).
+
+    Sem token de API cadastrado, o token do user.login fica em cache por integração e é renovado uma vez
+    quando o Zabbix responde que a sessão expirou. `lote` envia várias chamadas numa única requisição
+    (JSON-RPC batch) e `mapear` executa a mesma chamada com parâmetros diferentes em paralelo, com no
+    máximo `paralelismo` requisições simultâneas.
+    """
+
+    def __init__(self, integracao, timeout=30, paralelismo=PARALELISMO, tentativas=3):
+        self.integracao = integracao
+        self.timeout = timeout
+        self.paralelismo = max(1, paralelismo)
+
+        self.session = requests.Session()
+        retry = Retry(total=tentativas, connect=tentativas, read=0, status=0, backoff_factor=0.5,
+                      allowed_methods=None)
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=self.paralelismo)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _chave_token(self):
+        integracao = self.integracao
+        return integracao.pk, integracao.url, integracao.usuario, integracao.senha
+
+    def token(self, renovar=False):
+        if self.integracao.token:
+            return self.integracao.token  # Token de API não expira por inatividade
+        chave = self._chave_token()
+        with _trava_tokens:
+            if not renovar and chave in _tokens:
+                return _tokens[chave]
+        token = self._enviar("user.login", {"user": self.integracao.usuario, "password": self.integracao.senha})
+        if not token:
+            raise Exception("Falha na autenticação")
+        with _trava_tokens:
+            _tokens[chave] = token
+        return token
+
+    def _payload(self, metodo, params, token, id_=1):
+        payload = {"jsonrpc": "2.0", "method": metodo, "params": params if params is not None else {}, "id": id_}
+        if token:
+            payload["auth"] = token
+        return payload
+
+    def _post(self, payload):
+        response = self.session.post(self.integracao.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _enviar(self, metodo, params=None, token=None):
+        dados = self._post(self._payload(metodo, params, token))
+        if "error" in dados:
+            raise ErroZabbix(metodo, dados["error"])
+        return dados.get("result")
+
+    def chamar(self, metodo, params=None):
+        """Chamada autenticada; com sessão expirada, refaz o login e tenta de novo uma vez."""
+        try:
+            return self._enviar(metodo, params, self.token())
+        except ErroZabbix as erro:
+            if not erro.sessao_expirada or self.integracao.token:
+                raise
+            return self._enviar(metodo, params, self.token(renovar=True))
+
+    def lote(self, chamadas):
+        """Executa [(metodo, params), ...] numa única requisição e devolve os resultados na mesma ordem."""
+        if not chamadas:
+            return []
+        for tentativa in range(2):
+            token = self.token(renovar=tentativa > 0)
+            respostas = self._post([
+                self._payload(metodo, params, token, indice) for indice, (metodo, params) in enumerate(chamadas)
+            ])
+            if isinstance(respostas, dict):  # Erro geral (ex.: servidor sem suporte a batch)
+                respostas = [respostas]
+            por_id = {resposta.get("id"): resposta for resposta in respostas}
+            erros = [
+                ErroZabbix(chamadas[indice][0], por_id.get(indice, {}).get("error") or {"message": "Sem resposta"})
+                for indice in range(len(chamadas)) if "result" not in por_id.get(indice, {})
+            ]
+            if not erros:
+                return [por_id[indice]["result"] for indice in range(len(chamadas))]
+            if self.integracao.token or not any(erro.sessao_expirada for erro in erros) or tentativa:
+                raise erros[0]
+        return []
+
+    def mapear(self, metodo, lista_params):
+        """Gera os resultados de `metodo` para cada params, em ordem, com as chamadas feitas em paralelo."""
+        lista_params = list(lista_params)
+        if self.paralelismo == 1 or len(lista_params) < 2:
+            for params in lista_params:
+                yield self.chamar(metodo, params)
+            return
+        self.token()  # Login antes de abrir as threads, para não disputar o user.login
+        with ThreadPoolExecutor(max_workers=self.paralelismo) as executor:
+            yield from executor.map(lambda params: self.chamar(metodo, params), lista_params)
+
+    def testar(self):
+        """Confere URL e credenciais com uma chamada autenticada mínima; levanta exceção em caso de falha."""
+        self.token(renovar=True)
+        self.chamar("host.get", {"output": ["hostid"], "limit": 1})
+        return True
+
+
+def sincronizar_equipamentos_zabbix(integracao, progresso=None, simular=False, tamanho_lote=TAMANHO_LOTE):
+    """
+    Cria os equipamentos dos hosts do Zabbix que passam no filtro de palavras-chave e ainda não existem
+    (pelo IP) na empresa, com bulk_create em lotes.
+
+    O relatório traz a diferença entre o Zabbix e o cadastro: `novos` (a criar), `alterados` (IP já
+    cadastrado com outro nome) e `ausentes` (equipamentos importados do Zabbix cujo IP não está mais em
+    nenhum host). Com `simular`, só calcula essa diferença, sem gravar nada.
+    `progresso(processados, total, etapa)` é chamado a cada lote gravado.
+    """
+    with ClienteZabbix(integracao) as cliente:
+        hosts = cliente.chamar("host.get", {"output": ["host", "name"], "selectInterfaces": ["ip"]})
+
+    existentes = {
+        ip: (nome, observacao)
+        for ip, nome, observacao in Equipamento.objects.filter(empresa=integracao.empresa).values_list(
+            'ip', 'nome', 'observacao')
+    }
+
+    relatorio = {'hosts': len(hosts), 'criados': 0, 'ignorados': 0, 'simulacao': simular,
+                 'novos': [], 'alterados': [], 'ausentes': [], 'erros': []}
+    ips_zabbix = set()
+    novos = {}
+    for host in hosts:
+        ip = (host.get("interfaces") or [{}])[0].get("ip", "")
+        nome = host.get("name", "Sem Nome")
+        ips_zabbix.add(ip)
+
+        if not filtro_por_palavras_chave(nome, PALAVRAS_EQUIPAMENTO):
+            relatorio['ignorados'] += 1
+        elif ip in existentes:
+            if existentes[ip][0] != nome:
+                relatorio['alterados'].append({'ip': ip, 'nome': existentes[ip][0], 'nome_zabbix': nome})
+        elif ip not in novos:
+            novos[ip] = nome
+
+    relatorio['novos'] = [{'ip': ip, 'nome': nome} for ip, nome in novos.items()]
+    relatorio['ausentes'] = [
+        {'ip': ip, 'nome': nome} for ip, (nome, observacao) in existentes.items()
+        if observacao == 'Importado do Zabbix' and ip not in ips_zabbix
+    ]
+    if simular or not novos:
+        return relatorio
+
+    # Certifique-se de que Pop, Fabricante e Modelo existam ou defina uma lógica para obtê-los
+    pop = Pop.objects.filter(empresa=integracao.empresa).first()
+    fabricante = Fabricante.objects.first()
+    modelo = Modelo.objects.first()
+    if not (pop and fabricante and modelo):
+        relatorio['erros'].append(
+            f"Não foi possível criar {len(novos)} equipamento(s) pois Pop, Fabricante ou Modelo não foram encontrados."
+        )
+        return relatorio
+
+    equipamentos = [
+        Equipamento(
+            nome=nome,
+            ip=ip,
+            usuario='admin',
+            senha='admin',
+            porta=22,
+            protocolo='SSH',
+            empresa=integracao.empresa,
+            pop=pop,
+            fabricante=fabricante,
+            modelo=modelo,
+            tipo='Switch',
+            status='Ativo',
+            observacao='Importado do Zabbix'
+        )
+        for ip, nome in novos.items()
+    ]
+    for inicio in range(0, len(equipamentos), tamanho_lote):
+        lote = equipamentos[inicio:inicio + tamanho_lote]
+        Equipamento.objects.bulk_create(lote)
+        relatorio['criados'] += len(lote)
+        if progresso:
+            progresso(relatorio['criados'], len(equipamentos), "Equipamentos")
+    return relatorio
+
+
+def _nome_interface(nome):
+    nome_interface_match = RE_INTERFACE.search(nome)
+    if nome_interface_match:
+        return RE_PARENTESES.sub('', nome_interface_match.group(1).strip()).strip()
+    nome_interface_match_alt = RE_INTERFACE_ALT.search(nome)
+    if nome_interface_match_alt:
+        return RE_PARENTESES.sub('', nome_interface_match_alt.group(1).strip()).strip()
+    return None
+
+
+def _nomes_portas(items):
+    """Nomes das portas de um host a partir dos seus itens, na mesma regra de pareamento de antes."""
+    itens_porta = []
+    nomes_interfaces_list = []
+    for item in items:
+        chave = item.get("key_", "")
+        nome = item.get("name", "").strip()
+
+        if chave.startswith(CHAVES_TIPO):
+            nome_interface = _nome_interface(nome) or RE_PARENTESES.sub('', nome).strip()
+            if nome_interface:
+                nomes_interfaces_list.append(nome_interface)
+        elif chave.startswith(CHAVES_PORTA):
+            itens_porta.append(item)
+
+    nomes = []
+    nomes_processados = set()
+    interface_index = 0
+    for item in itens_porta:
+        if interface_index < len(nomes_interfaces_list):
+            nome_porta = nomes_interfaces_list[interface_index]
+            interface_index += 1
+        else:
+            nome_porta = _nome_interface(item.get("name", "").strip())
+            if nome_porta is None:
+                continue
+
+        nome_porta_completo = nome_porta.strip()
+        if not nome_porta_completo or not filtro_por_palavras_chave(nome_porta_completo, PALAVRAS_PORTA):
+            continue
+
+        nome_normalizado = RE_NORMALIZAR.sub('', nome_porta_completo.lower())
+        if nome_normalizado in nomes_processados:
+            continue
+        nomes_processados.add(nome_normalizado)
+        nomes.append(nome_porta_completo)
+    return nomes
+
+
+def sincronizar_portas_zabbix(integracao, progresso=None, hosts_por_consulta=HOSTS_POR_CONSULTA):
+    """
+    Cria ou atualiza as portas dos equipamentos (pelo nome do host) a partir dos itens de interface do
+    Zabbix. Só os hosts com equipamento cadastrado são consultados, em lotes de `hosts_por_consulta` por
+    item.get (em paralelo pelo ClienteZabbix), já filtrados no Zabbix pelos prefixos de chave usados. As
+    portas são gravadas por lote com bulk_create/bulk_update, chaveadas por (equipamento, nome).
+    `progresso(processados, total, etapa)` é chamado a cada lote.
+    """
+    relatorio = {'hosts': 0, 'criados': 0, 'atualizados': 0, 'erros': []}
+    with ClienteZabbix(integracao) as cliente:
+        hosts = cliente.chamar("host.get", {"output": ["hostid", "host"]})
+        relatorio['hosts'] = len(hosts)
+
+        equipamentos = dict(Equipamento.objects.filter(empresa=integracao.empresa).values_list('nome', 'id'))
+        hosts = [(host["hostid"], equipamentos[host["host"]]) for host in hosts if host.get("host") in equipamentos]
+        lotes = [dict(hosts[inicio:inicio + hosts_por_consulta]) for inicio in range(0, len(hosts), hosts_por_consulta)]
+        consultas = ({
+            "output": ["hostid", "name", "key_"],
+            "hostids": list(lote),
+            "search": {"key_": list(CHAVES_TIPO + CHAVES_PORTA)},
+            "searchByAny": True,
+            "startSearch": True,
+            "sortfield": "itemid",
+        } for lote in lotes)
+
+        processados = 0
+        for lote, items in zip(lotes, cliente.mapear("item.get", consultas)):
+            items_por_host = defaultdict(list)
+            for item in items:
+                items_por_host[item["hostid"]].append(item)
+            portas = defaultdict(list)
+            for hostid, items_host in items_por_host.items():
+                if hostid in lote:
+                    portas[lote[hostid]].extend(_nomes_portas(items_host))
+            criados, atualizados = _gravar_portas(integracao.empresa, portas)
+            relatorio['criados'] += criados
+            relatorio['atualizados'] += atualizados
+
+            processados += len(lote)
+            if progresso:
+                progresso(processados, len(hosts), "Portas")
+    return relatorio
+
+
+def _gravar_portas(empresa, portas_por_equipamento):
+    """Upsert em lote das portas {equipamento_id: [nomes]}; devolve (criadas, atualizadas)."""
+    existentes = {
+        (porta.equipamento_id, porta.nome): porta
+        for porta in Porta.objects.filter(equipamento_id__in=list(portas_por_equipamento)).only(
+            'id', 'equipamento_id', 'nome', 'empresa_id', 'speed', 'tipo', 'observacao')
+    }
+    novas = []
+    alteradas = []
+    for equipamento_id, nomes in portas_por_equipamento.items():
+        for nome in nomes:
+            porta = existentes.get((equipamento_id, nome))
+            if porta is None:
+                porta = Porta(equipamento_id=equipamento_id, nome=nome, empresa=empresa, **PADRAO_PORTA_ZABBIX)
+                existentes[(equipamento_id, nome)] = porta
+                novas.append(porta)
+            elif (porta.empresa_id, porta.speed, porta.tipo, porta.observacao) != (
+                    empresa.pk, *PADRAO_PORTA_ZABBIX.values()):
+                porta.empresa_id = empresa.pk
+                for campo, valor in PADRAO_PORTA_ZABBIX.items():
+                    setattr(porta, campo, valor)
+                alteradas.append(porta)
+
+    with transaction.atomic():
+        Porta.objects.bulk_create(novas, batch_size=TAMANHO_LOTE)
+        Porta.objects.bulk_update(alteradas, ['empresa', *PADRAO_PORTA_ZABBIX], batch_size=TAMANHO_LOTE)
+    return len(novas), len(alteradas)
+
+
+def _valor_icmpping(item):
+    """'1'/'0' do último valor coletado, ou None se o item não tem dado (nunca coletado ou sem suporte)."""
+    if item is None or str(item.get('state', '0')) != '0' or str(item.get('lastclock') or '0') == '0':
+        return None
+    valor = str(item.get('lastvalue', '')).strip()
+    return valor if valor in ('0', '1') else None
+
+
+def _disponibilidade(host, item):
+    """
+    'Ativo', 'Inativo' ou None (desconhecido): pelo item icmpping e, sem ele ou sem dado coletado, pela
+    disponibilidade das interfaces.
+    """
+    valor = _valor_icmpping(item)
+    if valor is not None:
+        return 'Ativo' if valor == '1' else 'Inativo'
+    # Zabbix 5.4+ informa a disponibilidade por interface; versões anteriores, no próprio host
+    estados = {str(interface.get('available')) for interface in host.get('interfaces') or []
+               if interface.get('available') is not None}
+    if not estados and host.get('available') is not None:
+        estados = {str(host['available'])}
+    if '1' in estados:
+        return 'Ativo'
+    if '2' in estados:
+        return 'Inativo'
+    return None
+
+
+def ingerir_status_zabbix(integracao, progresso=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Atualiza o status dos equipamentos da empresa com a disponibilidade que o Zabbix já conhece.
+
+    Hosts monitorados e itens icmpping vêm numa única requisição (JSON-RPC batch). Cada host é ligado aos
+    equipamentos pelo IP das interfaces ou, sem correspondência, pelo nome. Só os equipamentos cujo status
+    mudou são regravados, com o histórico das transições (ver monitoramento.gravar_status).
+    """
+    with ClienteZabbix(integracao) as cliente:
+        hosts, itens = cliente.lote([
+            ("host.get", {"output": "extend", "selectInterfaces": "extend", "monitored_hosts": True}),
+            ("item.get", {"output": ["hostid", "lastvalue", "lastclock", "state"], "filter": {"key_": "icmpping"},
+                          "monitored": True}),
+        ])
+    icmpping = {item["hostid"]: item for item in itens}
+
+    por_ip = defaultdict(list)
+    por_nome = defaultdict(list)
+    for equipamento in Equipamento.objects.filter(empresa=integracao.empresa).only('id', 'ip', 'nome', 'status'):
+        por_ip[equipamento.ip].append(equipamento)
+        por_nome[equipamento.nome].append(equipamento)
+
+    relatorio = {'hosts': len(hosts), 'equipamentos': 0, 'alterados': 0, 'online': 0, 'offline': 0,
+                 'desconhecidos': 0}
+    verificados = {}
+    novos_status = {}
+    for host in hosts:
+        status = _disponibilidade(host, icmpping.get(host["hostid"]))
+        if status is None:
+            relatorio['desconhecidos'] += 1
+            continue
+        ips = {interface.get("ip") for interface in host.get("interfaces") or []}
+        equipamentos = [equipamento for ip in ips for equipamento in por_ip.get(ip, [])]
+        equipamentos = equipamentos or por_nome.get(host.get("host")) or por_nome.get(host.get("name")) or []
+        for equipamento in equipamentos:
+            verificados[equipamento.pk] = equipamento
+            novos_status[equipamento.pk] = status
+
+    alterados = gravar_status(verificados.values(), novos_status, 'zabbix', tamanho_lote)
+    online = [pk for pk, status in novos_status.items() if status == 'Ativo']
+
+    relatorio['equipamentos'] = len(novos_status)
+    relatorio['alterados'] = len(alterados)
+    relatorio['online'] = len(online)
+    relatorio['offline'] = len(novos_status) - len(online)
+    if progresso:
+        progresso(len(hosts), len(hosts), "Status")
+    return relatorio
@@ -27,7 +27,9 @@ from appisp.views import (EquipamentoAutocomplete, PortaAutocomplete, mapa, atua
                           get_portas, verificar_status_equipamentos, listar_equipamentosApi,
                           atualizar_status_equipamento, get_map_data, get_equipamento, api_portas, conectar_portas,
                           desconectar_portas, testar_conexao, listar_blocos_ip_api, obter_dados_empresa, mapa_dados, get_equipamentos_para_rack,
-                          adicionar_equipamento_rack, editar_equipamento_rack, remover_equipamento_rack
+                          adicionar_equipamento_rack, editar_equipamento_rack, remover_equipamento_rack,
+                          visualizar_ips_do_bloco, buscar_blocos_por_ip, relatorio_utilizacao_api,
+                          planejar_vlsm_api, disponibilidade_api, atualizar_status_lote
                           )
 from appisp.models import Porta
 from django.contrib.auth.decorators import login_required
@@ -61,6 +63,10 @@ urlpatterns = [
     path('api/conectar-portas/', conectar_portas, name='conectar-portas'),
     path('api/desconectar-portas/', desconectar_portas, name='desconectar-portas'),
     path('api/blocos-ip/', listar_blocos_ip_api, name='api_listar_blocos_ip'),
+    path('api/blocos-ip/lookup', buscar_blocos_por_ip, name='api_buscar_blocos_por_ip'),
+    path('api/blocos-ip/<int:bloco_id>/vlsm/', planejar_vlsm_api, name='api_planejar_vlsm'),
+    path('api/relatorio-utilizacao/', relatorio_utilizacao_api, name='api_relatorio_utilizacao'),
+    path('api/disponibilidade/', disponibilidade_api, name='api_disponibilidade'),
     path('api/empresa/', obter_dados_empresa, name='api-obter-empresa'),
     path('endereco_ip/', adicionar_endereco_ip, name='endereco_ip'),
     path('equipamento/<int:equipamento_id>/vlans/', visualizar_vlans_por_equipamento, name='vlans_por_equipamento'),
@@ -74,6 +80,7 @@ urlpatterns = [
     path('api/mapa-dados', mapa_dados, name='mapa_dados_api'),
     path("ajax/ips_por_bloco/<int:bloco_id>/", listar_ips_por_bloco, name="listar_ips_por_bloco"),
     path('ajax/sub_blocos_por_bloco/<int:bloco_id>/', get_sub_blocos, name='ajax_sub_blocos_por_bloco'),
+    path('ajax/ips_do_bloco/<int:bloco_id>/', visualizar_ips_do_bloco, name='ips_do_bloco'),
     path("lista_empresas_json/", lista_empresas_json, name="lista_empresas_json"),
     path('lista_vlans_json', lista_vlans_json, name='lista_vlans_json'),
     path('ajax/dados_hierarquicos/<int:bloco_id>/', estrutura_bloco, name='dados_hierarquicos'),
@@ -82,6 +89,7 @@ urlpatterns = [
     path('verificar_status/', verificar_status_equipamentos, name='verificar_status'),
     path("api/listar_equipamentosapi/", listar_equipamentosApi, name="listar_equipamentosapi"),
     path('api/atualizar_status/<int:equipamento_id>/', atualizar_status_equipamento, name="atualizar_status_equipamento"),
+    path('api/atualizar_status/batch/', atualizar_status_lote, name="atualizar_status_lote"),
     path('api/get_map_data/', get_map_data, name="atualizar_mapa"),
     path('api/equipamento/<int:equipamento_id>/', get_equipamento, name='get_equipamento'),
     path('api/equipamentos-disponiveis/', get_equipamentos_para_rack, name='get_equipamentos_para_rack'),